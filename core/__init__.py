@@ -2,4 +2,23 @@ from .installer import install_package
 from .config_manager import configure_mosquitto, configure_telegraf, setup_influxdb
 from .portable_manager import (download_and_extract, create_launcher_bat, setup_influx3_scripts, setup_telegraf_portable,
                                extract_token_from_file)
-from .settings_manager import get_setting, save_setting
\ No newline at end of file
+from .downloader import download_file
+from .artifact_cache import ArtifactCache
+from .zip_extractor import extract_zip, find_executable
+from .token_scanner import watch_token
+from .capacity import (compute_metrics, compute_metrics_grid, consumer_instances, real_payload_bytes, solve_capacity,
+                       payload_stats_from_jsonl, compute_metrics_by_percentile, mqtt_wire_model, wire_cost,
+                       inflight_hz_limit, queueing_model, buffer_strategy_model, cardinality_model,
+                       CARDINALITY_THRESHOLDS)
+from .encodings import compare_encodings
+from .binary_schema import BinarySchema, validate_capture, benchmark_parse
+from .agent_sim import simulate_agent, sweep_agent
+from .compression import parquet_bytes_per_point
+from .storage_scanner import StorageScanner, get_storage_scanner, parquet_num_rows
+from .aggregation import telegraf_aggregators, aggregation_model, benchmark_aggregation
+from .sizing import get_sizing_profile, save_sizing_profile, agent_section
+from .sharding import shard_for, shard_table, broker_ports, read_device_ids, write_shard_map
+from .mosquitto_tuning import mosquitto_settings, PROFILES as MOSQUITTO_PROFILES
+from .mosquitto_auth import (hash_password, verify_password, write_password_file, generate_device_credentials,
+                             write_acl_file)
+from .settings_manager import get_setting, save_setting, save_settings, settings_transaction
\ No newline at end of file
@@ -0,0 +1,246 @@
+import math
+import random
+import time
+
+# Simulador de eventos discretos del ciclo [agent] de Telegraf:
+# llegadas de N sensores (con jitter y ráfagas) -> buffer de salida
+# (metric_buffer_limit, se descartan los más antiguos) -> escrituras en lotes
+# de metric_batch_size, disparadas por lote lleno o por el tick de
+# flush_interval (+ flush_jitter) -> InfluxDB (latencia, caudal, caídas).
+#
+# Para que vaya rápido no se simula métrica a métrica: las llegadas se agregan
+# en intervalos de 'resolution' segundos (NumPy) y el buffer FIFO se representa
+# con dos índices sobre la curva acumulada de llegadas (cabeza y total). Sólo
+# hay eventos en los ticks y en las escrituras, así que una hora simulada con
+# miles de msg/s se resuelve en décimas de segundo.
+
+# Por encima de este número de mensajes no se generan las emisiones de cada
+# sensor una a una: la superposición de muchas fuentes periódicas independientes
+# tiende a un proceso de Poisson (Palm-Khintchine) y se muestrea así.
+EXACT_MAX_EVENTS = 20_000_000
+
+# Timeout de escritura del output influxdb_v2 de Telegraf
+WRITE_TIMEOUT = 5.0
+# Puntos/s que acepta InfluxDB en una escritura (ajustable desde la calculadora)
+WRITE_RATE = 200_000.0
+
+
+def _np():
+    try:
+        import numpy as np
+    except ImportError:
+        raise ImportError("simulate_agent necesita NumPy: pip install numpy")
+    return np
+
+
+def _arrival_counts(np, rng, N, Q, duration, jitter, burst_rate, burst_size, resolution):
+    """Mensajes que llegan al buffer en cada intervalo de 'resolution' segundos."""
+    bins = int(math.ceil(duration / resolution))
+    total = N * Q * duration
+
+    if total <= EXACT_MAX_EVENTS:
+        # Cada sensor emite a Q Hz con una fase aleatoria; cada mensaje se retrasa
+        # un jitter gaussiano. Se genera por trozos de tiempo para acotar memoria.
+        counts = np.zeros(bins, dtype=np.int64)
+        phase = rng.random(N) / Q
+        per_chunk = max(1, int(2_000_000 / N))
+        k_total = int(math.ceil(duration * Q))
+        for k0 in range(0, k_total, per_chunk):
+            k = np.arange(k0, min(k_total, k0 + per_chunk))
+            t = phase[:, None] + k[None, :] / Q
+            if jitter > 0:
+                t = t + np.abs(rng.normal(0.0, jitter, t.shape))
+            idx = (t[t < duration] / resolution).astype(np.int64)
+            counts += np.bincount(idx, minlength=bins)[:bins]
+    else:
+        counts = rng.poisson(N * Q * resolution, bins).astype(np.int64)
+
+    if burst_rate > 0 and burst_size > 0:
+        # Ráfagas: un dispositivo vuelca de golpe 'burst_size' mensajes (p.ej. al reconectar)
+        n_bursts = rng.poisson(burst_rate * duration)
+        at = (rng.random(n_bursts) * duration / resolution).astype(np.int64)
+        np.add.at(counts, at, burst_size)
+    return counts
+
+
+def _in_windows(t, windows):
+    for w in windows:
+        if w[0] <= t < w[1]:
+            return w
+    return None
+
+
+def simulate_agent(N, Q, duration=3600.0, batch_size=1000, flush_interval=1.0, flush_jitter=0.0,
+                   buffer_limit=10000, jitter=0.0, burst_rate=0.0, burst_size=0, write_latency=0.02,
+                   write_rate=WRITE_RATE, write_timeout=WRITE_TIMEOUT, outages=(), slow_writes=(),
+                   resolution=0.01, seed=None):
+    """
+    Simula 'duration' segundos del agente Telegraf.
+
+    - jitter: desviación típica (s) del retraso de cada mensaje.
+    - burst_rate / burst_size: ráfagas por segundo (en toda la flota) y mensajes por ráfaga.
+    - write_latency / write_rate: coste de una escritura en InfluxDB = latencia + lote / caudal.
+    - outages: [(inicio, fin)] en s; las escrituras fallan tras 'write_timeout'.
+    - slow_writes: [(inicio, fin, factor)]; las escrituras tardan 'factor' veces más.
+
+    Devuelve métricas entrantes, escritas, descartadas, percentiles de latencia
+    extremo a extremo (llegada al buffer -> confirmación de InfluxDB), pico del
+    buffer y velocidad de simulación.
+    """
+    # Con flush_interval <= 0 el siguiente tick nunca avanza y el bucle no termina
+    if flush_interval <= 0:
+        raise ValueError("flush_interval debe ser mayor que 0")
+    if batch_size < 1:
+        raise ValueError("batch_size debe ser al menos 1")
+    if buffer_limit < 1:
+        raise ValueError("buffer_limit debe ser al menos 1")
+    if write_rate <= 0 or resolution <= 0:
+        raise ValueError("write_rate y resolution deben ser mayores que 0")
+    np = _np()
+    wall0 = time.perf_counter()
+    rng = np.random.default_rng(seed)
+    jit = random.Random(seed)
+
+    counts = _arrival_counts(np, rng, N, Q, duration, jitter, burst_rate, burst_size, resolution)
+    cum = np.cumsum(counts)
+    bins = len(cum)
+
+    def arrived(t):
+        """Mensajes llegados hasta el instante t (resolución de un intervalo)."""
+        i = min(bins, int(t / resolution + 1e-9))
+        return int(cum[i - 1]) if i > 0 else 0
+
+    def time_of(k):
+        """Instante (fin de intervalo) en que llega el mensaje de índice k; inf si no llega."""
+        i = int(np.searchsorted(cum, k, side="right"))
+        return (i + 1) * resolution if i < bins else math.inf
+
+    lat_values, lat_counts = [], []
+    head = 0                 # índice del mensaje más antiguo aún en el buffer
+    dropped = 0
+    peak = 0
+    writes = failed = 0
+
+    writing_until = None     # fin de la escritura en curso
+    writing = None           # (inicio, fin_de_lote) de la escritura en curso
+    flush_left = 0           # lotes pendientes del flush periódico actual
+    retry_on_tick = False    # tras un fallo sólo se reintenta en el siguiente tick
+    tick = 1
+    next_tick = flush_interval + jit.uniform(0, flush_jitter)
+    t = 0.0
+
+    while True:
+        # --- Próximo evento: fin de escritura, tick o lote lleno ---
+        candidates = [next_tick]
+        if writing_until is not None:
+            candidates.append(writing_until)
+        elif not retry_on_tick:
+            candidates.append(time_of(head + batch_size - 1))
+        t = max(t, min(candidates))
+        if t >= duration:
+            break
+
+        # Desbordamiento: se descartan los más antiguos (el lote en vuelo incluido)
+        total = arrived(t)
+        over = total - head - buffer_limit
+        if over > 0:
+            head += over
+            dropped += over
+        peak = max(peak, total - head)
+
+        start_write = False
+        if writing_until is not None and t >= writing_until:
+            # --- Fin de escritura ---
+            s, e = writing
+            writing_until = writing = None
+            if ok:
+                s = max(s, head)
+                if e > s:
+                    lo = int(np.searchsorted(cum, s, side="right"))
+                    hi = int(np.searchsorted(cum, e - 1, side="right"))
+                    edges = np.minimum(cum[lo:hi + 1], e)
+                    per_bin = np.diff(np.concatenate(([s], edges)))
+                    # Llegada uniforme dentro del intervalo -> punto medio
+                    lat_values.append(t - (np.arange(lo, hi + 1) + 0.5) * resolution)
+                    lat_counts.append(per_bin)
+                head = max(head, e)
+                flush_left -= 1
+                start_write = flush_left > 0 and total > head
+            else:
+                failed += 1
+                flush_left = 0
+                retry_on_tick = True
+
+        elif t >= next_tick:
+            # --- Tick de flush: se escribe todo lo que hay, lote a lote ---
+            tick += 1
+            next_tick = tick * flush_interval + jit.uniform(0, flush_jitter)
+            if writing_until is None and total > head:
+                retry_on_tick = False
+                flush_left = math.ceil((total - head) / batch_size)
+                start_write = True
+
+        elif writing_until is None and total - head >= batch_size:
+            # --- Lote lleno: escritura inmediata de un lote ---
+            flush_left = 1
+            start_write = True
+
+        if start_write:
+            b = min(batch_size, total - head)
+            writes += 1
+            if _in_windows(t, outages):
+                ok, cost = False, write_timeout
+            else:
+                slow = _in_windows(t, slow_writes)
+                ok, cost = True, (write_latency + b / write_rate) * (slow[2] if slow else 1.0)
+            writing = (head, head + b)
+            writing_until = t + cost
+
+    total = int(cum[-1]) if bins else 0
+    written = sum(int(c.sum()) for c in lat_counts)
+    result = {
+        "sim_seconds": duration,
+        "metrics_in": total,
+        "written": written,
+        "dropped": dropped,
+        "in_buffer": total - head,
+        "peak_buffer": peak,
+        "peak_buffer_pct": peak / buffer_limit * 100 if buffer_limit else 0.0,
+        "writes": writes,
+        "failed_writes": failed,
+    }
+
+    if written:
+        values = np.concatenate(lat_values)
+        weights = np.concatenate(lat_counts)
+        order = np.argsort(values)
+        values, acc = values[order], np.cumsum(weights[order])
+        for p in (50, 95, 99, 99.9):
+            key = f"latency_p{p:g}".replace(".", "_")
+            result[key] = float(values[min(len(values) - 1, np.searchsorted(acc, written * p / 100))])
+        result["latency_max"] = float(values[-1])
+        result["latency_mean"] = float((values * weights[order]).sum() / written)
+
+    wall = time.perf_counter() - wall0
+    result["wall_seconds"] = wall
+    result["sim_speed"] = duration / wall if wall > 0 else math.inf
+    return result
+
+
+def _sweep_point(args):
+    kwargs, name, value = args
+    return value, simulate_agent(**dict(kwargs, **{name: value}))
+
+
+def sweep_agent(name, values, processes=None, **kwargs):
+    """
+    Repite la simulación variando un parámetro ('batch_size', 'buffer_limit',
+    'flush_interval', 'N'...). Con 'processes' > 1 los puntos van en paralelo.
+    Devuelve [(valor, resultado)] en el orden de 'values'.
+    """
+    points = [(kwargs, name, v) for v in values]
+    if processes and processes > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            return list(pool.map(_sweep_point, points))
+    return [_sweep_point(p) for p in points]
@@ -0,0 +1,192 @@
+import json
+import math
+import time
+
+from .capacity import compute_metrics
+
+# Pre-agregación en el borde: en vez de mandar a InfluxDB cada punto a 100 Hz,
+# Telegraf resume cada ventana con sus agregadores (basicstats, minmax, final)
+# y descarta los originales. Aquí están la sección de configuración, el modelo
+# de reducción y un benchmark que reproduce el ventaneo sobre una captura real.
+
+BASICSTATS_DEFAULT = ["count", "min", "max", "mean", "stdev"]
+
+# Campos de salida por campo de entrada (basicstats depende de 'stats')
+AGGREGATOR_FIELDS = {"minmax": 2, "final": 1}
+
+PROFILES = {
+    "Sin agregación": [],
+    "final": ["final"],
+    "minmax": ["minmax"],
+    "basicstats": ["basicstats"],
+    "basicstats + final": ["basicstats", "final"],
+}
+
+# Bytes por campo agregado en Parquet: los estadísticos son floats continuos y
+# el diccionario no compensa (PLAIN + compresión, como lat/lng en core.compression)
+AGG_FIELD_BYTES = 7.0
+# Tamaño en memoria de cada campo en el buffer de Telegraf (nombre + valor)
+AGG_FIELD_MEM_BYTES = 24
+
+
+def _fields_out(aggregator, fields, stats):
+    if aggregator == "basicstats":
+        return fields * len(stats or BASICSTATS_DEFAULT)
+    return fields * AGGREGATOR_FIELDS[aggregator]
+
+
+def telegraf_aggregators(window_s, aggregators, stats=None, drop_original=True):
+    """Secciones [[aggregators.*]] de telegraf.conf para la ventana dada."""
+    blocks = []
+    for name in aggregators:
+        lines = [f"[[aggregators.{name}]]",
+                 f'  period = "{window_s:g}s"',
+                 # Los timestamps vienen del dispositivo: se admite una ventana de retraso
+                 f'  grace = "{window_s:g}s"',
+                 f"  drop_original = {'true' if drop_original else 'false'}"]
+        if name == "basicstats":
+            lines.append("  stats = [" + ", ".join(f'"{s}"' for s in (stats or BASICSTATS_DEFAULT)) + "]")
+        elif name not in AGGREGATOR_FIELDS:
+            raise ValueError(f"Agregador no soportado: {name}")
+        blocks.append("\n".join(lines))
+    return "\n\n".join(blocks)
+
+
+def aggregation_model(N, Q, L, payload_bytes, fields, window_s, aggregators, stats=None, drop_original=True,
+                      wire=None, stored_bytes=None):
+    """
+    Lo que llega a InfluxDB con y sin agregación.
+    Con agregación cada serie (device_id) emite un punto por agregador y ventana.
+    La red y el parseo en Telegraf no cambian: se agrega después de recibir.
+    Devuelve {"raw": compute_metrics(...), "aggregated": {...}, "reduction": {...}}.
+    """
+    raw = compute_metrics(N, Q, L, payload_bytes, wire=wire, stored_bytes=stored_bytes)
+    if not aggregators:
+        return {"raw": raw, "aggregated": None, "reduction": None}
+
+    in_rate = raw["msgs_per_sec"]
+    # Con una ventana más corta que el periodo de muestreo no se reduce nada
+    points = min(N / window_s, in_rate) * len(aggregators)
+    out_fields = sum(_fields_out(a, fields, stats) for a in aggregators) / len(aggregators)
+    stored = out_fields * AGG_FIELD_BYTES
+    mem_bytes = out_fields * AGG_FIELD_MEM_BYTES
+    if not drop_original:
+        points += in_rate
+        stored = (stored * (points - in_rate) + raw["stored_bytes_per_point"] * in_rate) / points
+        mem_bytes = (mem_bytes * (points - in_rate) + raw["msg_bytes"] * in_rate) / points
+
+    # Sólo hay algo que escribir cuando cierra una ventana
+    iops = 1.0 / max(0.01, L, window_s if drop_original else 0)
+    buffer_1h = points * 3600
+    agg = {
+        "points_per_sec": points,
+        "fields_per_point": out_fields,
+        "stored_bytes_per_point": stored,
+        "iops": iops,
+        "gb_per_month": points * stored * 86400 * 30 / 1024 ** 3,
+        "ram_mb": buffer_1h * mem_bytes * 2 / 1024 ** 2,
+        "batch": max(int(points * L * 1.2), 1000),
+        "buffer_limit": int(max(10000, buffer_1h)),
+    }
+
+    def ratio(a, b):
+        return a / b if b else math.inf
+
+    reduction = {
+        "points": ratio(in_rate, points),
+        "iops": ratio(raw["iops"], iops),
+        "storage": ratio(raw["gb_per_month"], agg["gb_per_month"]),
+        "ram": ratio(raw["ram_mb"], agg["ram_mb"]),
+    }
+    return {"raw": raw, "aggregated": agg, "reduction": reduction}
+
+
+# =========================================================
+# === BENCHMARK SOBRE UNA CAPTURA =========================
+# =========================================================
+
+def _device_and_payload(obj):
+    """Acepta {'topic': 'shm/<id>/data', 'payload': {...}}, un payload con 'device_id' o uno sin él."""
+    if "payload" in obj and "topic" in obj:
+        parts = str(obj["topic"]).split("/")
+        return (parts[1] if len(parts) > 2 else obj["topic"]), obj["payload"]
+    return obj.get("device_id", "-"), obj
+
+
+def benchmark_aggregation(path, window_s, aggregators, stats=None, time_key="ts", time_scale=1e-3):
+    """
+    Reproduce el ventaneo de los agregadores de Telegraf sobre una captura JSONL
+    (timestamps en 'time_key', en ms por defecto) y calcula de verdad los
+    estadísticos de basicstats/minmax/final por serie y ventana.
+    Devuelve la tasa de salida medida frente a la del modelo y la velocidad del replay.
+    """
+    t0 = time.perf_counter()
+    windows = {}      # (device, ventana) -> {campo: [n, suma, suma2, min, max, último]}
+    devices = set()
+    n_in = 0
+    t_min = t_max = None
+
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                device, payload = _device_and_payload(json.loads(line))
+                ts = float(payload[time_key]) * time_scale
+            except (ValueError, KeyError, TypeError, AttributeError):
+                continue
+            n_in += 1
+            devices.add(device)
+            t_min = ts if t_min is None else min(t_min, ts)
+            t_max = ts if t_max is None else max(t_max, ts)
+
+            acc = windows.setdefault((device, int(ts // window_s)), {})
+            for name, value in payload.items():
+                if name == time_key or isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                a = acc.get(name)
+                if a is None:
+                    acc[name] = [1, value, value * value, value, value, value]
+                else:
+                    a[0] += 1
+                    a[1] += value
+                    a[2] += value * value
+                    a[3] = min(a[3], value)
+                    a[4] = max(a[4], value)
+                    a[5] = value
+
+    # Salida: un punto por agregador, serie y ventana (como Telegraf al cerrar el periodo)
+    n_out = len(windows) * len(aggregators)
+    for acc in windows.values():
+        for a in acc.values():
+            mean = a[1] / a[0]
+            a.append(math.sqrt(max(0.0, a[2] / a[0] - mean * mean)))
+
+    elapsed = time.perf_counter() - t0
+    span = (t_max - t_min) if n_in > 1 else 0.0
+    # Ventanas completas cubiertas por la captura (las de los extremos cuentan enteras)
+    covered = (math.floor(t_max / window_s) - math.floor(t_min / window_s) + 1) * window_s if n_in else 0.0
+    measured = n_out / covered if covered else 0.0
+    model = len(devices) * len(aggregators) / window_s
+    return {
+        "messages": n_in,
+        "devices": len(devices),
+        "span_s": span,
+        "outputs": n_out,
+        "measured_points_per_sec": measured,
+        "model_points_per_sec": model,
+        "model_error_pct": (measured / model - 1) * 100 if model else None,
+        "reduction": n_in / n_out if n_out else math.inf,
+        "replay_msgs_per_sec": n_in / elapsed if elapsed else math.inf,
+    }
+
+
+if __name__ == "__main__":
+    # Uso: python -m core.aggregation captura.jsonl [ventana_s] [agregador ...]
+    import sys
+    capture = sys.argv[1]
+    window = float(sys.argv[2]) if len(sys.argv) > 2 else 10.0
+    aggs = sys.argv[3:] or ["basicstats"]
+    for key, value in benchmark_aggregation(capture, window, aggs).items():
+        print(f"{key:<24} {value:,.2f}" if isinstance(value, float) else f"{key:<24} {value}")
@@ -0,0 +1,136 @@
+import os
+import json
+import time
+import shutil
+import threading
+
+from .settings_manager import get_setting
+
+# Caché local de ZIPs descargados, direccionada por contenido:
+#   <cache>/blobs/<sha256>   -> el archivo
+#   <cache>/index.json       -> url -> sha256, sha256 -> (tamaño, último uso) y estadísticas
+# Varias URLs pueden apuntar al mismo blob (mirrors, redirecciones).
+
+DEFAULT_MAX_MB = 2048
+INDEX_NAME = "index.json"
+
+_lock = threading.RLock()
+
+
+def default_cache_dir():
+    base = os.environ.get("LOCALAPPDATA") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "MQTT_Launcher", "artifacts")
+
+
+class ArtifactCache:
+    def __init__(self, cache_dir=None, max_bytes=None):
+        self.cache_dir = cache_dir or get_setting("artifact_cache_dir") or default_cache_dir()
+        if max_bytes is None:
+            max_bytes = int(get_setting("artifact_cache_max_mb", DEFAULT_MAX_MB)) * 1024 ** 2
+        self.max_bytes = max_bytes
+        self.blob_dir = os.path.join(self.cache_dir, "blobs")
+        self.index_path = os.path.join(self.cache_dir, INDEX_NAME)
+        os.makedirs(self.blob_dir, exist_ok=True)
+
+    # --- índice ---
+
+    def _load_index(self):
+        try:
+            with open(self.index_path, "r") as f:
+                index = json.load(f)
+        except:
+            index = {}
+        index.setdefault("urls", {})
+        index.setdefault("blobs", {})
+        index.setdefault("stats", {"hits": 0, "misses": 0, "bytes_saved": 0})
+        return index
+
+    def _save_index(self, index):
+        tmp = self.index_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(index, f, indent=2)
+        os.replace(tmp, self.index_path)
+
+    def blob_path(self, sha256):
+        return os.path.join(self.blob_dir, sha256)
+
+    # --- API ---
+
+    def lookup(self, url=None, sha256=None):
+        """
+        Busca un artefacto por hash (si se conoce) o por URL.
+        Devuelve (ruta_del_blob, sha256) o (None, None). Actualiza estadísticas y LRU.
+        """
+        with _lock:
+            index = self._load_index()
+            digest = sha256 or index["urls"].get(url)
+            entry = index["blobs"].get(digest) if digest else None
+            path = self.blob_path(digest) if entry else None
+
+            if entry and (not os.path.exists(path) or os.path.getsize(path) != entry["size"]):
+                # Blob borrado o corrupto a mano: lo olvidamos
+                index["blobs"].pop(digest, None)
+                entry = None
+
+            if entry:
+                entry["last_used"] = time.time()
+                index["stats"]["hits"] += 1
+                index["stats"]["bytes_saved"] += entry["size"]
+                if url:
+                    index["urls"][url] = digest
+                self._save_index(index)
+                return path, digest
+
+            index["stats"]["misses"] += 1
+            self._save_index(index)
+            return None, None
+
+    def store(self, url, file_path, sha256):
+        """
+        Mueve 'file_path' dentro de la caché bajo su hash y aplica la política LRU.
+        Devuelve la ruta del blob.
+        """
+        with _lock:
+            dest = self.blob_path(sha256)
+            if not os.path.exists(dest):
+                try:
+                    os.replace(file_path, dest)
+                except OSError:
+                    # Distinto volumen: copiamos y borramos
+                    shutil.copyfile(file_path, dest + ".tmp")
+                    os.replace(dest + ".tmp", dest)
+                    os.remove(file_path)
+            elif os.path.exists(file_path) and os.path.abspath(file_path) != dest:
+                os.remove(file_path)
+
+            index = self._load_index()
+            index["urls"][url] = sha256
+            index["blobs"][sha256] = {"size": os.path.getsize(dest), "last_used": time.time()}
+            self._evict(index, keep=sha256)
+            self._save_index(index)
+            return dest
+
+    def _evict(self, index, keep=None):
+        """Borra los blobs menos usados hasta quedar por debajo de max_bytes."""
+        blobs = index["blobs"]
+        total = sum(b["size"] for b in blobs.values())
+        for digest in sorted(blobs, key=lambda d: blobs[d]["last_used"]):
+            if total <= self.max_bytes:
+                break
+            if digest == keep:
+                continue
+            try:
+                os.remove(self.blob_path(digest))
+            except OSError:
+                pass
+            total -= blobs.pop(digest)["size"]
+        index["urls"] = {u: d for u, d in index["urls"].items() if d in blobs}
+
+    def stats(self):
+        with _lock:
+            index = self._load_index()
+            stats = dict(index["stats"])
+            stats["entries"] = len(index["blobs"])
+            stats["bytes"] = sum(b["size"] for b in index["blobs"].values())
+            return stats
+
@@ -0,0 +1,917 @@
+import json
+import math
+
+# =========================================================
+# === MODELO FÍSICO =======================================
+# =========================================================
+
+WIFI_LIMIT_KB = 2000.0
+PPS_LIMIT = 5000.0
+CPU_LIMIT = 5000.0
+IOPS_LIMIT = 10.0
+COMPRESSION_RATIO = 0.20
+
+# Límites de hardware por defecto; compute_metrics acepta un dict 'limits'
+# con cualquiera de estas claves para evaluar otro equipo.
+DEFAULT_LIMITS = {
+    "wifi_kb": WIFI_LIMIT_KB,
+    "pps": PPS_LIMIT,
+    "cpu": CPU_LIMIT,
+    "iops": IOPS_LIMIT,
+}
+
+
+def _limits(limits):
+    return {**DEFAULT_LIMITS, **(limits or {})}
+
+
+# =========================================================
+# === OVERHEAD REAL EN EL CABLE (MQTT + TCP/IP + ENLACE) ==
+# =========================================================
+
+# Antes se sumaba un OVERHEAD_BYTES = 60 fijo. El overhead real depende del
+# topic (shm/<device_id>/data), de la longitud variable del "remaining length",
+# del packet id de QoS, de las propiedades MQTT 5 y del empaquetado en TCP.
+
+TOPIC_PREFIX = "shm/"
+TOPIC_SUFFIX = "/data"
+TCP_MSS = 1460
+IPV4_TCP_HEADER = 40
+TCP_TIMESTAMPS_OPTION = 12
+LINK_FRAMING = {
+    # MAC 802.11 QoS data (26) + LLC/SNAP (8) + CCMP (16) + FCS (4)
+    "wifi": 54,
+    # Ethernet (14) + FCS (4) + preámbulo e IFG (20)
+    "ethernet": 38,
+    "none": 0,
+}
+
+
+# Paquetes de control de QoS (PUBACK / PUBREC / PUBREL / PUBCOMP): 4 bytes
+# (cabecera fija + packet id; en MQTT 5 el reason code se omite si es éxito)
+QOS_CONTROL_BYTES = 4
+# Paquetes de control por PUBLISH y viajes de ida y vuelta que ocupa un slot inflight
+QOS_CONTROL_PACKETS = {0: 0, 1: 1, 2: 3}
+QOS_ROUND_TRIPS = {0: 0, 1: 1, 2: 2}
+DEFAULT_MAX_INFLIGHT = 20  # max_inflight_messages por defecto de Mosquitto
+
+
+def mqtt_wire_model(device_id_lengths=12, protocol="3.1.1", qos=0, topic_alias=False, link="wifi",
+                    coalesce=1, tcp_timestamps=True, ack_every=2, rtt_ms=20.0,
+                    max_inflight=DEFAULT_MAX_INFLIGHT):
+    """
+    Parámetros del modelo de overhead por mensaje.
+
+    device_id_lengths: longitud del device_id, o distribución {longitud: peso}
+        (o lista de longitudes observadas).
+    protocol: "3.1.1" o "5". En MQTT 5 se suma la longitud de propiedades y,
+        con topic_alias, el alias (3 B) sustituye al topic tras el primer envío.
+    coalesce: mensajes MQTT que el dispositivo agrupa por segmento TCP (Nagle o
+        publicaciones en ráfaga). 1 = un segmento por mensaje.
+    ack_every: el broker responde con un ACK TCP cada 'ack_every' segmentos
+        (con QoS 1/2 los PUBACK/PUBREC... viajan en su lugar).
+    rtt_ms, max_inflight: con QoS > 0 cada cliente sólo puede tener
+        'max_inflight' mensajes sin confirmar, así que su ritmo máximo es
+        max_inflight / (RTT x viajes por mensaje), sea cual sea el ancho de banda.
+    """
+    if isinstance(device_id_lengths, dict):
+        dist = dict(device_id_lengths)
+    elif isinstance(device_id_lengths, (list, tuple)):
+        dist = {}
+        for n in device_id_lengths:
+            dist[n] = dist.get(n, 0) + 1
+    else:
+        dist = {int(device_id_lengths): 1}
+    total = float(sum(dist.values()))
+    if str(protocol) not in ("3.1.1", "5"):
+        raise ValueError("protocol debe ser '3.1.1' o '5'")
+    if link not in LINK_FRAMING:
+        raise ValueError(f"link debe ser uno de {list(LINK_FRAMING)}")
+    if int(qos) not in QOS_CONTROL_PACKETS:
+        raise ValueError("qos debe ser 0, 1 o 2")
+
+    return {
+        "id_dist": {int(k): v / total for k, v in dist.items()},
+        "protocol": str(protocol),
+        "qos": int(qos),
+        "topic_alias": bool(topic_alias) and str(protocol) == "5",
+        "link": link,
+        "coalesce": max(1, int(coalesce)),
+        "tcp_header": IPV4_TCP_HEADER + (TCP_TIMESTAMPS_OPTION if tcp_timestamps else 0),
+        "ack_every": max(1, ack_every),
+        "rtt_ms": float(rtt_ms),
+        "max_inflight": max(1, int(max_inflight)),
+    }
+
+
+def inflight_hz_limit(wire=None):
+    """Hz máximos por dispositivo que permite la ventana inflight (inf con QoS 0)."""
+    wire = wire or DEFAULT_WIRE
+    trips = QOS_ROUND_TRIPS[wire["qos"]]
+    if not trips or wire["rtt_ms"] <= 0:
+        return float("inf")
+    return wire["max_inflight"] / (trips * wire["rtt_ms"] / 1000.0)
+
+
+DEFAULT_WIRE = mqtt_wire_model()
+
+
+def _varint_len(n):
+    # Bytes del "remaining length" (1 a 4). Sólo aritmética: vale para escalares y arrays NumPy
+    return 1 + (n >= 128) + (n >= 16384) + (n >= 2097152)
+
+
+def wire_cost(payload_bytes, wire=None):
+    """
+    Coste por mensaje publicado. Devuelve:
+      - mqtt_bytes: tamaño del paquete PUBLISH (lo que ve el broker/Telegraf)
+      - mqtt_overhead: mqtt_bytes - payload
+      - wire_bytes: bytes en el aire por mensaje, incluyendo TCP/IP, enlace y
+        ACKs del broker (prorrateados si se agrupan mensajes por segmento)
+      - packets: paquetes IP por mensaje (segmentos de datos + ACKs)
+    Con QoS 0 las respuestas son ACKs TCP puros (uno cada 'ack_every'
+    segmentos); con QoS 1 cada segmento recibe un PUBACK y con QoS 2 el
+    intercambio PUBREC/PUBREL/PUBCOMP (3 segmentos), que llevan el ACK TCP.
+    Acepta escalares o arrays NumPy en payload_bytes.
+    """
+    wire = wire or DEFAULT_WIRE
+    link = LINK_FRAMING[wire["link"]]
+    per_segment = wire["tcp_header"] + link
+    ack_bytes = wire["tcp_header"] + link
+
+    mqtt_bytes = wire_bytes = packets = 0.0
+    for id_len, weight in wire["id_dist"].items():
+        topic_len = 0 if wire["topic_alias"] else len(TOPIC_PREFIX) + id_len + len(TOPIC_SUFFIX)
+        variable_header = 2 + topic_len + (2 if wire["qos"] > 0 else 0)
+        if wire["protocol"] == "5":
+            props = 3 if wire["topic_alias"] else 0  # 0x23 + alias de 2 bytes
+            variable_header += _varint_len(props) + props
+        remaining = variable_header + payload_bytes
+        pkt = 1 + _varint_len(remaining) + remaining
+
+        # Mensajes por segmento: min(coalesce, cuántos caben en el MSS), mínimo 1.
+        # Paquetes mayores que el MSS ocupan varios segmentos.
+        fit = TCP_MSS // pkt
+        per_seg = fit - (fit - wire["coalesce"]) * (fit > wire["coalesce"])
+        per_seg = per_seg + (1 - per_seg) * (per_seg < 1)
+        segments = -(-pkt // TCP_MSS) / per_seg
+        if wire["qos"]:
+            acks = segments * QOS_CONTROL_PACKETS[wire["qos"]]
+            # Cada segmento de control lleva las respuestas de todos los mensajes del segmento
+            control_bytes = QOS_CONTROL_PACKETS[wire["qos"]] * QOS_CONTROL_BYTES
+        else:
+            acks = segments / wire["ack_every"]
+            control_bytes = 0
+
+        mqtt_bytes = mqtt_bytes + weight * pkt
+        wire_bytes = wire_bytes + weight * (pkt + control_bytes + segments * per_segment + acks * ack_bytes)
+        packets = packets + weight * (segments + acks)
+
+    return {
+        "mqtt_bytes": mqtt_bytes,
+        "mqtt_overhead": mqtt_bytes - payload_bytes,
+        "wire_bytes": wire_bytes,
+        "packets": packets,
+    }
+
+
+def real_payload_bytes(json_text: str) -> int:
+    try:
+        return len(json.dumps(json.loads(json_text), separators=(",", ":")).encode())
+    except Exception:
+        return 0
+
+
+def compute_metrics(N, Q, L, payload_bytes, limits=None, wire=None, stored_bytes=None):
+    # 'stored_bytes': bytes por punto en disco (ver core.compression); si no se
+    # da, se usa el tamaño del mensaje por COMPRESSION_RATIO
+    lim = _limits(limits)
+
+    # Ventana inflight (QoS 1/2): por encima de este ritmo el cliente no puede publicar más
+    hz_limit = inflight_hz_limit(wire)
+    offered_msgs_per_sec = N * Q
+    msgs_per_sec = N * min(Q, hz_limit)
+    cost = wire_cost(payload_bytes, wire)
+    total_msg_size = cost["mqtt_bytes"]
+
+    # Red (bytes reales en el aire y paquetes IP, no mensajes)
+    wire_bytes_per_sec = msgs_per_sec * cost["wire_bytes"]
+    kb_per_sec = wire_bytes_per_sec / 1024.0
+    packets_per_sec = msgs_per_sec * cost["packets"]
+
+    # Disco (IOPS)
+    safe_L = max(0.01, L)
+    iops = 1.0 / safe_L
+
+    # Proyecciones
+    if stored_bytes is None:
+        stored_bytes = total_msg_size * COMPRESSION_RATIO
+    bytes_per_day_db = msgs_per_sec * stored_bytes * 3600 * 24
+    gb_per_month = (bytes_per_day_db * 30) / (1024 ** 3)
+    buffer_1h_msgs = msgs_per_sec * 3600
+    ram_mb = (buffer_1h_msgs * total_msg_size * 2) / (1024 ** 2)
+
+    # --- CÁLCULOS DE CONFIGURACIÓN ---
+
+    # 1. Batch Size
+    # Debe ser lo suficientemente grande para contener todos los mensajes que llegan
+    # durante el tiempo de espera (L), más un 20% de margen.
+    batch = max(int(msgs_per_sec * L * 1.2), 1000)
+
+    # 2. Buffer Limit
+    # Debe poder guardar 1 hora de datos en RAM si se cae la red.
+    buffer_limit = int(max(10000, buffer_1h_msgs))
+
+    # 3. Jitter (Aleatoriedad)
+    # Importante para que no todos los procesos escriban en el milisegundo 000 exacto.
+    jitter = L * 0.1
+
+    return {
+        "msgs_per_sec": msgs_per_sec,
+        "offered_msgs_per_sec": offered_msgs_per_sec,
+        "kb_per_sec": kb_per_sec,
+        "iops": iops,
+        "payload_bytes": payload_bytes,
+        "msg_bytes": total_msg_size,
+        "wire_bytes_per_msg": cost["wire_bytes"],
+        "packets_per_sec": packets_per_sec,
+        "stored_bytes_per_point": stored_bytes,
+        "gb_per_month": gb_per_month,
+        "ram_mb": ram_mb,
+
+        "batch": batch,
+        "buffer_limit": buffer_limit,
+        "jitter": jitter,
+
+        "wifi_pct": (kb_per_sec / lim["wifi_kb"]) * 100,
+        "pps_pct": (packets_per_sec / lim["pps"]) * 100,
+        "cpu_pct": (msgs_per_sec / lim["cpu"]) * 100,
+        "disk_pct": (iops / lim["iops"]) * 100,
+        "inflight_hz_max": hz_limit,
+        "inflight_pct": (Q / hz_limit) * 100,
+    }
+
+
+def consumer_instances(cpu_pct, max_pct=80.0):
+    """
+    Instancias de Telegraf (suscripción compartida $share) para que ninguna
+    pase de 'max_pct' de un núcleo parseando. cpu_pct es el de compute_metrics.
+    """
+    return max(1, math.ceil(cpu_pct / max_pct))
+
+
+# =========================================================
+# === ESTADÍSTICAS DE PAYLOAD SOBRE CAPTURAS REALES =======
+# =========================================================
+
+class PayloadStats:
+    """
+    Distribución del tamaño compacto de los payloads de una captura.
+
+    Guarda un histograma tamaño -> cantidad: la memoria depende del número de
+    tamaños distintos (acotado por el tamaño máximo), no del número de mensajes,
+    y los percentiles salen exactos.
+    """
+
+    def __init__(self):
+        self.hist = {}
+        self.count = 0
+        self.total = 0
+        self.invalid = 0
+
+    def add(self, size):
+        self.hist[size] = self.hist.get(size, 0) + 1
+        self.count += 1
+        self.total += size
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0
+
+    @property
+    def max(self):
+        return max(self.hist) if self.hist else 0
+
+    def percentile(self, p):
+        """Percentil p (0-100) por el método del rango más cercano."""
+        if not self.count:
+            return 0
+        rank = max(1, -(-self.count * p // 100))  # ceil(count * p / 100)
+        seen = 0
+        for size in sorted(self.hist):
+            seen += self.hist[size]
+            if seen >= rank:
+                return size
+        return self.max
+
+    def summary(self):
+        return {
+            "mean": self.mean,
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+            "max": self.max,
+        }
+
+
+def payload_stats_from_jsonl(path, stats=None):
+    """
+    Lee una captura JSONL (un payload por línea) en streaming y acumula el
+    tamaño compacto de cada mensaje, igual que real_payload_bytes.
+    Las líneas vacías se ignoran; las que no son JSON se cuentan en 'invalid'.
+    """
+    stats = stats or PayloadStats()
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            size = real_payload_bytes(line)
+            if size:
+                stats.add(size)
+            else:
+                stats.invalid += 1
+    return stats
+
+
+def compute_metrics_by_percentile(N, Q, L, stats, limits=None, wire=None, stored_bytes=None):
+    """compute_metrics para el tamaño medio, p95, p99 y máximo de la captura."""
+    return {name: compute_metrics(N, Q, L, size, limits, wire, stored_bytes) for name, size in stats.summary().items()}
+
+
+# =========================================================
+# === BARRIDOS DE PARÁMETROS (NumPy) ======================
+# =========================================================
+
+# Límites evaluados en el barrido: nombre -> clave de porcentaje de compute_metrics
+GRID_LIMITS = {
+    "wifi": "wifi_pct",
+    "pps": "pps_pct",
+    "cpu": "cpu_pct",
+    "disk": "disk_pct",
+    "inflight": "inflight_pct",
+}
+
+# Por encima de esta cantidad de puntos no se guardan las matrices completas:
+# se procesa el eje N por bloques y sólo se acumula la frontera.
+GRID_MAX_POINTS = 5_000_000
+
+
+def _np():
+    try:
+        import numpy as np
+    except ImportError:
+        raise ImportError("compute_metrics_grid necesita NumPy: pip install numpy")
+    return np
+
+
+def _grid_arrays(np, N, Q, L, payload_bytes, limits=None, wire=None, stored_bytes=None):
+    """
+    Versión vectorizada de compute_metrics. N, Q, L y payload_bytes deben venir
+    ya preparados para broadcasting (ejes distintos). Mantener sincronizada con
+    compute_metrics.
+    """
+    lim = _limits(limits)
+    hz_limit = inflight_hz_limit(wire)
+    msgs_per_sec = N * np.minimum(Q, hz_limit)
+    cost = wire_cost(payload_bytes, wire)
+    total_msg_size = cost["mqtt_bytes"]
+
+    kb_per_sec = msgs_per_sec * cost["wire_bytes"] / 1024.0
+    packets_per_sec = msgs_per_sec * cost["packets"]
+
+    iops = 1.0 / np.maximum(0.01, L)
+
+    if stored_bytes is None:
+        stored_bytes = total_msg_size * COMPRESSION_RATIO
+    bytes_per_day_db = msgs_per_sec * stored_bytes * 3600 * 24
+    gb_per_month = (bytes_per_day_db * 30) / (1024 ** 3)
+    buffer_1h_msgs = msgs_per_sec * 3600
+    ram_mb = (buffer_1h_msgs * total_msg_size * 2) / (1024 ** 2)
+
+    batch = np.maximum(np.floor(msgs_per_sec * L * 1.2), 1000).astype(np.int64)
+    buffer_limit = np.maximum(10000, buffer_1h_msgs).astype(np.int64)
+    jitter = L * 0.1
+
+    return {
+        "msgs_per_sec": msgs_per_sec,
+        "offered_msgs_per_sec": N * Q,
+        "kb_per_sec": kb_per_sec,
+        "packets_per_sec": packets_per_sec,
+        "iops": iops,
+        "msg_bytes": total_msg_size,
+        "wire_bytes_per_msg": cost["wire_bytes"],
+        "stored_bytes_per_point": stored_bytes,
+        "gb_per_month": gb_per_month,
+        "ram_mb": ram_mb,
+
+        "batch": batch,
+        "buffer_limit": buffer_limit,
+        "jitter": jitter,
+
+        "wifi_pct": (kb_per_sec / lim["wifi_kb"]) * 100,
+        "pps_pct": (packets_per_sec / lim["pps"]) * 100,
+        "cpu_pct": (msgs_per_sec / lim["cpu"]) * 100,
+        "disk_pct": (iops / lim["iops"]) * 100,
+        "inflight_hz_max": np.full_like(Q, hz_limit),
+        "inflight_pct": (Q / hz_limit) * 100,
+    }
+
+
+def _axes(np, N, Q, L, payload_bytes):
+    """Convierte las 4 entradas en arrays 1D y los reparte en ejes (N, Q, L, payload)."""
+    N = np.atleast_1d(np.asarray(N, dtype=np.float64))
+    Q = np.atleast_1d(np.asarray(Q, dtype=np.float64))
+    L = np.atleast_1d(np.asarray(L, dtype=np.float64))
+    P = np.atleast_1d(np.asarray(payload_bytes, dtype=np.float64))
+    return (N[:, None, None, None], Q[None, :, None, None],
+            L[None, None, :, None], P[None, None, None, :])
+
+
+def _grid_block(args):
+    """
+    Trabajo de un bloque del eje N: devuelve, para cada límite, cuántos valores
+    de N del bloque quedan por debajo del 100 %. Función de módulo para que
+    ProcessPoolExecutor pueda serializarla.
+    """
+    N, Q, L, payload_bytes, limits, wire, stored_bytes = args
+    np = _np()
+    m = _grid_arrays(np, *_axes(np, N, Q, L, payload_bytes), limits, wire, stored_bytes)
+    counts = {}
+    for name, key in GRID_LIMITS.items():
+        ok = np.broadcast_to(m[key] < 100, (len(N), len(Q), len(L), len(payload_bytes)))
+        counts[name] = ok.sum(axis=0)
+    return counts
+
+
+def compute_metrics_grid(N, Q, L, payload_bytes, keep_metrics=None, max_points=GRID_MAX_POINTS, processes=None,
+                         limits=None, wire=None, stored_bytes=None):
+    """
+    Evalúa compute_metrics sobre el producto cartesiano N x Q x L x payload en
+    una sola pasada vectorizada.
+
+    N debe ir ordenado de menor a mayor: la carga crece con N, así que para
+    cada (Q, L, payload) la frontera de un límite es el mayor N que lo deja
+    por debajo del 100 %.
+
+    Devuelve un dict con:
+      - "frontier": {límite: array (Q, L, payload) con el N máximo; 0 si ni N[0] cabe}
+      - "frontier_all": N máximo que cumple TODOS los límites a la vez
+      - "binding": nombre del límite que satura primero en cada punto (Q, L, payload)
+      - "metrics": arrays (N, Q, L, payload) de compute_metrics, o None si el
+        barrido supera 'max_points' (o keep_metrics=False)
+
+    Si el barrido no cabe en memoria se procesa por bloques del eje N; con
+    'processes' > 1 los bloques se reparten en un ProcessPoolExecutor.
+    """
+    np = _np()
+    N = np.atleast_1d(np.asarray(N, dtype=np.float64))
+    Q = np.atleast_1d(np.asarray(Q, dtype=np.float64))
+    L = np.atleast_1d(np.asarray(L, dtype=np.float64))
+    P = np.atleast_1d(np.asarray(payload_bytes, dtype=np.float64))
+    if np.any(np.diff(N) < 0):
+        raise ValueError("N debe estar ordenado de forma ascendente")
+
+    total_points = len(N) * len(Q) * len(L) * len(P)
+    if keep_metrics is None:
+        keep_metrics = total_points <= max_points
+    metrics = None
+
+    if total_points <= max_points and not processes:
+        m = _grid_arrays(np, *_axes(np, N, Q, L, P), limits, wire, stored_bytes)
+        shape = (len(N), len(Q), len(L), len(P))
+        counts = {name: np.broadcast_to(m[key] < 100, shape).sum(axis=0) for name, key in GRID_LIMITS.items()}
+        if keep_metrics:
+            metrics = {k: np.broadcast_to(v, shape) for k, v in m.items()}
+            metrics["payload_bytes"] = np.broadcast_to(P[None, None, None, :], shape)
+    else:
+        rows = max(1, max_points // max(1, len(Q) * len(L) * len(P)))
+        blocks = [(N[i:i + rows], Q, L, P, limits, wire, stored_bytes) for i in range(0, len(N), rows)]
+        if processes and processes > 1:
+            from concurrent.futures import ProcessPoolExecutor
+            with ProcessPoolExecutor(max_workers=processes) as pool:
+                results = list(pool.map(_grid_block, blocks))
+        else:
+            results = [_grid_block(b) for b in blocks]
+        counts = {name: sum(r[name] for r in results) for name in GRID_LIMITS}
+
+    def n_at(count):
+        # count = cuántos N cumplen; el N máximo es N[count - 1]
+        return np.where(count > 0, N[np.maximum(count, 1) - 1], 0)
+
+    frontier = {name: n_at(c) for name, c in counts.items()}
+    stacked = np.stack([counts[name] for name in GRID_LIMITS])
+    names = np.array(list(GRID_LIMITS))
+
+    return {
+        "N": N, "Q": Q, "L": L, "payload_bytes": P,
+        "metrics": metrics,
+        "frontier": frontier,
+        "frontier_all": n_at(stacked.min(axis=0)),
+        "binding": names[stacked.argmin(axis=0)],
+    }
+
+
+# =========================================================
+# === SOLVER INVERSO DE CAPACIDAD =========================
+# =========================================================
+
+SOLVER_MAX = 1e9       # Por encima de esto consideramos que el límite no acota
+SOLVER_MIN_L = 0.01    # compute_metrics no baja de 10 ms de flush
+SOLVER_MAX_L = 3600.0
+
+
+def _constraints(limits, ram_budget_mb, max_pct):
+    """(nombre, función métrica->fracción del límite). Fracción <= 1 = cumple."""
+    scale = 100.0 / max_pct
+    cons = [(name, (lambda m, key=key: m[key] / 100.0 * scale)) for name, key in GRID_LIMITS.items()]
+    if ram_budget_mb:
+        cons.append(("ram", lambda m: m["ram_mb"] / ram_budget_mb))
+    return cons
+
+
+def _solve_increasing(g, integer):
+    """
+    Mayor x tal que g(x) <= 1, con g creciente en x.
+    Primero prueba la forma cerrada (g lineal: g(x) = x * g(1)); si no se
+    verifica, expande el intervalo y biseca.
+    Devuelve (x, método); x = inf si el límite no acota o no depende de x
+    (p.ej. el disco, que sólo depende de L, aunque esté justo al 100 %),
+    0 si ni x mínimo cabe.
+    """
+    lo = 1.0 if integer else 1e-6
+    g_lo = g(lo)
+    if g_lo > 1:
+        return 0, "infactible"
+    if g(SOLVER_MAX) == g_lo:
+        return float("inf"), "no depende"
+
+    # Forma cerrada
+    if g_lo > 0:
+        x = lo / g_lo
+        x = float(int(x)) if integer else x
+        if x >= lo and g(x) <= 1 + 1e-9 and g(x + (1 if integer else x * 1e-6)) > 1:
+            return x, "cerrada"
+
+    # Bisección
+    hi = lo * 2
+    while g(hi) <= 1:
+        lo, hi = hi, hi * 2
+        if hi > SOLVER_MAX:
+            return float("inf"), "no acota"
+    while hi - lo > (1 if integer else max(1e-9, lo * 1e-9)):
+        mid = (lo + hi) / 2
+        if integer:
+            mid = float(int(mid))
+        if g(mid) <= 1:
+            lo = mid
+        else:
+            hi = mid
+    return lo, "bisección"
+
+
+def _solve_decreasing(g):
+    """Menor x en [SOLVER_MIN_L, SOLVER_MAX_L] tal que g(x) <= 1, con g decreciente en x."""
+    g_max = g(SOLVER_MAX_L)
+    if g_max > 1:
+        return None, "infactible"
+    g_min = g(SOLVER_MIN_L)
+    if g_min == g_max:
+        return SOLVER_MIN_L, "no depende"
+    if g_min <= 1:
+        return SOLVER_MIN_L, "no acota"
+
+    # Forma cerrada: g(x) = c / x
+    c = g(1.0)
+    if c > 0 and SOLVER_MIN_L <= c <= SOLVER_MAX_L and g(c) <= 1 + 1e-9 and g(c * (1 - 1e-6)) > 1:
+        return c, "cerrada"
+
+    lo, hi = SOLVER_MIN_L, SOLVER_MAX_L
+    while hi - lo > 1e-6:
+        mid = (lo + hi) / 2
+        if g(mid) <= 1:
+            hi = mid
+        else:
+            lo = mid
+    return hi, "bisección"
+
+
+def solve_capacity(target, N=None, Q=None, L=None, payload_bytes=0, limits=None, ram_budget_mb=None,
+                   max_pct=100.0, wire=None):
+    """
+    Problema inverso de compute_metrics: con los límites de hardware dados,
+    ¿cuál es el máximo N (sensores), el máximo Q (Hz) o la mínima latencia
+    de flush L?
+
+    target: "N", "Q" o "L". Las otras dos variables deben darse.
+    limits: dict con wifi_kb / pps / cpu / iops (ver DEFAULT_LIMITS).
+    ram_budget_mb: presupuesto de RAM para el buffer (opcional).
+    max_pct: porcentaje de uso aceptado en cada límite (ej. 80 para dejar margen).
+    wire: modelo de overhead (ver mqtt_wire_model).
+
+    Devuelve {"value", "binding", "per_constraint": {nombre: (valor, método)}, "metrics"}.
+    'binding' es la restricción que acota primero; value es None/0 si no hay solución.
+    """
+    if target not in ("N", "Q", "L"):
+        raise ValueError("target debe ser 'N', 'Q' o 'L'")
+
+    def metrics_at(x):
+        args = {"N": N, "Q": Q, "L": L}
+        args[target] = x
+        return compute_metrics(args["N"], args["Q"], args["L"], payload_bytes, limits, wire)
+
+    per_constraint = {}
+    for name, frac in _constraints(limits, ram_budget_mb, max_pct):
+        g = lambda x, frac=frac: frac(metrics_at(x))
+        if target == "L":
+            per_constraint[name] = _solve_decreasing(g)
+        else:
+            per_constraint[name] = _solve_increasing(g, integer=(target == "N"))
+
+    if target == "L":
+        feasible = {k: v for k, v in per_constraint.items() if v[0] is not None}
+        if len(feasible) < len(per_constraint):
+            binding = next(k for k, v in per_constraint.items() if v[0] is None)
+            value = None
+        else:
+            binding = max(feasible, key=lambda k: feasible[k][0])
+            value = feasible[binding][0]
+    else:
+        binding = min(per_constraint, key=lambda k: per_constraint[k][0])
+        value = per_constraint[binding][0]
+        if value == float("inf"):
+            binding = None
+
+    ok = value is not None and value not in (0, float("inf"))
+    return {
+        "target": target,
+        "value": value,
+        "binding": binding,
+        "per_constraint": per_constraint,
+        "metrics": metrics_at(value) if ok else None,
+    }
+
+
+# =========================================================
+# === MODELO DE COLAS (colas y probabilidad de desborde) ==
+# =========================================================
+# compute_metrics da medias; aquí se dan colas de la distribución. Cada etapa
+# de la cadena broker -> Telegraf -> InfluxDB se modela como una M/D/1 cuya
+# tasa de servicio sale de los límites configurados. La cola de la espera de
+# una M/G/1 decae como P(W > t) ~ rho * exp(-theta * t), con theta la raíz
+# positiva de lambda * (E[exp(theta * S)] - 1) = theta (Cramér-Lundberg);
+# con servicio determinista E[exp(theta * S)] = exp(theta * D).
+# Las llegadas Poisson son pesimistas frente a sensores periódicos.
+
+def _md1_decay(lam, D):
+    """Raíz positiva de lam * (exp(theta * D) - 1) = theta (requiere lam * D < 1)."""
+    g = lambda th: lam * math.expm1(th * D) - th
+    hi = 1.0 / D
+    while g(hi) <= 0:
+        hi *= 2
+    lo = 0.0
+    for _ in range(100):
+        mid = (lo + hi) / 2
+        if g(mid) > 0:
+            hi = mid
+        else:
+            lo = mid
+    return (lo + hi) / 2
+
+
+def md1_stage(lam, D, p=0.99):
+    """
+    Etapa M/D/1: llegadas Poisson a 'lam' por segundo, servicio fijo de 'D' s.
+    Devuelve utilización, tiempo medio en la etapa (espera + servicio) y el
+    percentil 'p' de ese tiempo. Con rho >= 1 la cola crece sin límite (inf).
+    """
+    rho = lam * D
+    if rho >= 1:
+        return {"rho": rho, "mean": math.inf, "p": math.inf}
+    if rho <= 0:
+        return {"rho": 0.0, "mean": D, "p": D}
+    wq = rho * D / (2 * (1 - rho))
+    tail = 0.0
+    if rho > 1 - p:
+        tail = math.log(rho / (1 - p)) / _md1_decay(lam, D)
+    return {"rho": rho, "mean": wq + D, "p": tail + D}
+
+
+def _normal_sf(z):
+    return 0.5 * math.erfc(z / math.sqrt(2))
+
+def _normal_quantile(p):
+    """Inversa de la normal estándar por bisección (sólo se usa con p en (0.5, 1))."""
+    lo, hi = -10.0, 10.0
+    for _ in range(100):
+        mid = (lo + hi) / 2
+        if 1 - _normal_sf(mid) < p:
+            lo = mid
+        else:
+            hi = mid
+    return (lo + hi) / 2
+
+
+def queueing_model(N, Q, L, payload_bytes, limits=None, wire=None, outage_s=3600.0, p=0.99,
+                   buffer_limit=None, batch=None):
+    """
+    Latencia extremo a extremo en percentil 'p' y probabilidad de desbordar
+    metric_buffer_limit durante una caída de InfluxDB de 'outage_s' segundos.
+
+    Etapas: WiFi (bytes en el aire / wifi_kb), Telegraf (msgs / cpu), espera al
+    flush (lote lleno o flush_interval, más jitter) e InfluxDB (escrituras / iops).
+    El percentil total es la suma de percentiles por etapa: cota conservadora.
+    """
+    lim = _limits(limits)
+    m = compute_metrics(N, Q, L, payload_bytes, limits=limits, wire=wire)
+    lam = m["msgs_per_sec"]
+    batch = batch or m["batch"]
+    buffer_limit = buffer_limit or m["buffer_limit"]
+
+    stages = {
+        "wifi": md1_stage(lam, m["wire_bytes_per_msg"] / (lim["wifi_kb"] * 1024.0), p),
+        "telegraf": md1_stage(lam, 1.0 / lim["cpu"], p),
+    }
+    # Espera al flush: uniforme sobre el ciclo (el lote lleno lo acorta) más el jitter
+    cycle = min(L, batch / lam) if lam > 0 else L
+    stages["flush"] = {"rho": None, "mean": cycle / 2 + m["jitter"] / 2, "p": cycle * p + m["jitter"]}
+    stages["influx"] = md1_stage(m["iops"], 1.0 / lim["iops"], p)
+
+    # Caída: llegadas Poisson(lam * T) sobre el buffer ya ocupado (≈ un ciclo).
+    # Aproximación normal con corrección de continuidad.
+    backlog = lam * cycle
+    mean_in = lam * outage_s
+    room = buffer_limit - backlog
+    if mean_in <= 0:
+        overflow = 0.0 if room >= 0 else 1.0
+    else:
+        overflow = _normal_sf((room + 0.5 - mean_in) / math.sqrt(mean_in))
+
+    # Caída máxima que se aguanta con probabilidad 'p': lam*T + z*sqrt(lam*T) = room
+    z = _normal_quantile(p)
+    if lam > 0 and room > 0:
+        root = (-z + math.sqrt(z * z + 4 * room)) / 2
+        max_outage = root * root / lam
+    else:
+        max_outage = math.inf if lam <= 0 else 0.0
+
+    return {
+        "stages": stages,
+        "latency_mean": sum(s["mean"] for s in stages.values()),
+        "latency_p": sum(s["p"] for s in stages.values()),
+        "p": p,
+        "stable": all(s["rho"] is None or s["rho"] < 1 for s in stages.values()),
+        "outage_s": outage_s,
+        "overflow_prob": overflow,
+        "max_outage_s": max_outage,
+        "buffer_limit": buffer_limit,
+    }
+
+
+
+# =========================================================
+# === BUFFER DE TELEGRAF: RAM O DISCO =====================
+# =========================================================
+# Con buffer_strategy = "memory" (por defecto) la caída que se aguanta la fija
+# la RAM: 1 h de buffer son ram_mb. Con buffer_strategy = "disk" el buffer es
+# un WAL por output en buffer_directory: la RAM queda en los segmentos
+# cacheados, pero cada métrica que entra es una escritura (con fsync) y cada
+# lote confirmado por InfluxDB trunca el WAL por delante.
+
+DISK_BUFFER_ENTRY_OVERHEAD = 48    # cabecera del WAL + nombre, tags y timestamp serializados
+DISK_BUFFER_RAM_MB = 40.0          # segmentos del WAL en caché (2 x 20 MB)
+DEFAULT_DISK_BUDGET_GB = 10.0
+
+
+def buffer_strategy_model(N, Q, L, payload_bytes, limits=None, wire=None, ram_budget_mb=None,
+                          disk_budget_gb=DEFAULT_DISK_BUDGET_GB):
+    """
+    Compara buffer en RAM y en disco para la misma carga.
+    Para cada estrategia ("memory", "disk") devuelve ram_mb, disk_mb,
+    buffer_iops (escrituras/s que añade el buffer), iops_pct (escrituras de
+    InfluxDB + buffer frente a iops), outage_hours (caída de InfluxDB que se
+    aguanta sin perder datos) y buffer_limit (métricas que caben).
+    Sin 'ram_budget_mb' el buffer en RAM es el de compute_metrics (1 h).
+    """
+    lim = _limits(limits)
+    m = compute_metrics(N, Q, L, payload_bytes, limits=limits, wire=wire)
+    rate = m["msgs_per_sec"]
+    per_hour = rate * 3600
+
+    # RAM: métricas de ram_mb (1 h x2); con presupuesto, lo que quepa en él
+    ram_per_msg = m["msg_bytes"] * 2
+    if ram_budget_mb is None:
+        mem_limit = m["buffer_limit"]
+    else:
+        mem_limit = int(ram_budget_mb * 1024 ** 2 / ram_per_msg)
+    memory = {
+        "ram_mb": mem_limit * ram_per_msg / 1024 ** 2,
+        "disk_mb": 0.0,
+        "buffer_iops": 0.0,
+        "iops_pct": m["disk_pct"],
+        "outage_hours": mem_limit / per_hour if per_hour else math.inf,
+        "buffer_limit": mem_limit,
+    }
+
+    entry = m["msg_bytes"] + DISK_BUFFER_ENTRY_OVERHEAD
+    disk_limit = int(disk_budget_gb * 1024 ** 3 / entry)
+    # Lo que añade el buffer: una escritura por métrica añadida y un truncado
+    # por lote confirmado. Las escrituras a InfluxDB (m["iops"]) se suman una vez.
+    appends = rate
+    truncations = rate / m["batch"] if m["batch"] else 0.0
+    buffer_iops = appends + truncations
+    disk = {
+        "ram_mb": DISK_BUFFER_RAM_MB + m["batch"] * ram_per_msg / 1024 ** 2,
+        "disk_mb": disk_limit * entry / 1024 ** 2,
+        "buffer_iops": buffer_iops,
+        "iops_pct": (m["iops"] + buffer_iops) / lim["iops"] * 100,
+        "outage_hours": disk_limit / per_hour if per_hour else math.inf,
+        "buffer_limit": disk_limit,
+    }
+    return {"memory": memory, "disk": disk, "metrics": m}
+
+
+
+# =========================================================
+# === CARDINALIDAD Y MEMORIA DE INFLUXDB 3 ================
+# =========================================================
+# topic_parsing convierte cada device_id en un tag: N sensores = N series por
+# campo. InfluxDB 3 no tiene índice invertido (TSI) pero sí paga la
+# cardinalidad en el diccionario de tags, en la last-value cache (una entrada
+# por serie) y en el buffer consultable, que guarda en Arrow lo que llega
+# hasta que se persiste a Parquet (gen1, 10 min por defecto).
+
+GEN1_SECONDS = 600
+ARROW_TIME_BYTES = 8
+ARROW_TAG_BYTES = 4         # índice de diccionario
+ARROW_FIELD_BYTES = 8       # float64 / int64
+SERIES_OVERHEAD = 64        # por serie en diccionario y caché (claves, punteros)
+
+CARDINALITY_THRESHOLDS = {
+    "series": 1_000_000,    # series (combinaciones de tags)
+    "memory_mb": 4096,      # memoria estimada de InfluxDB
+    "lvc_mb": 512,          # last-value cache
+    "write_amp": 20.0,      # bytes escritos en disco (WAL + Parquet) por byte almacenado
+}
+
+
+def line_protocol_bytes(fields, tags, id_len=12, measurement="shm_data", value_len=10):
+    """Tamaño de una línea 'medida,tags campos ts' (lo que entra por el WAL)."""
+    tag_bytes = sum(len(name) + 2 + (id_len if name == "device_id" else 8) for name in tags)
+    field_bytes = fields * (value_len + 6)
+    return len(measurement) + tag_bytes + field_bytes + 1 + 19 + 1
+
+
+def cardinality_model(N, fields, tags=None, msgs_per_sec=0.0, stored_bytes=None, id_len=12, lvc_count=1,
+                      gen1_s=GEN1_SECONDS, thresholds=None):
+    """
+    Series, memoria y amplificación de escritura para 'N' dispositivos.
+    - tags: {nombre: valores distintos}; device_id (= N) se añade siempre. Se
+      supone que los tags son independientes (peor caso: producto cartesiano).
+    - fields: campos por punto (sin contar el tiempo).
+    - stored_bytes: bytes por punto en Parquet (modelo de compresión o medido).
+    - thresholds: umbrales propios que se mezclan con CARDINALITY_THRESHOLDS.
+    Devuelve las cifras y una lista de avisos (nombre, valor, umbral).
+    """
+    tags = dict(tags or {})
+    tags["device_id"] = N
+    series = 1
+    for distinct in tags.values():
+        series *= max(1, int(distinct))
+    field_series = series * fields
+
+    # Memoria: diccionario de series + last-value cache + buffer Arrow hasta gen1
+    tag_value_bytes = sum(id_len if name == "device_id" else 8 for name in tags)
+    dict_mb = series * (tag_value_bytes + SERIES_OVERHEAD) / 1024 ** 2
+    lvc_mb = series * lvc_count * (fields * ARROW_FIELD_BYTES + ARROW_TIME_BYTES + SERIES_OVERHEAD) / 1024 ** 2
+    row_bytes = ARROW_TIME_BYTES + ARROW_TAG_BYTES * len(tags) + ARROW_FIELD_BYTES * fields
+    # x2: mientras se persiste un gen1 se sigue llenando el siguiente
+    buffer_mb = msgs_per_sec * gen1_s * row_bytes * 2 / 1024 ** 2
+    memory_mb = dict_mb + lvc_mb + buffer_mb
+
+    # Amplificación: cada punto se escribe en el WAL y luego en Parquet
+    wal_bytes = line_protocol_bytes(fields, tags, id_len)
+    if stored_bytes is None:
+        stored_bytes = wal_bytes * COMPRESSION_RATIO
+    write_amp = (wal_bytes + stored_bytes) / stored_bytes if stored_bytes else float("inf")
+
+    # Consulta de 1 h sobre toda la flota: un Parquet por gen1 y tabla, todas las series dentro
+    files_per_hour = math.ceil(3600 / gen1_s)
+
+    result = {
+        "series": series,
+        "field_series": field_series,
+        "dict_mb": dict_mb,
+        "lvc_mb": lvc_mb,
+        "buffer_mb": buffer_mb,
+        "memory_mb": memory_mb,
+        "wal_bytes_per_point": wal_bytes,
+        "disk_bytes_per_point": wal_bytes + stored_bytes,
+        "write_amp": write_amp,
+        "files_per_hour_query": files_per_hour,
+        "series_per_fleet_query": field_series,
+    }
+
+    limits = dict(CARDINALITY_THRESHOLDS, **(thresholds or {}))
+    result["warnings"] = [(name, result[name], limit) for name, limit in limits.items()
+                          if name in result and result[name] > limit]
+    return result
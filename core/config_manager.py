@@ -1,6 +1,11 @@
 import os
 import subprocess
 
+from .sizing import agent_section, get_sizing_profile
+from .sharding import broker_ports, write_shard_map
+from .mosquitto_tuning import mosquitto_settings, mosquitto_conf_section
+from .mosquitto_auth import write_password_file, write_acl_file
+
 
 def write_file(path, content, log_callback=None):
     """Escribe contenido en un archivo, creando directorios si no existen."""
@@ -18,72 +23,106 @@ def write_file(path, content, log_callback=None):
         return False
 
 
-def configure_mosquitto(target_dir, username, password, log_callback=None):
+def configure_mosquitto(target_dir, username, password, log_callback=None, shards=1, device_ids=None,
+                        profile="dev", sizing=None, subscribers=1, device_credentials=None):
     """
     Configura Mosquitto, genera passwords y CREA EL LANZADOR .BAT
+    Con 'shards' > 1 se generan M brokers (shard_<i>/ con su data, conf y BAT,
+    puertos 1884, 1885...) que comparten el archivo de contraseñas. Si se dan
+    'device_ids' se escribe la tabla device_id -> shard (ver core.sharding).
+    'profile' (dev/throughput/durable) fija log, colas, autosave y límites de
+    memoria para la carga de 'sizing' (o el perfil guardado en la calculadora)
+    con 'subscribers' consumidores de Telegraf por broker.
+    'device_credentials' ({device_id: contraseña}) añade un usuario por
+    dispositivo y un acl_file que limita cada uno a shm/<device_id>/data.
     """
     if log_callback: log_callback("\n--- CONFIGURANDO MOSQUITTO ---")
 
     # 1. Rutas
-    data_dir = os.path.join(target_dir, "data")
     passwd_file = os.path.join(target_dir, "passwd")
-    conf_file = os.path.join(target_dir, "mosquitto.conf")
+    acl_file = os.path.join(target_dir, "acl")
 
     # Ruta donde se instala el ejecutable (Winget por defecto)
     program_files_mosquitto = r"C:\Program Files\Mosquitto"
     mosquitto_exe = os.path.join(program_files_mosquitto, "mosquitto.exe")
-    mosquitto_passwd_exe = os.path.join(program_files_mosquitto, "mosquitto_passwd.exe")
 
     # Crear carpetas necesarias
-    os.makedirs(data_dir, exist_ok=True)
+    os.makedirs(target_dir, exist_ok=True)
 
-    # 2. Generar Password (hash)
-    if os.path.exists(mosquitto_passwd_exe):
-        if log_callback: log_callback(f"Creando usuario MQTT: {username}")
-        cmd = [mosquitto_passwd_exe, "-c", "-b", passwd_file, username, password]
+    # 2. Generar Password (hash): en Python, sin lanzar mosquitto_passwd.exe por usuario
+    if log_callback: log_callback(f"Creando usuario MQTT: {username}")
+    users = {username: password}
+    if device_credentials:
+        users.update(device_credentials)
+    try:
+        write_password_file(passwd_file, users, log_callback=log_callback)
+        if log_callback: log_callback("Archivo de contraseñas generado.")
+    except (OSError, ValueError) as e:
+        if log_callback: log_callback(f"ERROR generando password: {e}")
+    acl_line = ""
+    if device_credentials:
         try:
-            # creationflags=0x08000000 oculta la consola negra momentánea
-            subprocess.run(cmd, check=True, creationflags=0x08000000)
-            if log_callback: log_callback("Archivo de contraseñas generado.")
-        except subprocess.CalledProcessError as e:
-            if log_callback: log_callback(f"ERROR generando password: {e}")
-    else:
-        if log_callback: log_callback("ADVERTENCIA: No se encontró mosquitto_passwd.exe (¿No se instaló aún?)")
-
-    # 3. Crear mosquitto.conf
-    # Importante: Rutas con doble barra para que Windows no falle
-    safe_passwd = passwd_file.replace("\\", "\\\\")
-    safe_data = data_dir.replace("\\", "\\\\")
-    if not safe_data.endswith("\\\\"): safe_data += "\\\\"
-    safe_log = os.path.join(target_dir, "mosquitto.log").replace("\\", "\\\\")
-
-    config_content = f"""listener 1884
+            write_acl_file(acl_file, readers=[username], devices=device_credentials)
+            safe_acl = acl_file.replace("\\", "\\\\")
+            acl_line = f"acl_file {safe_acl}\n"
+            if log_callback: log_callback(f"ACL por dispositivo: {acl_file}")
+        except (OSError, ValueError) as e:
+            # Sin ACL cada dispositivo podría publicar en cualquier topic: no se genera el conf
+            if log_callback: log_callback(f"ERROR generando ACL: {e}")
+            return False
+
+    shards = max(1, int(shards))
+    ports = broker_ports(shards)
+
+    # Perfil de rendimiento según la carga que ve cada broker
+    sizing = sizing or get_sizing_profile()
+    tuning = mosquitto_settings(profile, sizing["N"], sizing["Q"], sizing["payload_bytes"], shards, subscribers,
+                                log_callback=log_callback)
+    if log_callback:
+        log_callback(f"Perfil '{profile}': log {' '.join(tuning['log_type'])}"
+                     + "".join(f", {k} {v}" for k, v in tuning["options"].items()))
+    launchers = []
+    for shard, port in enumerate(ports):
+        # Un broker: carpeta raíz; varios: una carpeta por shard
+        shard_dir = os.path.join(target_dir, f"shard_{shard}") if shards > 1 else target_dir
+        data_dir = os.path.join(shard_dir, "data")
+        conf_file = os.path.join(shard_dir, "mosquitto.conf")
+        os.makedirs(data_dir, exist_ok=True)
+
+        # 3. Crear mosquitto.conf
+        # Importante: Rutas con doble barra para que Windows no falle
+        safe_passwd = passwd_file.replace("\\", "\\\\")
+        safe_data = data_dir.replace("\\", "\\\\")
+        if not safe_data.endswith("\\\\"): safe_data += "\\\\"
+        safe_log = os.path.join(shard_dir, "mosquitto.log").replace("\\", "\\\\")
+
+        config_content = f"""listener {port}
 protocol mqtt
 
 allow_anonymous false
 password_file {safe_passwd}
-
+{acl_line}
 persistence true
 persistence_location {safe_data}
 
-log_dest file {safe_log}
-log_dest stdout
-log_type all
-"""
-    write_file(conf_file, config_content, log_callback)
+{mosquitto_conf_section(tuning, safe_log)}"""
+        write_file(conf_file, config_content, log_callback)
 
-    # --- 4. CREAR SCRIPT DE ARRANQUE (.BAT) ---
-    # Este es el paso nuevo que pediste.
+        # --- 4. CREAR SCRIPT DE ARRANQUE (.BAT) ---
+        # Este es el paso nuevo que pediste.
 
-    bat_path = os.path.join(target_dir, "3_INICIAR_MQTT.bat")
+        suffix = f"_{shard}" if shards > 1 else ""
+        bat_path = os.path.join(target_dir, f"3_INICIAR_MQTT{suffix}.bat")
 
-    # Explicación del BAT:
-    # 1. @echo off: Limpia la pantalla.
-    # 2. cd /d ...: Cambia al directorio del ejecutable (Vital para que cargue las DLLs).
-    # 3. mosquitto.exe -c ... -v: Ejecuta usando TU archivo de config y modo verbose (-v).
+        # Explicación del BAT:
+        # 1. @echo off: Limpia la pantalla.
+        # 2. cd /d ...: Cambia al directorio del ejecutable (Vital para que cargue las DLLs).
+        # 3. mosquitto.exe -c ... -v: Ejecuta usando TU archivo de config y modo verbose (-v).
+        #    El -v sólo en el perfil dev: registra cada mensaje.
+        verbose = " -v" if tuning["verbose"] else ""
 
-    bat_content = f"""@echo off
-title Servidor Mosquitto MQTT (Puerto 1884)
+        bat_content = f"""@echo off
+title Servidor Mosquitto MQTT (Puerto {port})
 echo ---------------------------------------------------
 echo INICIANDO SERVIDOR MQTT
 echo Conf: "{conf_file}"
@@ -93,7 +132,7 @@ echo.
 cd /d "{program_files_mosquitto}"
 
 if exist mosquitto.exe (
-    mosquitto.exe -c "{conf_file}" -v
+    mosquitto.exe -c "{conf_file}"{verbose}
 ) else (
     echo ERROR: No se encuentra mosquitto.exe en:
     echo {program_files_mosquitto}
@@ -102,35 +141,39 @@ if exist mosquitto.exe (
 )
 pause
 """
-
-    if write_file(bat_path, bat_content, log_callback):
-        if log_callback:
-            log_callback("\n[¡LISTO!]")
-            log_callback(f"He creado el lanzador en: {bat_path}")
-            log_callback("Dale doble clic a ese archivo para iniciar el servidor.")
+        if write_file(bat_path, bat_content, log_callback):
+            launchers.append(bat_path)
+
+    if shards > 1:
+        # Lanzador general: un broker por ventana (cada uno en su núcleo)
+        bat_path = os.path.join(target_dir, "3_INICIAR_MQTT.bat")
+        starts = "\n".join(f'start "" "{path}"' for path in launchers)
+        if write_file(bat_path, f"@echo off\necho Iniciando {shards} brokers MQTT...\n{starts}\n", log_callback):
+            launchers.append(bat_path)
+        if device_ids:
+            write_shard_map(target_dir, device_ids, shards, log_callback=log_callback)
+        elif log_callback:
+            log_callback("Sin lista de dispositivos: el firmware calcula su shard con CRC32(device_id) % "
+                         f"{shards} (puertos {ports[0]}-{ports[-1]}).")
+
+    if launchers and log_callback:
+        log_callback("\n[¡LISTO!]")
+        log_callback(f"He creado el lanzador en: {launchers[-1]}")
+        log_callback("Dale doble clic a ese archivo para iniciar el servidor.")
 
     return True
 
 
-def configure_telegraf(influx_url, influx_token, org, bucket, log_callback=None):
+def configure_telegraf(influx_url, influx_token, org, bucket, log_callback=None, sizing=None):
     # Ruta típica de Telegraf
     path = r"C:\Program Files\Telegraf\telegraf.conf"
 
+    # [agent] dimensionado con 'sizing' ({N, Q, L, payload_bytes}) o el perfil guardado
+    agent = agent_section(sizing, precision="", debug=False, quiet=False, logfile="", hostname="",
+                          omit_hostname=False)
+
     config_content = f"""
-[agent]
-  interval = "1.0s"
-  round_interval = true
-  metric_batch_size = 1200
-  metric_buffer_limit = 3600000
-  collection_jitter = "0s"
-  flush_interval = "1s"
-  flush_jitter = "0.1s"
-  precision = ""
-  debug = false
-  quiet = false
-  logfile = ""
-  hostname = ""
-  omit_hostname = false
+{agent}
 
 [[outputs.influxdb_v2]]
   urls = ["{influx_url}"]
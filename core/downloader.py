@@ -0,0 +1,366 @@
+import os
+import json
+import hashlib
+import ssl
+import time
+import threading
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+CHUNK_SIZE = 8 * 1024 * 1024  # 8 MB por petición Range
+WORKERS = 4
+RETRIES = 3
+READ_BLOCK = 256 * 1024
+
+
+def _ssl_context():
+    # Misma política que download_and_extract: algunas redes rompen los certificados
+    ctx = ssl.create_default_context()
+    ctx.check_hostname = False
+    ctx.verify_mode = ssl.CERT_NONE
+    return ctx
+
+
+def _open(url, ctx, headers=None):
+    req = urllib.request.Request(url, headers=headers or {})
+    if url.lower().startswith("https"):
+        return urllib.request.urlopen(req, context=ctx, timeout=30)
+    return urllib.request.urlopen(req, timeout=30)
+
+
+def probe_url(url, ctx=None):
+    """
+    Averigua el tamaño, si el servidor acepta Range y su ETag/Last-Modified.
+    Devuelve (size o None, acepta_range, validador).
+    """
+    ctx = ctx or _ssl_context()
+    # Pedimos el primer byte: funciona aunque el servidor no implemente HEAD
+    with _open(url, ctx, headers={"Range": "bytes=0-0"}) as resp:
+        validator = resp.headers.get("ETag") or resp.headers.get("Last-Modified") or ""
+        if resp.status == 206:
+            content_range = resp.headers.get("Content-Range", "")  # bytes 0-0/12345
+            total = content_range.rsplit("/", 1)[-1]
+            return (int(total) if total.isdigit() else None), True, validator
+        length = resp.headers.get("Content-Length")
+        return (int(length) if length and length.isdigit() else None), False, validator
+
+
+class _Progress:
+    """Acumula bytes de todos los hilos y reporta velocidad cada ~1 s."""
+
+    def __init__(self, total, already, log_callback):
+        self.total = total
+        self.done = already
+        self.log_callback = log_callback
+        self.lock = threading.Lock()
+        self.t0 = time.monotonic()
+        self.last_t = self.t0
+        self.last_bytes = already
+        self.start_bytes = already
+
+    def add(self, n):
+        with self.lock:
+            self.done += n
+            now = time.monotonic()
+            if now - self.last_t < 1.0 or not self.log_callback:
+                return
+            speed = (self.done - self.last_bytes) / (now - self.last_t)
+            self.last_t, self.last_bytes = now, self.done
+            pct = f" ({self.done * 100 / self.total:.0f}%)" if self.total else ""
+            self.log_callback(f"  {self.done / 1024 ** 2:.1f} MB{pct} - {speed / 1024 ** 2:.2f} MB/s")
+
+    def summary(self):
+        """(MB descargados en esta sesión, MB/s medios)."""
+        elapsed = max(time.monotonic() - self.t0, 1e-6)
+        mb = (self.done - self.start_bytes) / 1024 ** 2
+        return mb, mb / elapsed
+
+
+def _load_state(state_path, url, size, validator, chunk_size):
+    try:
+        with open(state_path, "r") as f:
+            state = json.load(f)
+        if (state.get("url") == url and state.get("size") == size and state.get("validator") == validator
+                and state.get("chunk_size") == chunk_size):
+            return set(state.get("done", []))
+    except:
+        pass
+    return None
+
+
+def _save_state(state_path, url, size, validator, chunk_size, done):
+    tmp = state_path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump({"url": url, "size": size, "validator": validator, "chunk_size": chunk_size,
+                   "done": sorted(done)}, f)
+    os.replace(tmp, state_path)
+
+
+class _NullSink:
+    def chunk_done(self, start, end):
+        pass
+
+    def close(self):
+        pass
+
+
+class _OrderedHasher:
+    """
+    Calcula el SHA-256 durante la descarga. Los bloques terminan en cualquier
+    orden, así que se van hasheando en cuanto el prefijo contiguo está completo
+    (se releen de la caché de páginas del SO, recién escritos, no de la red).
+    """
+
+    def __init__(self, part_path, chunks):
+        self.part_path = part_path
+        self.chunks = chunks
+        self.sha = hashlib.sha256()
+        self.next = 0
+        self.ready = set()
+
+    def chunk_done(self, index):
+        self.ready.add(index)
+        if self.next not in self.ready:
+            return
+        with open(self.part_path, "rb") as f:
+            while self.next in self.ready:
+                _, start, end = self.chunks[self.next]
+                f.seek(start)
+                remaining = end - start + 1
+                while remaining:
+                    block = f.read(min(READ_BLOCK, remaining))
+                    if not block:
+                        raise IOError("Archivo parcial truncado")
+                    self.sha.update(block)
+                    remaining -= len(block)
+                self.ready.discard(self.next)
+                self.next += 1
+
+    def hexdigest(self):
+        if self.next != len(self.chunks):
+            raise IOError("Hash incompleto: faltan bloques")
+        return self.sha.hexdigest()
+
+
+def _fetch_chunk(url, ctx, part_path, start, end, progress):
+    """Descarga [start, end] y lo escribe en su offset del archivo .part."""
+    for attempt in range(RETRIES):
+        written = 0
+        try:
+            with _open(url, ctx, headers={"Range": f"bytes={start}-{end}"}) as resp:
+                if resp.status != 206:
+                    raise IOError(f"El servidor ignoró el Range (HTTP {resp.status})")
+                with open(part_path, "r+b") as f:
+                    f.seek(start)
+                    while True:
+                        block = resp.read(READ_BLOCK)
+                        if not block:
+                            break
+                        f.write(block)
+                        written += len(block)
+                        progress.add(len(block))
+            if written != end - start + 1:
+                raise IOError(f"Chunk incompleto: {written} de {end - start + 1} bytes")
+            return
+        except Exception:
+            progress.add(-written)
+            if attempt == RETRIES - 1:
+                raise
+            time.sleep(0.5 * (attempt + 1))
+
+
+def _download_single(url, ctx, dest_path, total, log_callback):
+    """Camino clásico (un solo stream) para servidores sin soporte de Range."""
+    progress = _Progress(total, 0, log_callback)
+    sha = hashlib.sha256()
+    part_path = dest_path + ".part"
+    with _open(url, ctx) as resp, open(part_path, "wb") as out_file:
+        while True:
+            block = resp.read(READ_BLOCK)
+            if not block:
+                break
+            out_file.write(block)
+            sha.update(block)
+            progress.add(len(block))
+    os.replace(part_path, dest_path)
+    return progress, sha.hexdigest()
+
+
+def download_file(url, dest_path, log_callback=None, workers=WORKERS, chunk_size=CHUNK_SIZE, sink=None):
+    """
+    Descarga 'url' en 'dest_path' usando peticiones HTTP Range en paralelo.
+
+    El progreso se guarda en '<dest>.part.state'; si la descarga se corta,
+    la siguiente llamada sólo pide los trozos que faltan. Si el servidor no
+    acepta Range, se usa una descarga normal de un solo stream.
+
+    'sink' (opcional) recibe sink.chunk_done(start, end) por cada bloque ya
+    escrito en '<dest>.part' y sink.close() antes de renombrarlo; así se puede
+    consumir el archivo mientras se descarga (ver StreamingExtractor).
+    Sólo se usa en modo Range: en descarga simple el archivo llega en orden y
+    se entrega completo.
+
+    Devuelve el SHA-256 (hex) del archivo, calculado mientras se descarga.
+    """
+    ctx = _ssl_context()
+    size, accepts_range, validator = probe_url(url, ctx)
+
+    if not accepts_range or not size:
+        if log_callback: log_callback("El servidor no acepta descargas por rangos. Descarga simple...")
+        progress, digest = _download_single(url, ctx, dest_path, size, log_callback)
+    else:
+        part_path = dest_path + ".part"
+        state_path = part_path + ".state"
+        chunks = [(i, start, min(start + chunk_size, size) - 1)
+                  for i, start in enumerate(range(0, size, chunk_size))]
+        sink = sink if sink is not None else _NullSink()
+
+        done = _load_state(state_path, url, size, validator, chunk_size) if os.path.exists(part_path) else None
+        if done is None:
+            done = set()
+            with open(part_path, "wb") as f:
+                f.truncate(size)  # Reservamos el archivo completo para escribir por offsets
+        elif log_callback:
+            log_callback(f"Reanudando descarga: {len(done)}/{len(chunks)} bloques ya descargados.")
+
+        # El último bloque primero: en un ZIP contiene el directorio central,
+        # que es lo que hace falta para empezar a extraer durante la descarga
+        pending = [c for c in chunks[-1:] + chunks[:-1] if c[0] not in done]
+        already = sum(end - start + 1 for i, start, end in chunks if i in done)
+        progress = _Progress(size, already, log_callback)
+        state_lock = threading.Lock()
+        hasher = _OrderedHasher(part_path, chunks)
+        for i in sorted(done):
+            hasher.chunk_done(i)
+            sink.chunk_done(chunks[i][1], chunks[i][2])
+
+        if log_callback:
+            log_callback(f"Tamaño: {size / 1024 ** 2:.1f} MB en {len(chunks)} bloques, {workers} conexiones.")
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(_fetch_chunk, url, ctx, part_path, start, end, progress): i
+                       for i, start, end in pending}
+            try:
+                for fut in as_completed(futures):
+                    fut.result()
+                    with state_lock:
+                        done.add(futures[fut])
+                        _save_state(state_path, url, size, validator, chunk_size, done)
+                    hasher.chunk_done(futures[fut])
+                    _, start, end = chunks[futures[fut]]
+                    sink.chunk_done(start, end)
+            except BaseException:
+                for f in futures:
+                    f.cancel()
+                sink.close()
+                raise
+
+        digest = hasher.hexdigest()
+        sink.close()
+        os.replace(part_path, dest_path)
+        try:
+            os.remove(state_path)
+        except OSError:
+            pass
+
+    mb, mbps = progress.summary()
+    if log_callback: log_callback(f"Descargados {mb:.1f} MB a {mbps:.2f} MB/s de media.")
+    return digest
+
+
+if __name__ == "__main__":
+    # Comprobación contra un http.server local con soporte de Range:
+    #   1. descarga por rangos en paralelo,
+    #   2. corte a mitad de descarga y reanudación (sólo se piden los bloques que faltan),
+    #   3. servidor que ignora Range (descarga simple).
+    # En los tres casos se compara el SHA-256 devuelto con el del archivo original.
+    # Uso: python -m core.downloader
+    import re
+    import tempfile
+    import http.server
+
+    class RangeHandler(http.server.BaseHTTPRequestHandler):
+        data = b""
+        ignore_range = False
+        fail_after = None   # Nº de peticiones Range con offset > 0 que se sirven antes de cortar
+        served = 0          # Bytes enviados (para comprobar que la reanudación no repite bloques)
+
+        def log_message(self, *args):
+            pass
+
+        def send_body(self, body):
+            try:
+                self.wfile.write(body)
+                type(self).served += len(body)
+            except ConnectionError:
+                pass  # El cliente cierra tras leer lo que necesita (p.ej. el sondeo de probe_url)
+
+        def do_GET(self):
+            cls, data = type(self), self.data
+            match = re.match(r"bytes=(\d+)-(\d*)$", self.headers.get("Range", ""))
+            if not match or cls.ignore_range:
+                self.send_response(200)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.send_body(data)
+                return
+
+            start = int(match.group(1))
+            end = min(int(match.group(2)) if match.group(2) else len(data) - 1, len(data) - 1)
+            body = data[start:end + 1]
+            if start > 0 and cls.fail_after is not None:
+                if cls.fail_after <= 0:
+                    body = body[:10]  # Conexión cortada: menos bytes de los anunciados
+                else:
+                    cls.fail_after -= 1
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(data)}")
+            self.send_header("Content-Length", str(end - start + 1))
+            self.send_header("ETag", '"v1"')
+            self.end_headers()
+            self.send_body(body)
+
+    RangeHandler.data = os.urandom(5 * 1024 * 1024 + 123)
+    expected = hashlib.sha256(RangeHandler.data).hexdigest()
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), RangeHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/archivo.bin"
+    chunk = 256 * 1024
+
+    def check(label, digest, served):
+        status = "OK" if digest == expected else "FALLO"
+        print(f"{label:<24} sha256 {status}  servidos {served / 1024 ** 2:.2f} MB "
+              f"de {len(RangeHandler.data) / 1024 ** 2:.2f} MB")
+        if digest != expected:
+            raise SystemExit(1)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # 1. Rangos en paralelo
+        dest = os.path.join(tmp, "rangos.bin")
+        RangeHandler.served = 0
+        check("rangos", download_file(url, dest, workers=4, chunk_size=chunk), RangeHandler.served)
+
+        # 2. Corte y reanudación
+        dest = os.path.join(tmp, "reanudado.bin")
+        RangeHandler.served, RangeHandler.fail_after = 0, 8
+        try:
+            download_file(url, dest, workers=4, chunk_size=chunk)
+            raise SystemExit("La descarga debía cortarse")
+        except IOError as e:
+            first = RangeHandler.served
+            print(f"{'corte':<24} {e} (.part.state: {os.path.exists(dest + '.part.state')})")
+        RangeHandler.served, RangeHandler.fail_after = 0, None
+        logs = []
+        digest = download_file(url, dest, log_callback=logs.append, workers=4, chunk_size=chunk)
+        print(f"{'':<24} {next(m for m in logs if m.startswith('Reanudando'))}")
+        check("reanudado", digest, RangeHandler.served)
+        if RangeHandler.served >= len(RangeHandler.data) or first + RangeHandler.served < len(RangeHandler.data):
+            raise SystemExit("La reanudación no pidió sólo los bloques que faltaban")
+
+        # 3. Servidor sin Range
+        dest = os.path.join(tmp, "simple.bin")
+        RangeHandler.served, RangeHandler.ignore_range = 0, True
+        check("sin Range (simple)", download_file(url, dest, workers=4, chunk_size=chunk), RangeHandler.served)
+
+    server.shutdown()
+    print("ok")
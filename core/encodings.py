@@ -0,0 +1,420 @@
+import json
+import struct
+import time
+
+# Comparación de codificaciones de payload: JSON, MessagePack, CBOR y binario
+# empaquetado. Si están instaladas se usan las librerías 'msgpack' y 'cbor2'
+# (lo que usaría el firmware/servidor real); si no, una implementación mínima
+# en Python puro de ambos formatos, suficiente para medir tamaño y dar un orden
+# de magnitud del coste de codificar/decodificar.
+
+
+# =========================================================
+# === MessagePack (implementación mínima) =================
+# =========================================================
+
+def _mp_encode(obj, out):
+    if obj is None:
+        out.append(0xc0)
+    elif obj is True:
+        out.append(0xc3)
+    elif obj is False:
+        out.append(0xc2)
+    elif isinstance(obj, int):
+        if 0 <= obj < 128:
+            out.append(obj)
+        elif -32 <= obj < 0:
+            out += struct.pack("b", obj)
+        elif obj >= 0:
+            for code, fmt, top in ((0xcc, ">B", 1 << 8), (0xcd, ">H", 1 << 16), (0xce, ">I", 1 << 32),
+                                   (0xcf, ">Q", 1 << 64)):
+                if obj < top:
+                    out.append(code)
+                    out += struct.pack(fmt, obj)
+                    break
+            else:
+                raise ValueError(f"Entero fuera de rango en MessagePack (máx. 64 bits sin signo): {obj}")
+        else:
+            for code, fmt, low in ((0xd0, ">b", -(1 << 7)), (0xd1, ">h", -(1 << 15)), (0xd2, ">i", -(1 << 31)),
+                                   (0xd3, ">q", -(1 << 63))):
+                if obj >= low:
+                    out.append(code)
+                    out += struct.pack(fmt, obj)
+                    break
+            else:
+                raise ValueError(f"Entero fuera de rango en MessagePack (mín. -2**63): {obj}")
+    elif isinstance(obj, float):
+        out.append(0xcb)
+        out += struct.pack(">d", obj)
+    elif isinstance(obj, str):
+        data = obj.encode("utf-8")
+        n = len(data)
+        if n < 32:
+            out.append(0xa0 | n)
+        elif n < 256:
+            out += bytes((0xd9, n))
+        elif n < 65536:
+            out.append(0xda)
+            out += struct.pack(">H", n)
+        else:
+            out.append(0xdb)
+            out += struct.pack(">I", n)
+        out += data
+    elif isinstance(obj, (list, tuple)):
+        n = len(obj)
+        if n < 16:
+            out.append(0x90 | n)
+        elif n < 65536:
+            out.append(0xdc)
+            out += struct.pack(">H", n)
+        else:
+            out.append(0xdd)
+            out += struct.pack(">I", n)
+        for item in obj:
+            _mp_encode(item, out)
+    elif isinstance(obj, dict):
+        n = len(obj)
+        if n < 16:
+            out.append(0x80 | n)
+        elif n < 65536:
+            out.append(0xde)
+            out += struct.pack(">H", n)
+        else:
+            out.append(0xdf)
+            out += struct.pack(">I", n)
+        for k, v in obj.items():
+            _mp_encode(k, out)
+            _mp_encode(v, out)
+    else:
+        raise TypeError(f"Tipo no soportado en MessagePack: {type(obj).__name__}")
+
+
+_MP_FIXED = {0xcc: ">B", 0xcd: ">H", 0xce: ">I", 0xcf: ">Q", 0xd0: ">b", 0xd1: ">h", 0xd2: ">i", 0xd3: ">q",
+             0xca: ">f", 0xcb: ">d"}
+
+
+def _mp_decode(data, pos):
+    b = data[pos]
+    pos += 1
+    if b < 0x80:
+        return b, pos
+    if b >= 0xe0:
+        return b - 256, pos
+    if 0xa0 <= b <= 0xbf:
+        n = b & 0x1f
+        return data[pos:pos + n].decode("utf-8"), pos + n
+    if 0x90 <= b <= 0x9f:
+        return _mp_array(data, pos, b & 0x0f)
+    if 0x80 <= b <= 0x8f:
+        return _mp_map(data, pos, b & 0x0f)
+    if b == 0xc0:
+        return None, pos
+    if b in (0xc2, 0xc3):
+        return b == 0xc3, pos
+    if b in _MP_FIXED:
+        fmt = _MP_FIXED[b]
+        return struct.unpack_from(fmt, data, pos)[0], pos + struct.calcsize(fmt)
+    if b in (0xd9, 0xda, 0xdb):
+        fmt = {0xd9: ">B", 0xda: ">H", 0xdb: ">I"}[b]
+        n = struct.unpack_from(fmt, data, pos)[0]
+        pos += struct.calcsize(fmt)
+        return data[pos:pos + n].decode("utf-8"), pos + n
+    if b in (0xdc, 0xdd):
+        fmt = ">H" if b == 0xdc else ">I"
+        n = struct.unpack_from(fmt, data, pos)[0]
+        return _mp_array(data, pos + struct.calcsize(fmt), n)
+    if b in (0xde, 0xdf):
+        fmt = ">H" if b == 0xde else ">I"
+        n = struct.unpack_from(fmt, data, pos)[0]
+        return _mp_map(data, pos + struct.calcsize(fmt), n)
+    raise ValueError(f"Byte MessagePack no soportado: 0x{b:02x}")
+
+
+def _mp_array(data, pos, n):
+    items = []
+    for _ in range(n):
+        item, pos = _mp_decode(data, pos)
+        items.append(item)
+    return items, pos
+
+
+def _mp_map(data, pos, n):
+    result = {}
+    for _ in range(n):
+        k, pos = _mp_decode(data, pos)
+        v, pos = _mp_decode(data, pos)
+        result[k] = v
+    return result, pos
+
+
+def msgpack_dumps(obj):
+    out = bytearray()
+    _mp_encode(obj, out)
+    return bytes(out)
+
+
+def msgpack_loads(data):
+    return _mp_decode(data, 0)[0]
+
+
+# =========================================================
+# === CBOR (implementación mínima, RFC 8949) ==============
+# =========================================================
+
+def _cbor_head(major, n, out):
+    if n < 24:
+        out.append((major << 5) | n)
+    elif n < 1 << 8:
+        out += bytes(((major << 5) | 24, n))
+    elif n < 1 << 16:
+        out.append((major << 5) | 25)
+        out += struct.pack(">H", n)
+    elif n < 1 << 32:
+        out.append((major << 5) | 26)
+        out += struct.pack(">I", n)
+    elif n < 1 << 64:
+        out.append((major << 5) | 27)
+        out += struct.pack(">Q", n)
+    else:
+        raise ValueError(f"Argumento CBOR fuera de rango: {n}")
+
+
+def _cbor_encode(obj, out):
+    if obj is None:
+        out.append(0xf6)
+    elif obj is True:
+        out.append(0xf5)
+    elif obj is False:
+        out.append(0xf4)
+    elif isinstance(obj, int):
+        n, major = (obj, 0) if obj >= 0 else (-1 - obj, 1)
+        if n < 1 << 64:
+            _cbor_head(major, n, out)
+        else:
+            # Más de 64 bits: bignum (tag 2 positivo, tag 3 negativo) con los bytes big-endian
+            _cbor_head(6, 2 + major, out)
+            data = n.to_bytes((n.bit_length() + 7) // 8, "big")
+            _cbor_head(2, len(data), out)
+            out += data
+    elif isinstance(obj, float):
+        out.append(0xfb)
+        out += struct.pack(">d", obj)
+    elif isinstance(obj, str):
+        data = obj.encode("utf-8")
+        _cbor_head(3, len(data), out)
+        out += data
+    elif isinstance(obj, (bytes, bytearray)):
+        _cbor_head(2, len(obj), out)
+        out += obj
+    elif isinstance(obj, (list, tuple)):
+        _cbor_head(4, len(obj), out)
+        for item in obj:
+            _cbor_encode(item, out)
+    elif isinstance(obj, dict):
+        _cbor_head(5, len(obj), out)
+        for k, v in obj.items():
+            _cbor_encode(k, out)
+            _cbor_encode(v, out)
+    else:
+        raise TypeError(f"Tipo no soportado en CBOR: {type(obj).__name__}")
+
+
+def _cbor_decode(data, pos):
+    b = data[pos]
+    pos += 1
+    major, info = b >> 5, b & 0x1f
+
+    if major == 7:
+        if info == 20:
+            return False, pos
+        if info == 21:
+            return True, pos
+        if info == 22:
+            return None, pos
+        if info == 25:
+            return struct.unpack_from(">e", data, pos)[0], pos + 2
+        if info == 26:
+            return struct.unpack_from(">f", data, pos)[0], pos + 4
+        if info == 27:
+            return struct.unpack_from(">d", data, pos)[0], pos + 8
+        raise ValueError(f"Valor simple CBOR no soportado: {info}")
+
+    if info < 24:
+        n = info
+    elif info in (24, 25, 26, 27):
+        fmt = {24: ">B", 25: ">H", 26: ">I", 27: ">Q"}[info]
+        n = struct.unpack_from(fmt, data, pos)[0]
+        pos += struct.calcsize(fmt)
+    else:
+        raise ValueError("Longitud indefinida CBOR no soportada")
+
+    if major == 0:
+        return n, pos
+    if major == 1:
+        return -1 - n, pos
+    if major == 2:
+        return bytes(data[pos:pos + n]), pos + n
+    if major == 3:
+        return data[pos:pos + n].decode("utf-8"), pos + n
+    if major == 4:
+        items = []
+        for _ in range(n):
+            item, pos = _cbor_decode(data, pos)
+            items.append(item)
+        return items, pos
+    if major == 5:
+        result = {}
+        for _ in range(n):
+            k, pos = _cbor_decode(data, pos)
+            v, pos = _cbor_decode(data, pos)
+            result[k] = v
+        return result, pos
+    if major == 6 and n in (2, 3):
+        raw, pos = _cbor_decode(data, pos)
+        value = int.from_bytes(raw, "big")
+        return (value if n == 2 else -1 - value), pos
+    raise ValueError(f"Tipo mayor CBOR no soportado: {major}")
+
+
+def cbor_dumps(obj):
+    out = bytearray()
+    _cbor_encode(obj, out)
+    return bytes(out)
+
+
+def cbor_loads(data):
+    return _cbor_decode(data, 0)[0]
+
+
+# =========================================================
+# === Binario empaquetado (struct) ========================
+# =========================================================
+
+def _int_code(value):
+    for code, bits in (("b", 8), ("h", 16), ("i", 32), ("q", 64)):
+        if -(1 << (bits - 1)) <= value < (1 << (bits - 1)):
+            return code
+    raise ValueError(f"Entero fuera de rango: {value}")
+
+
+def _float_code(value):
+    # float32 sólo si el valor escrito (hasta 7 cifras significativas) sobrevive al viaje; si no, float64
+    f32 = struct.unpack("<f", struct.pack("<f", value))[0]
+    return "f" if float(f"{f32:.7g}") == value else "d"
+
+
+def infer_binary_layout(sample):
+    """
+    Deduce un layout struct (little-endian) a partir de un payload plano de ejemplo.
+    Devuelve [(campo, código_struct)]. Los nombres de campo NO viajan: el
+    receptor conoce el layout.
+    """
+    layout = []
+    for key, value in sample.items():
+        if isinstance(value, bool):
+            layout.append((key, "?"))
+        elif isinstance(value, int):
+            layout.append((key, _int_code(value)))
+        elif isinstance(value, float):
+            layout.append((key, _float_code(value)))
+        else:
+            raise TypeError(f"El campo '{key}' ({type(value).__name__}) no se puede empaquetar en binario")
+    return layout
+
+
+def _packer(layout):
+    st = struct.Struct("<" + "".join(code for _, code in layout))
+    names = [name for name, _ in layout]
+    encode = lambda obj: st.pack(*(obj[n] for n in names))
+    decode = lambda data: dict(zip(names, st.unpack(data)))
+    return encode, decode
+
+
+# =========================================================
+# === COMPARACIÓN =========================================
+# =========================================================
+
+def available_encoders(sample):
+    """{nombre: (codificar, decodificar, implementación)} para el payload dado."""
+    encoders = {
+        "json": (lambda o: json.dumps(o, separators=(",", ":")).encode(), json.loads, "json (stdlib)"),
+    }
+
+    try:
+        import msgpack
+        encoders["msgpack"] = (msgpack.packb, msgpack.unpackb, "msgpack (librería)")
+    except ImportError:
+        encoders["msgpack"] = (msgpack_dumps, msgpack_loads, "msgpack (Python puro)")
+
+    try:
+        import cbor2
+        encoders["cbor"] = (cbor2.dumps, cbor2.loads, "cbor2 (librería)")
+    except ImportError:
+        encoders["cbor"] = (cbor_dumps, cbor_loads, "cbor (Python puro)")
+
+    try:
+        encode, decode = _packer(infer_binary_layout(sample))
+        encoders["binary"] = (encode, decode, "struct (binario empaquetado)")
+    except (TypeError, ValueError):
+        # Textos, estructuras anidadas o enteros de más de 64 bits: no hay versión binaria plana
+        pass
+
+    return encoders
+
+
+def _rate(fn, arg, budget):
+    """Operaciones por segundo de fn(arg) midiendo durante ~'budget' segundos."""
+    n, t0 = 0, time.perf_counter()
+    batch = 32
+    while True:
+        for _ in range(batch):
+            fn(arg)
+        n += batch
+        elapsed = time.perf_counter() - t0
+        if elapsed >= budget:
+            return n / elapsed
+
+
+def compare_encodings(sample, budget=0.01):
+    """
+    Codifica 'sample' (dict) en cada formato y mide tamaño y rendimiento local.
+    Devuelve {formato: {"bytes", "encode_per_sec", "decode_per_sec", "impl"}}.
+    Si el payload no se puede representar en un formato (p.ej. un entero de
+    más de 64 bits en MessagePack) su entrada es {"bytes": None, "error", "impl"}.
+    'budget' es el tiempo de medición por operación y formato (segundos).
+    """
+    results = {}
+    for name, (encode, decode, impl) in available_encoders(sample).items():
+        try:
+            data = encode(sample)
+            decode(data)
+        except (TypeError, ValueError, OverflowError, struct.error) as e:
+            results[name] = {"bytes": None, "error": f"no representable: {e}", "impl": impl}
+            continue
+        results[name] = {
+            "bytes": len(data),
+            "encode_per_sec": _rate(encode, sample, budget),
+            "decode_per_sec": _rate(decode, data, budget),
+            "impl": impl,
+        }
+    return results
+
+
+if __name__ == "__main__":
+    # Comprobación rápida: enteros de 64 bits y mayores en cada formato.
+    # Uso: python -m core.encodings
+    for value in (2 ** 64 - 1, -2 ** 63, 2 ** 64, -2 ** 63 - 1, 123456789012345678901234567890):
+        assert cbor_loads(cbor_dumps({"v": value})) == {"v": value}, value
+        if -2 ** 63 <= value < 2 ** 64:
+            assert msgpack_loads(msgpack_dumps({"v": value})) == {"v": value}, value
+        else:
+            try:
+                msgpack_dumps({"v": value})
+                raise AssertionError(f"MessagePack aceptó {value}")
+            except ValueError:
+                pass
+        results = compare_encodings({"ts": 1, "big": value}, budget=0.001)
+        for name, r in results.items():
+            print(f"{value:>32} {name:<8} {r['error'] if r['bytes'] is None else str(r['bytes']) + ' B'}")
+    assert compare_encodings({"ts": 1, "big": 2 ** 64}, budget=0.001)["msgpack"]["bytes"] is None
+    print("ok")
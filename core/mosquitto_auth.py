@@ -0,0 +1,161 @@
+import os
+import csv
+import json
+import base64
+import hashlib
+import secrets
+
+# Archivo de contraseñas de Mosquitto sin mosquitto_passwd.exe (un proceso por
+# usuario son minutos para 10.000 dispositivos). Formato de Mosquitto 2:
+#   usuario:$7$<iteraciones>$<sal base64>$<hash base64>
+# con hash = PBKDF2-HMAC-SHA512(contraseña, sal de 12 bytes, 101 iteraciones).
+#
+# En una segunda ejecución sólo se recalculan los usuarios nuevos o con otra
+# contraseña. Para saberlo sin repetir el PBKDF2 se guarda junto al passwd un
+# .state con SHA-256(entrada + contraseña) por usuario: es un hash rápido, así
+# que sólo vale para contraseñas aleatorias como las de generate_device_credentials
+# (y el .state es tan sensible como la lista de credenciales).
+
+PBKDF2_ITERATIONS = 101
+SALT_BYTES = 12
+PASSWORD_BYTES = 18          # secrets.token_urlsafe -> 24 caracteres
+PARALLEL_MIN_USERS = 2000    # por debajo, el arranque de procesos cuesta más que el hash
+
+
+def hash_password(password, salt=None, iterations=PBKDF2_ITERATIONS):
+    salt = salt if salt is not None else os.urandom(SALT_BYTES)
+    digest = hashlib.pbkdf2_hmac("sha512", password.encode("utf-8"), salt, iterations)
+    return f"$7${iterations}${base64.b64encode(salt).decode()}${base64.b64encode(digest).decode()}"
+
+
+def verify_password(entry, password):
+    try:
+        _, kind, iterations, salt, digest = entry.split("$")
+        if kind != "7":
+            return False
+        return secrets.compare_digest(hash_password(password, base64.b64decode(salt), int(iterations)), entry)
+    except ValueError:
+        return False
+
+
+def _hash_chunk(items):
+    return [(user, hash_password(password)) for user, password in items]
+
+
+def _fingerprint(entry, password):
+    return hashlib.sha256(f"{entry}\0{password}".encode("utf-8")).hexdigest()
+
+
+def read_password_file(path):
+    """{usuario: entrada} en el orden del archivo; vacío si no existe."""
+    entries = {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                user, sep, entry = line.rstrip("\r\n").partition(":")
+                if sep and user:
+                    entries[user] = entry
+    except FileNotFoundError:
+        pass
+    return entries
+
+
+def write_password_file(path, users, processes=None, log_callback=None):
+    """
+    Escribe el passwd de Mosquitto para {usuario: contraseña}; los usuarios que
+    no están en 'users' se eliminan. Sólo se hashea lo que cambió; con muchos
+    usuarios el PBKDF2 se reparte en 'processes' procesos (por defecto, todos
+    los núcleos). Devuelve {"hashed", "kept", "removed"}.
+    """
+    state_path = f"{path}.state"
+    old = read_password_file(path)
+    try:
+        with open(state_path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        state = {}
+
+    entries, pending = {}, []
+    for user, password in users.items():
+        if ":" in user:
+            raise ValueError(f"El usuario no puede contener ':': {user}")
+        entry = old.get(user)
+        if entry and state.get(user) == _fingerprint(entry, password):
+            entries[user] = entry
+        else:
+            pending.append((user, password))
+
+    processes = processes or os.cpu_count() or 1
+    if processes > 1 and len(pending) >= PARALLEL_MIN_USERS:
+        from concurrent.futures import ProcessPoolExecutor
+        size = -(-len(pending) // (processes * 4))
+        chunks = [pending[i:i + size] for i in range(0, len(pending), size)]
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            hashed = [pair for chunk in pool.map(_hash_chunk, chunks) for pair in chunk]
+    else:
+        hashed = _hash_chunk(pending)
+    entries.update(hashed)
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8", newline="\n") as f:
+        f.writelines(f"{user}:{entries[user]}\n" for user in users)
+    os.replace(tmp, path)
+    with open(f"{state_path}.{os.getpid()}.tmp", "w", encoding="utf-8") as f:
+        json.dump({user: _fingerprint(entries[user], pw) for user, pw in users.items()}, f)
+    os.replace(f"{state_path}.{os.getpid()}.tmp", state_path)
+
+    result = {"hashed": len(hashed), "kept": len(users) - len(hashed), "removed": len(set(old) - set(users))}
+    if log_callback:
+        log_callback(f"passwd: {len(users)} usuarios ({result['hashed']} hasheados, {result['kept']} sin cambios, "
+                     f"{result['removed']} eliminados)")
+    return result
+
+
+def read_credentials(path):
+    """CSV device_id,password (con o sin cabecera) -> {device_id: password}."""
+    creds = {}
+    with open(path, "r", newline="", encoding="utf-8") as f:
+        for row in csv.reader(f):
+            if len(row) >= 2 and row[0].strip() and row[0] != "device_id" and not row[0].startswith("#"):
+                creds[row[0].strip()] = row[1].strip()
+    return creds
+
+
+def generate_device_credentials(device_ids, path):
+    """
+    Completa el CSV de credenciales con una contraseña aleatoria para cada
+    dispositivo que no la tenga (las existentes se respetan). Es el archivo que
+    se graba en el firmware. Devuelve {device_id: password}.
+    """
+    creds = read_credentials(path) if os.path.exists(path) else {}
+    added = [d for d in dict.fromkeys(device_ids) if d not in creds]
+    for device in added:
+        creds[device] = secrets.token_urlsafe(PASSWORD_BYTES)
+    if added or not os.path.exists(path):
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["device_id", "password"])
+            writer.writerows(creds.items())
+    return creds
+
+
+def write_acl_file(path, readers=(), devices=()):
+    """
+    ACL: cada dispositivo sólo puede publicar en shm/<device_id>/data (su
+    usuario es el device_id) y los 'readers' (Telegraf) leen shm/+/data.
+    Los dispositivos no listados en 'devices' no tienen permiso alguno.
+    Lanza ValueError si un device_id no puede ir en un topic.
+    """
+    lines = ["# Generado automáticamente: lectores (Telegraf)"]
+    for user in readers:
+        lines += [f"user {user}", "topic read shm/+/data", ""]
+    lines.append("# Dispositivos: sólo su propio topic")
+    for device in devices:
+        # Un comodín o una '/' en el id daría permiso sobre topics de otros
+        if not device or any(c in device for c in "+#/") or any(c.isspace() for c in device):
+            raise ValueError(f"device_id no válido para la ACL (sin '+', '#', '/' ni espacios): {device!r}")
+        lines += [f"user {device}", f"topic write shm/{device}/data", ""]
+    with open(path, "w", encoding="utf-8", newline="\n") as f:
+        f.write("\n".join(lines))
+    return path
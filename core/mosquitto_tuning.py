@@ -0,0 +1,122 @@
+import os
+import math
+import ctypes
+
+from .capacity import wire_cost
+
+# Perfiles de rendimiento de mosquitto.conf a partir de la carga (N, Q, payload):
+#   - dev:        lo de siempre; log_type all a archivo y consola y el BAT con -v.
+#                 Cada PUBLISH se escribe dos veces: a miles de msg/s es un cuello de botella.
+#   - throughput: sólo errores y avisos a archivo, sin -v, autosave poco frecuente
+#                 y colas cortas (un minuto de mensajes por suscriptor).
+#   - durable:    autosave frecuente y colas para una hora de mensajes; el
+#                 memory_limit se dimensiona para que quepan.
+# Los límites se calculan por broker: con shards cada uno ve N/M dispositivos.
+# Las colas sólo retienen QoS 1/2 (o QoS 0 de sesiones persistentes con
+# queue_qos0_messages): para que durable proteja datos Telegraf debe suscribirse
+# con qos = 1 y persistent_session = true.
+
+PROFILES = ("dev", "throughput", "durable")
+
+MQTT_DEFAULT_INFLIGHT = 20
+MQTT_DEFAULT_QUEUED = 1000
+SUBSCRIBER_RTT = 0.05      # s; Telegraf en la misma máquina que el broker
+MSG_MEMORY_OVERHEAD = 160  # bytes por mensaje retenido (estructuras de Mosquitto y topic)
+BROKER_BASE_MEMORY = 16 * 1024 ** 2
+MEMORY_FRACTION = 0.5      # parte de la RAM física que pueden usar entre todos los brokers
+
+# Rangos que acepta mosquitto.conf (el parser rechaza o desborda fuera de ellos)
+MAX_INFLIGHT = 65535       # uint16
+MAX_INT = 2 ** 31 - 1      # max_queued_messages es un int de C
+MAX_SIZE = 2 ** 63 - 1     # max_queued_bytes / memory_limit (ssize_t)
+MAX_MESSAGE_SIZE = 268435455  # tamaño máximo de un paquete MQTT
+
+LOGGING = {
+    "dev": {"log_type": ["all"], "stdout": True, "verbose": True},
+    "throughput": {"log_type": ["error", "warning"], "stdout": False, "verbose": False},
+    "durable": {"log_type": ["error", "warning", "notice"], "stdout": False, "verbose": False},
+}
+QUEUE_SECONDS = {"throughput": 60, "durable": 3600}
+AUTOSAVE_INTERVAL = {"throughput": 3600, "durable": 60}
+
+
+def physical_memory():
+    """RAM física total en bytes, o None si no se puede averiguar."""
+    try:
+        if os.name == "nt":
+            class MEMORYSTATUSEX(ctypes.Structure):
+                _fields_ = [("dwLength", ctypes.c_ulong), ("dwMemoryLoad", ctypes.c_ulong),
+                            ("ullTotalPhys", ctypes.c_ulonglong), ("ullAvailPhys", ctypes.c_ulonglong),
+                            ("ullTotalPageFile", ctypes.c_ulonglong), ("ullAvailPageFile", ctypes.c_ulonglong),
+                            ("ullTotalVirtual", ctypes.c_ulonglong), ("ullAvailVirtual", ctypes.c_ulonglong),
+                            ("ullAvailExtendedVirtual", ctypes.c_ulonglong)]
+            status = MEMORYSTATUSEX(dwLength=ctypes.sizeof(MEMORYSTATUSEX))
+            if ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status)):
+                return int(status.ullTotalPhys)
+            return None
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def mosquitto_settings(profile, N, Q, payload_bytes, shards=1, subscribers=1, ram_bytes=None, log_callback=None):
+    """
+    Parámetros de mosquitto.conf para el perfil y la carga de un broker.
+    Devuelve {"log_type": [...], "stdout": bool, "verbose": bool, "options": {clave: valor}};
+    'options' está vacío en dev (valores por defecto de Mosquitto).
+    'subscribers' son los consumidores de Telegraf del broker (K).
+
+    Cada valor se recorta al rango de Mosquitto y el memory_limit a
+    MEMORY_FRACTION de 'ram_bytes' (por defecto la RAM física) repartida entre
+    los brokers; si las colas no caben se acortan y se avisa por 'log_callback'.
+    """
+    if profile not in PROFILES:
+        raise ValueError(f"Perfil de Mosquitto no soportado: {profile}")
+    result = dict(LOGGING[profile], options={})
+    if profile == "dev":
+        return result
+
+    # Cada consumidor recibe su parte del caudal del broker
+    rate = N * Q / max(1, shards) / max(1, subscribers)
+    msg_bytes = wire_cost(payload_bytes)["mqtt_bytes"]
+    queued = min(MAX_INT, max(MQTT_DEFAULT_QUEUED, math.ceil(rate * QUEUE_SECONDS[profile])))
+    per_message = max(1, subscribers) * (msg_bytes + MSG_MEMORY_OVERHEAD) * 2
+    memory = BROKER_BASE_MEMORY + queued * per_message
+
+    ram_bytes = ram_bytes or physical_memory()
+    if ram_bytes:
+        cap = int(ram_bytes * MEMORY_FRACTION / max(1, shards))
+        if memory > cap:
+            # 0 en max_queued_messages sería "sin límite": al menos 1
+            fit = max(1, int((cap - BROKER_BASE_MEMORY) // per_message))
+            if log_callback:
+                log_callback(f"AVISO: el perfil '{profile}' necesita {memory / 1024 ** 2:.0f} MB por broker y sólo "
+                             f"hay {cap / 1024 ** 2:.0f} MB ({MEMORY_FRACTION:.0%} de la RAM entre {max(1, shards)} "
+                             f"broker(s)). Colas recortadas a {fit} mensajes "
+                             f"({fit / max(rate, 1e-9):.0f} s de datos).")
+            queued, memory = fit, cap
+    queued_bytes = min(MAX_SIZE, int(queued * msg_bytes))
+
+    result["options"] = {
+        "max_inflight_messages": min(MAX_INFLIGHT, max(MQTT_DEFAULT_INFLIGHT, math.ceil(rate * SUBSCRIBER_RTT))),
+        "max_queued_messages": queued,
+        "max_queued_bytes": queued_bytes,
+        "autosave_interval": AUTOSAVE_INTERVAL[profile],
+        "autosave_on_changes": "false",
+        # Margen x4 sobre el payload dimensionado (p99 si vino de una captura)
+        "message_size_limit": min(MAX_MESSAGE_SIZE, max(1024, math.ceil(payload_bytes * 4 / 1024) * 1024)),
+        "memory_limit": min(MAX_SIZE, int(memory)),
+    }
+    return result
+
+
+def mosquitto_conf_section(settings, log_file):
+    """Líneas de log y de límites de mosquitto.conf ('log_file' ya escapado para Windows)."""
+    lines = [f"log_dest file {log_file}"]
+    if settings["stdout"]:
+        lines.append("log_dest stdout")
+    lines += [f"log_type {t}" for t in settings["log_type"]]
+    if settings["options"]:
+        lines.append("")
+        lines += [f"{key} {value}" for key, value in settings["options"].items()]
+    return "\n".join(lines) + "\n"
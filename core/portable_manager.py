@@ -1,49 +1,97 @@
 import os
-import zipfile
-import urllib.request
-import shutil
-import ssl
 import re
-
-
-def download_and_extract(url, target_folder, log_callback=None):
+import math
+import time
+
+from .downloader import download_file
+from .artifact_cache import ArtifactCache
+from .zip_extractor import extract_zip, find_executable, StreamingExtractor
+from .token_scanner import CREDENTIALS_FILE, get_scanner
+from .binary_schema import BinarySchema
+from .aggregation import telegraf_aggregators
+from .sizing import agent_section, get_sizing_profile
+from .capacity import DEFAULT_DISK_BUDGET_GB
+from .sharding import BASE_PORT
+
+
+def download_and_extract(url, target_folder, log_callback=None, sha256=None, use_cache=True, skip_patterns=None,
+                         pipelined=True):
     """
     Descarga un ZIP y lo descomprime en la carpeta destino.
+    Si el ZIP ya está en la caché de artefactos (por URL o por 'sha256'), no se descarga.
+    'skip_patterns' (globs) permite no extraer miembros innecesarios.
+    Con 'pipelined' los miembros se extraen mientras el resto del ZIP se sigue
+    descargando (el tiempo total tiende a max(descarga, extracción)).
     """
     try:
-        # Configuración para evitar errores de certificados SSL en algunas redes
-        ctx = ssl.create_default_context()
-        ctx.check_hostname = False
-        ctx.verify_mode = ssl.CERT_NONE
-
+        t0 = time.monotonic()
         if not os.path.exists(target_folder):
             os.makedirs(target_folder)
 
-        # 1. Definir ruta temporal para el zip
-        filename = url.split('/')[-1]
-        zip_path = os.path.join(target_folder, filename)
-
-        if log_callback: log_callback(f"Descargando desde: {url}...")
-
-        # --- CORRECCIÓN AQUÍ ---
-        # El orden correcto es: (URL, RUTA_LOCAL)
-        # Antes estaba al revés y por eso daba error "url type: c"
-        with urllib.request.urlopen(url, context=ctx) as response, open(zip_path, 'wb') as out_file:
-            shutil.copyfileobj(response, out_file)
+        cache = ArtifactCache() if use_cache else None
+        zip_path = None
 
-        if log_callback: log_callback("Descarga completada. Descomprimiendo...")
+        if cache:
+            zip_path, digest = cache.lookup(url, sha256)
+            if zip_path and log_callback:
+                log_callback(f"ZIP encontrado en caché ({digest[:12]}...). Se omite la descarga.")
 
-        # 3. Descomprimir
-        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-            zip_ref.extractall(target_folder)
-
-        # 4. Limpieza (Borrar el zip para ahorrar espacio)
-        try:
-            os.remove(zip_path)
-        except:
-            pass  # Si no se puede borrar, no es crítico
-
-        if log_callback: log_callback("Descompresión finalizada.")
+        if zip_path:
+            # 3. Descomprimir (multihilo, deja un manifiesto para localizar los .exe)
+            extract_zip(zip_path, target_folder, skip_patterns, log_callback=log_callback)
+        else:
+            # 1. Definir ruta temporal para el zip
+            filename = url.split('/')[-1]
+            zip_path = os.path.join(target_folder, filename)
+
+            if log_callback: log_callback(f"Descargando desde: {url}...")
+
+            # Descarga por rangos en paralelo; si se corta, la próxima vez se reanuda.
+            # El StreamingExtractor va descomprimiendo los miembros que ya llegaron.
+            streamer = None
+            if pipelined:
+                streamer = StreamingExtractor(zip_path + ".part", target_folder, skip_patterns,
+                                              log_callback=log_callback)
+            try:
+                digest = download_file(url, zip_path, log_callback, sink=streamer)
+            except Exception:
+                if streamer:
+                    streamer.discard()
+                raise
+
+            if sha256 and digest != sha256.lower():
+                os.remove(zip_path)
+                if streamer:
+                    # Lo extraído durante la descarga no se ha verificado: fuera
+                    streamer.discard()
+                return False, f"SHA-256 no coincide: esperado {sha256}, recibido {digest}"
+
+            if log_callback: log_callback("Descarga completada. Descomprimiendo...")
+            if streamer:
+                try:
+                    streamer.finish(zip_path)
+                except Exception:
+                    streamer.discard()
+                    raise
+            else:
+                extract_zip(zip_path, target_folder, skip_patterns, log_callback=log_callback)
+
+            if cache:
+                zip_path = cache.store(url, zip_path, digest)
+
+        if cache and log_callback:
+            st = cache.stats()
+            log_callback(f"Caché: {st['hits']} aciertos, {st['misses']} fallos, "
+                         f"{st['bytes_saved'] / 1024 ** 2:.1f} MB ahorrados.")
+
+        # 4. Limpieza (Borrar el zip para ahorrar espacio). Si está en caché se conserva.
+        if not cache:
+            try:
+                os.remove(zip_path)
+            except:
+                pass  # Si no se puede borrar, no es crítico
+
+        if log_callback: log_callback(f"Descompresión finalizada ({time.monotonic() - t0:.1f} s en total).")
         return True, "Proceso completado"
 
     except Exception as e:
@@ -54,13 +102,8 @@ def create_launcher_bat(target_folder, exe_name, log_callback=None):
     """
     Busca el .exe (incluso si está dentro de subcarpetas) y crea un .bat en la raíz.
     """
-    exe_path = None
-
-    # Buscar el ejecutable recursivamente
-    for root, dirs, files in os.walk(target_folder):
-        if exe_name in files:
-            exe_path = os.path.join(root, exe_name)
-            break
+    # Buscar el ejecutable (manifiesto de extracción o, si no hay, recursivamente)
+    exe_path = find_executable(target_folder, exe_name)
 
     if not exe_path:
         return False, f"No se encontró {exe_name} en la carpeta."
@@ -88,17 +131,9 @@ def setup_influx3_scripts(target_folder, node_id, data_dir, log_callback=None):
     """
     Crea los scripts .bat específicos para InfluxDB 3 Core con los parámetros del usuario.
     """
-    exe_name = "influxdb3.exe"  # Buscamos este nombre primero
-    exe_path = None
-
     # 1. Buscar el ejecutable (puede llamarse influxd.exe o influxdb3.exe)
-    for root, dirs, files in os.walk(target_folder):
-        if "influxdb3.exe" in files:
-            exe_path = os.path.join(root, "influxdb3.exe")
-            break
-        elif "influxd.exe" in files:  # Por si acaso descargan una versión con el nombre antiguo
-            exe_path = os.path.join(root, "influxd.exe")
-            break
+    # influxd.exe por si acaso descargan una versión con el nombre antiguo
+    exe_path = find_executable(target_folder, ["influxdb3.exe", "influxd.exe"])
 
     if not exe_path:
         return False, "No se encontró influxdb3.exe ni influxd.exe"
@@ -117,7 +152,7 @@ pause
 
     # 3. Crear script del TOKEN (Guarda en credentials.txt)
     token_bat = os.path.join(target_folder, "2_GENERAR_TOKEN.bat")
-    credentials_file = os.path.join(target_folder, "credenciales_admin.txt")
+    credentials_file = os.path.join(target_folder, CREDENTIALS_FILE)
 
     # El comando >> agrega el resultado al final del archivo txt
     token_content = f"""@echo off
@@ -151,60 +186,155 @@ pause
         return False, str(e)
 
 
+# Archivos que genera setup_telegraf_portable por consumidor (shard y/o instancia).
+# El telegraf.conf sin sufijo no se toca: es también el que trae el ZIP.
+_INSTANCE_CONF_RE = re.compile(r"telegraf(_s\d+|_s\d+_\d+|_\d+)\.conf")
+_INSTANCE_BAT_RE = re.compile(r"4\.\d+ INICIAR_TELEGRAF(_s\d+)?(_\d+)?\.bat")
+
+
+def _remove_stale_instances(base_dir, target_folder, generated, log_callback=None):
+    """
+    Borra los .conf y .bat de consumidores que ya no existen (al bajar K o M),
+    para que no se arranquen por error con la configuración vieja. Los buffers
+    en disco se dejan: pueden tener métricas aún sin escribir.
+    """
+    keep = {os.path.normcase(os.path.abspath(path)) for path in generated}
+    stale = [os.path.join(base_dir, f) for f in os.listdir(base_dir) if _INSTANCE_CONF_RE.fullmatch(f)]
+    stale += [os.path.join(target_folder, f) for f in os.listdir(target_folder) if _INSTANCE_BAT_RE.fullmatch(f)]
+    for path in stale:
+        if os.path.normcase(os.path.abspath(path)) in keep:
+            continue
+        try:
+            os.remove(path)
+            if log_callback: log_callback(f"Eliminado (instancia que ya no existe): {path}")
+        except OSError:
+            pass
+
+
 def setup_telegraf_portable(target_folder, influx_url, influx_token, org, bucket, mqtt_user, mqtt_pass,
-                            log_callback=None):
+                            log_callback=None, binary_schema=None, aggregation=None, sizing=None,
+                            buffer_strategy="memory", buffer_directory=None, instances=1, share_group="telegraf",
+                            broker_ports=None):
     """
     Configura Telegraf Portable con el esquema específico MQTT -> InfluxDB v2
+    Si se pasa 'binary_schema' (BinarySchema o ruta a su JSON) los dispositivos
+    publican tramas binarias y se genera el parser 'binary' en lugar del JSON.
+    'aggregation' ({"window": s, "aggregators": [...], "stats": [...],
+    "drop_original": bool}) añade agregadores y resume cada ventana en el borde.
+    'sizing' ({"N", "Q", "L", "payload_bytes"}) dimensiona la sección [agent];
+    por defecto se usa el perfil guardado desde la calculadora.
+    buffer_strategy "disk" guarda el buffer de salida en 'buffer_directory'
+    (por defecto <carpeta de telegraf.exe>/buffer) en lugar de en RAM.
+    Con 'instances' > 1 se generan K consumidores (telegraf_<i>.conf y su BAT)
+    suscritos a $share/<share_group>/shm/+/data, más un BAT que los arranca todos;
+    no admite 'aggregation' (cada instancia sólo ve parte de cada dispositivo).
+    'broker_ports' (Mosquitto con shards, ver core.sharding) genera K
+    consumidores por broker (telegraf_s<shard>[_<i>].conf).
     """
-    exe_name = "telegraf.exe"
-    exe_path = None
-    base_dir = None
-
     # 1. Buscar el ejecutable
-    for root, dirs, files in os.walk(target_folder):
-        if exe_name in files:
-            exe_path = os.path.join(root, exe_name)
-            base_dir = root
-            break
+    exe_path = find_executable(target_folder, "telegraf.exe")
 
     if not exe_path:
         return False, "No se encontró telegraf.exe"
+    base_dir = os.path.dirname(exe_path)
+
+    # 2. Crear telegraf.conf con TU ESQUEMA (uno por instancia)
+    # Formato del payload: JSON (por defecto) o trama binaria según el esquema
+    if binary_schema:
+        if not isinstance(binary_schema, BinarySchema):
+            try:
+                binary_schema = BinarySchema.load(binary_schema)
+            except Exception as e:
+                return False, f"Error leyendo el esquema binario: {e}"
+        parser_section = binary_schema.telegraf_parser("inputs.mqtt_consumer")
+        if log_callback: log_callback(f"Parser binario: tramas de {binary_schema.frame_size} bytes.")
+    else:
+        parser_section = ('  data_format = "json"\n'
+                          '  json_time_key = "ts"\n'
+                          '  json_time_format = "unix_ms"\n'
+                          '  json_timezone = "UTC"')
+
+    # Pre-agregación opcional (basicstats / minmax / final)
+    aggregator_section = ""
+    if aggregation and aggregation.get("aggregators") and int(instances) > 1:
+        # Con $share cada instancia ve sólo parte de los mensajes de un dispositivo:
+        # todas emitirían agregados parciales con la misma serie y hora, e
+        # InfluxDB se quedaría con el último
+        return False, "La agregación en el borde no es compatible con varias instancias de Telegraf (usa 1)"
+    if aggregation and aggregation.get("aggregators"):
+        try:
+            aggregator_section = "\n# --- AGREGACIÓN EN EL BORDE ---\n" + telegraf_aggregators(
+                aggregation["window"], aggregation["aggregators"], aggregation.get("stats"),
+                aggregation.get("drop_original", True)) + "\n"
+        except (KeyError, ValueError) as e:
+            return False, f"Agregación no válida: {e}"
+        if log_callback: log_callback(f"Agregadores: {', '.join(aggregation['aggregators'])} "
+                                      f"cada {aggregation['window']:g} s")
+
+    # [agent]: lote, buffer y flush según el perfil de dimensionado. Con K
+    # instancias cada una recibe ~1/K de los dispositivos.
+    sizing = sizing or get_sizing_profile()
+    instances = max(1, int(instances))
+    broker_ports = list(broker_ports or [BASE_PORT])
+    consumers = [(shard, port, i) for shard, port in enumerate(broker_ports) for i in range(1, instances + 1)]
+    # El disco reservado es para todos: cada consumidor tiene su propio WAL
+    disk_budget = sizing.get("disk_budget_gb", DEFAULT_DISK_BUDGET_GB)
+    per_instance = dict(sizing, N=math.ceil(sizing["N"] / len(consumers)),
+                        disk_budget_gb=disk_budget / len(consumers))
+    if buffer_strategy == "disk":
+        buffer_directory = buffer_directory or os.path.join(base_dir, "buffer")
+        if log_callback: log_callback(f"Buffer en disco: {buffer_directory} ({disk_budget:g} GB entre "
+                                      f"{len(consumers)} consumidor(es))")
+    if log_callback: log_callback(f"[agent] dimensionado para {sizing['N']} disp. a {sizing['Q']:g} Hz, "
+                                  f"flush cada {sizing['L']:g} s")
+
+    # Con varias instancias se usa una suscripción compartida: el broker
+    # reparte los mensajes entre los miembros del grupo.
+    topic = f"$share/{share_group}/shm/+/data" if instances > 1 else "shm/+/data"
+    if instances > 1 and log_callback:
+        log_callback(f"{instances} instancias de Telegraf en el grupo compartido '{share_group}'")
+
+    if len(broker_ports) > 1 and log_callback:
+        log_callback(f"{len(broker_ports)} brokers (puertos {broker_ports[0]}-{broker_ports[-1]}): "
+                     f"{len(consumers)} consumidores en total")
+
+    launchers, confs = [], []
+    for n, (shard, port, i) in enumerate(consumers, 1):
+        suffix = f"_s{shard}" if len(broker_ports) > 1 else ""
+        suffix += f"_{i}" if instances > 1 else ""
+        conf_path = os.path.join(base_dir, f"telegraf{suffix}.conf")
+        instance_buffer = None
+        if buffer_strategy == "disk":
+            # El WAL del buffer no se puede compartir entre procesos
+            instance_buffer = os.path.join(buffer_directory, suffix[1:]) if suffix else buffer_directory
+            os.makedirs(instance_buffer, exist_ok=True)
+        try:
+            agent = agent_section(per_instance, aggregation, buffer_strategy, instance_buffer, omit_hostname=True)
+        except (KeyError, TypeError, ValueError) as e:
+            return False, f"Perfil de dimensionado no válido: {e}"
 
-    # 2. Crear telegraf.conf con TU ESQUEMA
-    conf_path = os.path.join(base_dir, "telegraf.conf")
-
-    # Inyectamos las variables en tu plantilla
-    config_content = f"""
+        # Inyectamos las variables en tu plantilla
+        config_content = f"""
 # --- CONFIGURACIÓN GENERADA AUTOMÁTICAMENTE ---
 
-[agent]
-  interval = "1.0s"
-  round_interval = true
-  metric_batch_size = 1200
-  metric_buffer_limit = 3600000
-  collection_jitter = "0s"
-  flush_interval = "1s"
-  flush_jitter = "0.1s"
-  omit_hostname = true
+{agent}
 
 # --- ENTRADA: MQTT (Mosquitto) ---
 [[inputs.mqtt_consumer]]
-  # Apuntamos al puerto 1884 que configuramos en Mosquitto
-  servers = ["tcp://127.0.0.1:1884"]
+  # Apuntamos al puerto que configuramos en Mosquitto (1884, o el del shard)
+  servers = ["tcp://127.0.0.1:{port}"]
 
   # Credenciales de Mosquitto (Variables del programa)
   username = "{mqtt_user}"
   password = "{mqtt_pass}"
 
-  topics = ["shm/+/data"]
+  topics = ["{topic}"]
   name_override = "shm_data"
 
-  data_format = "json"
-  json_time_key = "ts"
-  json_time_format = "unix_ms"
-  json_timezone = "UTC"
+{parser_section}
 
   # Parseo del Topic para extraer el device_id
+  # (el topic recibido es el original aunque la suscripción sea $share)
   [[inputs.mqtt_consumer.topic_parsing]]
     topic = "shm/+/data"
     tags  = "_/device_id/_"
@@ -215,26 +345,45 @@ def setup_telegraf_portable(target_folder, influx_url, influx_token, org, bucket
   token = "{influx_token}"
   bucket = "{bucket}"
   organization = "{org}"
-"""
-    try:
-        with open(conf_path, "w") as f:
-            f.write(config_content)
-        if log_callback: log_callback(f"Configuración MQTT->Influx guardada en: {conf_path}")
-    except Exception as e:
-        return False, f"Error escribiendo conf: {e}"
-
-    # 3. Crear el BAT de arranque
-    bat_path = os.path.join(target_folder, "4. INICIAR_TELEGRAF.bat")
-
-    bat_content = f"""@echo off
-title Telegraf Gateway (MQTT -> InfluxDB)
+{aggregator_section}"""
+        try:
+            with open(conf_path, "w") as f:
+                f.write(config_content)
+            if log_callback: log_callback(f"Configuración MQTT->Influx guardada en: {conf_path}")
+        except Exception as e:
+            return False, f"Error escribiendo conf: {e}"
+        confs.append(conf_path)
+
+        # 3. Crear el BAT de arranque
+        name = f"4.{n} INICIAR_TELEGRAF{suffix}.bat" if suffix else "4. INICIAR_TELEGRAF.bat"
+        bat_path = os.path.join(target_folder, name)
+        bat_content = f"""@echo off
+title Telegraf Gateway{suffix.replace("_", " ")} (MQTT -> InfluxDB)
 echo ---------------------------------------------------
-echo INICIANDO TELEGRAF
+echo INICIANDO TELEGRAF{suffix.replace("_", " ")}
 echo Conf: "{conf_path}"
 echo ---------------------------------------------------
 echo.
 "{exe_path}" --config "{conf_path}"
 if %errorlevel% neq 0 pause
+"""
+        try:
+            with open(bat_path, "w") as f:
+                f.write(bat_content)
+        except Exception as e:
+            return False, f"Error escribiendo bat: {e}"
+        launchers.append(bat_path)
+
+    _remove_stale_instances(base_dir, target_folder, launchers + confs, log_callback)
+    if len(launchers) == 1:
+        return True, launchers[0]
+
+    # Lanzador general: abre cada instancia en su propia ventana
+    bat_path = os.path.join(target_folder, "4. INICIAR_TELEGRAF.bat")
+    starts = "\n".join(f'start "" "{path}"' for path in launchers)
+    bat_content = f"""@echo off
+echo Iniciando {len(launchers)} instancias de Telegraf...
+{starts}
 """
     try:
         with open(bat_path, "w") as f:
@@ -247,28 +396,22 @@ if %errorlevel% neq 0 pause
 def extract_token_from_file(target_folder, log_callback=None):
     """
     Lee el archivo credenciales_admin.txt, ignora los colores ANSI
-    y extrae el token que empieza por 'apiv3_'.
+    y extrae el token MÁS RECIENTE que empieza por 'apiv3_'.
+    Sólo se escanean los bytes agregados desde la última llamada (ver TokenScanner).
     """
-    file_path = os.path.join(target_folder, "credenciales_admin.txt")
+    file_path = os.path.join(target_folder, CREDENTIALS_FILE)
 
     if not os.path.exists(file_path):
         return None, "No se encontró el archivo 'credenciales_admin.txt'. Ejecuta el BAT primero."
 
     try:
-        with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
-            content = f.read()
+        token = get_scanner(target_folder).scan()
 
-        # Explicación del REGEX:
-        # apiv3_      -> Busca textualmente esto
-        # [a-zA-Z0-9\-_]+ -> Seguido de cualquier letra, número, guion o guion bajo
-        match = re.search(r'(apiv3_[a-zA-Z0-9\-_]+)', content)
-
-        if match:
-            token = match.group(1)
+        if token:
             if log_callback: log_callback(f"Token detectado: {token[:10]}... (oculto)")
             return True, token
         else:
             return False, "No se encontró ningún patrón 'apiv3_' en el archivo."
 
     except Exception as e:
-        return False, str(e)
\ No newline at end of file
+        return False, str(e)
@@ -1,31 +1,200 @@
+import copy
 import json
 import os
+import threading
+from contextlib import contextmanager
 
 SETTINGS_FILE = "config.json"
 
+# Caché de proceso: evita reabrir y reparsear config.json en cada get_setting.
+# Se invalida comparando (mtime_ns, tamaño) del archivo, así que si otro proceso
+# (u otra instancia del launcher) lo modifica, la siguiente lectura lo recarga.
+_cache = {"data": None, "stamp": None}
+_lock = threading.RLock()
+_pending = threading.local()
+
+
+def _file_stamp():
+    """Devuelve (mtime_ns, tamaño) del archivo o None si no existe. Un único stat()."""
+    try:
+        st = os.stat(SETTINGS_FILE)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def _read_file():
+    try:
+        with open(SETTINGS_FILE, 'r') as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else {}
+    except:
+        return {}
+
+
+def _copy(value):
+    # Listas y diccionarios se copian: mutarlos no debe tocar la caché
+    return copy.deepcopy(value) if isinstance(value, (dict, list)) else value
+
+
+def _cached_settings():
+    """Devuelve el diccionario cacheado (NO copiar/modificar fuera del lock)."""
+    with _lock:
+        stamp = _file_stamp()
+        if _cache["data"] is None or stamp != _cache["stamp"]:
+            _cache["data"] = _read_file() if stamp is not None else {}
+            _cache["stamp"] = stamp
+        return _cache["data"]
+
+
 def load_settings():
     """Carga la configuración desde el archivo JSON (si existe)."""
-    if os.path.exists(SETTINGS_FILE):
-        try:
-            with open(SETTINGS_FILE, 'r') as f:
-                return json.load(f)
-        except:
-            return {}
-    return {}
+    with _lock:
+        return _copy(_cached_settings())
+
 
 def get_setting(key, default_value=None):
     """Obtiene un valor guardado. Si no existe, devuelve el valor por defecto."""
-    data = load_settings()
-    return data.get(key, default_value)
+    # Dentro de una transacción se ven los valores aún no escritos
+    pending = getattr(_pending, "updates", None)
+    if pending is not None and key in pending:
+        return _copy(pending[key])
+    with _lock:
+        return _copy(_cached_settings().get(key, default_value))
+
+
+def save_settings(values):
+    """
+    Guarda varios valores de una sola vez: una lectura (si la caché está vieja),
+    una escritura a archivo temporal y un os.replace atómico.
+    """
+    pending = getattr(_pending, "updates", None)
+    values = {key: _copy(value) for key, value in values.items()}
+    if pending is not None:
+        pending.update(values)
+        return True
+
+    with _lock:
+        data = dict(_cached_settings())
+        data.update(values)
+        tmp_path = f"{SETTINGS_FILE}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(data, f, indent=4)
+            # os.replace es atómico: un lector nunca ve un JSON a medio escribir
+            os.replace(tmp_path, SETTINGS_FILE)
+        except Exception as e:
+            print(f"Error guardando config: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return False
+
+        _cache["data"] = data
+        _cache["stamp"] = _file_stamp()
+        return True
+
 
 def save_setting(key, value):
     """Guarda un valor en el archivo JSON."""
-    data = load_settings()
-    data[key] = value
+    return save_settings({key: value})
+
+
+@contextmanager
+def settings_transaction():
+    """
+    Agrupa varios save_setting en una sola escritura al salir del bloque:
+
+        with settings_transaction():
+            save_setting("mqtt_user", user)
+            save_setting("mqtt_pass", pwd)
+
+    Si el bloque lanza una excepción no se escribe nada.
+    """
+    outer = getattr(_pending, "updates", None)
+    if outer is not None:
+        # Transacción anidada: se acumula en la exterior
+        yield
+        return
+
+    _pending.updates = {}
     try:
+        yield
+        updates = _pending.updates
+    finally:
+        _pending.updates = None
+
+    if updates:
+        save_settings(updates)
+
+
+if __name__ == "__main__":
+    # Micro-benchmark: cuenta aperturas, stats y parseos del flujo típico de la UI
+    # (constructor de TelegrafWindow + start_process) antes y después de la caché.
+    # Uso: python core/settings_manager.py
+    import builtins
+    import tempfile
+    import time
+
+    counters = {"open": 0, "stat": 0, "parse": 0, "write": 0}
+    real_open, real_stat, real_load = builtins.open, os.stat, json.load
+
+    def counting_open(path, mode='r', *args, **kwargs):
+        if str(path).startswith(SETTINGS_FILE):
+            counters["open"] += 1
+            if 'w' in mode:
+                counters["write"] += 1
+        return real_open(path, mode, *args, **kwargs)
+
+    def counting_stat(path, *args, **kwargs):
+        if str(path) == SETTINGS_FILE:
+            counters["stat"] += 1
+        return real_stat(path, *args, **kwargs)
+
+    def counting_load(*args, **kwargs):
+        counters["parse"] += 1
+        return real_load(*args, **kwargs)
+
+    def legacy_get(key, default_value=None):
+        if os.path.exists(SETTINGS_FILE):
+            with open(SETTINGS_FILE, 'r') as f:
+                return json.load(f).get(key, default_value)
+        return default_value
+
+    def legacy_save(key, value):
+        data = {}
+        if os.path.exists(SETTINGS_FILE):
+            with open(SETTINGS_FILE, 'r') as f:
+                data = json.load(f)
+        data[key] = value
         with open(SETTINGS_FILE, 'w') as f:
             json.dump(data, f, indent=4)
-        return True
-    except Exception as e:
-        print(f"Error guardando config: {e}")
-        return False
\ No newline at end of file
+
+    read_keys = ["telegraf_path", "mosquitto_path", "influx_path", "telegraf_url", "influx_bucket",
+                 "influx_org", "influx_token", "mqtt_user", "mqtt_pass", "influx_url", "influx_node",
+                 "influx_data_dir"]
+    written = {"telegraf_url": "http://x/telegraf.zip", "influx_token": "apiv3_abc", "influx_bucket": "shm",
+               "mqtt_user": "shmuser", "mqtt_pass": "shm1234", "telegraf_path": "C:\\Telegraf_Portable"}
+
+    def run(label, getter, writer, rounds=50):
+        for k in counters:
+            counters[k] = 0
+        t0 = time.perf_counter()
+        for _ in range(rounds):
+            for k in read_keys:
+                getter(k)
+            writer()
+        elapsed = (time.perf_counter() - t0) / rounds
+        print(f"{label:<10} por ciclo: open={counters['open'] / rounds:.1f} stat={counters['stat'] / rounds:.1f} "
+              f"parse={counters['parse'] / rounds:.1f} write={counters['write'] / rounds:.1f} "
+              f"t={elapsed * 1e6:.0f} us")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        SETTINGS_FILE = os.path.join(tmp, "config.json")
+        builtins.open, os.stat, json.load = counting_open, counting_stat, counting_load
+        try:
+            run("antes", legacy_get, lambda: [legacy_save(k, v) for k, v in written.items()])
+            run("despues", get_setting, lambda: save_settings(written))
+        finally:
+            builtins.open, os.stat, json.load = real_open, real_stat, real_load
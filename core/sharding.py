@@ -0,0 +1,70 @@
+import os
+import csv
+import json
+import zlib
+
+# Reparto de dispositivos entre M brokers Mosquitto (cada uno usa un núcleo).
+# El shard de un dispositivo es CRC32(device_id) % M: estable entre ejecuciones
+# y lenguajes, y el firmware lo puede calcular sin tabla (el ESP32 trae CRC32
+# en ROM). Aun así se genera la tabla device_id -> shard/puerto ordenada por
+# device_id para buscar por bisección.
+
+BASE_PORT = 1884
+SHARD_MAP_FILE = "shard_map"
+
+
+def shard_for(device_id, shards):
+    return zlib.crc32(str(device_id).encode("utf-8")) % shards if shards > 1 else 0
+
+
+def broker_ports(shards, base_port=BASE_PORT):
+    return [base_port + i for i in range(max(1, shards))]
+
+
+def read_device_ids(path):
+    """device_id por línea (o primera columna de un CSV); ignora vacías y comentarios '#'."""
+    ids = []
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            device = line.split(",")[0].strip()
+            if device and not device.startswith("#") and device != "device_id":
+                ids.append(device)
+    return ids
+
+
+def shard_table(device_ids, shards, base_port=BASE_PORT):
+    """[(device_id, shard, puerto)] ordenada por device_id."""
+    ports = broker_ports(shards, base_port)
+    table = []
+    for device in sorted(set(device_ids)):
+        shard = shard_for(device, shards)
+        table.append((device, shard, ports[shard]))
+    return table
+
+
+def write_shard_map(target_dir, device_ids, shards, base_port=BASE_PORT, host="127.0.0.1", log_callback=None):
+    """
+    Escribe shard_map.csv (device_id,shard,port) y shard_map.json (brokers,
+    función de hash y tabla). Devuelve la ruta del CSV.
+    """
+    table = shard_table(device_ids, shards, base_port)
+    csv_path = os.path.join(target_dir, f"{SHARD_MAP_FILE}.csv")
+    with open(csv_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["device_id", "shard", "port"])
+        writer.writerows(table)
+
+    data = {
+        "hash": "crc32(device_id utf-8) % shards",
+        "shards": [{"shard": i, "host": host, "port": p} for i, p in enumerate(broker_ports(shards, base_port))],
+        "devices": {device: shard for device, shard, _ in table},
+    }
+    with open(os.path.join(target_dir, f"{SHARD_MAP_FILE}.json"), "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=1)
+
+    if log_callback:
+        counts = [0] * max(1, shards)
+        for _, shard, _ in table:
+            counts[shard] += 1
+        log_callback(f"Tabla de shards: {len(table)} dispositivos -> {counts} por broker ({csv_path})")
+    return csv_path
@@ -0,0 +1,83 @@
+from .capacity import compute_metrics, buffer_strategy_model, DEFAULT_DISK_BUDGET_GB
+from .settings_manager import get_setting, save_setting
+
+# Perfil de dimensionado (N, Q, L, payload) guardado en config.json desde la
+# calculadora. Los generadores de telegraf.conf sacan de aquí la sección
+# [agent] en lugar de valores fijos. El perfil por defecto (10 disp, 100 Hz,
+# flush 1 s) reproduce los valores que antes estaban escritos a mano
+# (batch 1200, buffer 3600000, flush "1s", jitter "0.1s").
+
+SETTING_KEY = "sizing_profile"
+DEFAULT_PROFILE = {"N": 10, "Q": 100.0, "L": 1.0, "payload_bytes": 116}
+
+
+def get_sizing_profile():
+    profile = dict(DEFAULT_PROFILE)
+    profile.update(get_setting(SETTING_KEY, {}) or {})
+    return profile
+
+
+def save_sizing_profile(N, Q, L, payload_bytes, **extra):
+    """Guarda el perfil; 'extra' permite añadir datos (p.ej. aggregation) sin cambiar la firma."""
+    profile = {"N": int(N), "Q": float(Q), "L": float(L), "payload_bytes": int(payload_bytes)}
+    profile.update(extra)
+    save_setting(SETTING_KEY, profile)
+    return profile
+
+
+def agent_config(profile=None, aggregation=None, buffer_strategy="memory", buffer_directory=None):
+    """
+    Valores de [agent] para el perfil (o el guardado). Con 'aggregation'
+    (ver setup_telegraf_portable) el lote y el buffer se dimensionan para los
+    puntos agregados, que son los que llegan al output.
+    Con buffer_strategy "disk" el buffer vive en 'buffer_directory' y su límite
+    es lo que cabe en el disco reservado (perfil 'disk_budget_gb').
+    """
+    p = profile or get_sizing_profile()
+    L = p["L"]
+    m = compute_metrics(p["N"], p["Q"], L, p["payload_bytes"])
+    batch, buffer_limit = m["batch"], m["buffer_limit"]
+
+    if aggregation and aggregation.get("aggregators"):
+        from .aggregation import aggregation_model
+        am = aggregation_model(p["N"], p["Q"], L, p["payload_bytes"], p.get("fields", 1), aggregation["window"],
+                               aggregation["aggregators"], aggregation.get("stats"),
+                               aggregation.get("drop_original", True))
+        batch, buffer_limit = am["aggregated"]["batch"], am["aggregated"]["buffer_limit"]
+
+    values = {
+        "interval": f"{L:g}s",
+        "round_interval": True,
+        "metric_batch_size": batch,
+        "metric_buffer_limit": buffer_limit,
+        "collection_jitter": "0s",
+        "flush_interval": f"{L:g}s",
+        "flush_jitter": f"{m['jitter']:.1f}s",
+    }
+    if buffer_strategy == "disk":
+        if not buffer_directory:
+            raise ValueError("buffer_strategy 'disk' necesita buffer_directory")
+        bm = buffer_strategy_model(p["N"], p["Q"], L, p["payload_bytes"],
+                                   disk_budget_gb=p.get("disk_budget_gb", DEFAULT_DISK_BUDGET_GB))
+        values["metric_buffer_limit"] = max(buffer_limit, bm["disk"]["buffer_limit"])
+        values["buffer_strategy"] = "disk"
+        # Barras normales: en TOML la '\' de las rutas de Windows es un escape
+        values["buffer_directory"] = buffer_directory.replace("\\", "/")
+    elif buffer_strategy != "memory":
+        raise ValueError(f"buffer_strategy no soportada: {buffer_strategy}")
+    return values
+
+
+def _toml_value(value):
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (int, float)):
+        return str(value)
+    return f'"{value}"'
+
+
+def agent_section(profile=None, aggregation=None, buffer_strategy="memory", buffer_directory=None, **extra):
+    """Sección [agent] lista para telegraf.conf; 'extra' añade o sobrescribe claves."""
+    values = agent_config(profile, aggregation, buffer_strategy, buffer_directory)
+    values.update(extra)
+    return "[agent]\n" + "\n".join(f"  {key} = {_toml_value(v)}" for key, v in values.items())
@@ -0,0 +1,275 @@
+import os
+import json
+import time
+import struct
+import hashlib
+import threading
+
+from .artifact_cache import default_cache_dir
+from .settings_manager import get_setting
+
+# Contabilidad real del almacenamiento de InfluxDB 3 (object store 'file'):
+#   <data-dir>/<node-id>/wal/*.wal
+#   <data-dir>/<node-id>/dbs/<db>/<tabla>/<fecha>/<hora>/*.parquet
+#   snapshots, catálogo...
+# El escaneo es incremental: se guarda (tamaño, mtime) de cada archivo y el
+# mtime de cada carpeta. Una carpeta cuyo mtime no cambió no tiene archivos
+# nuevos (InfluxDB no reescribe Parquet ni WAL), así que no se vuelve a listar;
+# del Parquet sólo se lee el pie (nº de filas) la primera vez que se ve.
+
+PARQUET_MAGIC = b"PAR1"
+
+_lock = threading.Lock()
+
+
+def _scan_cache_path(data_dir):
+    key = hashlib.sha1(os.path.abspath(data_dir).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(os.path.dirname(default_cache_dir()), "storage_scans", f"{key}.json")
+
+
+# --- Pie de Parquet (Thrift compact) ---
+
+def _varint(buf, pos):
+    result = shift = 0
+    while True:
+        b = buf[pos]
+        pos += 1
+        result |= (b & 0x7f) << shift
+        if not b & 0x80:
+            return result, pos
+        shift += 7
+
+
+def _skip(buf, pos, ftype):
+    """Salta un valor Thrift compact del tipo dado."""
+    if ftype in (1, 2):                      # bool (en el propio tipo)
+        return pos
+    if ftype == 3:                           # byte
+        return pos + 1
+    if ftype in (4, 5, 6):                   # i16 / i32 / i64 (varint zigzag)
+        return _varint(buf, pos)[1]
+    if ftype == 7:                           # double
+        return pos + 8
+    if ftype == 8:                           # binary / string
+        n, pos = _varint(buf, pos)
+        return pos + n
+    if ftype in (9, 10):                     # list / set
+        header = buf[pos]
+        pos += 1
+        size, etype = header >> 4, header & 0x0f
+        if size == 15:
+            size, pos = _varint(buf, pos)
+        for _ in range(size):
+            pos = pos + 1 if etype in (1, 2) else _skip(buf, pos, etype)
+        return pos
+    if ftype == 11:                          # map
+        size, pos = _varint(buf, pos)
+        if size:
+            kv = buf[pos]
+            pos += 1
+            for _ in range(size):
+                pos = _skip(buf, pos, kv >> 4)
+                pos = _skip(buf, pos, kv & 0x0f)
+        return pos
+    if ftype == 12:                          # struct
+        return _struct_field(buf, pos, None)[1]
+    raise ValueError(f"Tipo Thrift desconocido: {ftype}")
+
+
+def _struct_field(buf, pos, wanted):
+    """Recorre un struct; devuelve (valor i64 del campo 'wanted' o None, posición final)."""
+    field_id, found = 0, None
+    while True:
+        header = buf[pos]
+        pos += 1
+        if header == 0:
+            return found, pos
+        delta, ftype = header >> 4, header & 0x0f
+        if delta:
+            field_id += delta
+        else:
+            raw, pos = _varint(buf, pos)
+            field_id = (raw >> 1) ^ -(raw & 1)
+        if field_id == wanted and ftype == 6:
+            raw, pos = _varint(buf, pos)
+            found = (raw >> 1) ^ -(raw & 1)
+        else:
+            pos = _skip(buf, pos, ftype)
+
+
+def parquet_num_rows(path):
+    """Filas de un Parquet leyendo sólo su pie (FileMetaData.num_rows, campo 3)."""
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        if size < 12:
+            return None
+        f.seek(size - 8)
+        meta_len, magic = struct.unpack("<I4s", f.read(8))
+        if magic != PARQUET_MAGIC or meta_len > size - 12:
+            return None
+        f.seek(size - 8 - meta_len)
+        meta = f.read(meta_len)
+    try:
+        return _struct_field(meta, 0, 3)[0]
+    except (IndexError, ValueError):
+        return None
+
+
+# --- Escáner ---
+
+def _kind(name):
+    if name.endswith(".parquet"):
+        return "parquet"
+    if name.endswith(".wal"):
+        return "wal"
+    return "other"
+
+
+class StorageScanner:
+    def __init__(self, data_dir, cache_path=None):
+        self.data_dir = os.path.abspath(data_dir)
+        self.cache_path = cache_path or _scan_cache_path(self.data_dir)
+        self.files = {}   # ruta relativa -> [tamaño, mtime_ns, tipo, filas]
+        self.dirs = {}    # ruta relativa -> [mtime_ns, [archivos], [subcarpetas]]
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.cache_path, "r") as f:
+                data = json.load(f)
+            if data.get("data_dir") == self.data_dir:
+                self.files, self.dirs = data["files"], data["dirs"]
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        tmp = f"{self.cache_path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({"data_dir": self.data_dir, "files": self.files, "dirs": self.dirs}, f)
+        os.replace(tmp, self.cache_path)
+
+    def _walk(self, rel, stats):
+        path = os.path.join(self.data_dir, rel) if rel else self.data_dir
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return [], []
+        cached = self.dirs.get(rel)
+        if cached and cached[0] == mtime:
+            files, subdirs = cached[1], cached[2]
+        else:
+            stats["listed"] += 1
+            files, subdirs = [], []
+            with os.scandir(path) as it:
+                for entry in it:
+                    child = os.path.join(rel, entry.name) if rel else entry.name
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(child)
+                    elif entry.is_file(follow_symlinks=False):
+                        files.append(child)
+            self.dirs[rel] = [mtime, files, subdirs]
+
+        seen = list(files)
+        for child in files:
+            if child in self.files and cached and cached[0] == mtime:
+                continue
+            try:
+                st = os.stat(os.path.join(self.data_dir, child))
+            except OSError:
+                seen.remove(child)
+                continue
+            old = self.files.get(child)
+            if old and old[0] == st.st_size and old[1] == st.st_mtime_ns:
+                continue
+            kind = _kind(child)
+            rows = parquet_num_rows(os.path.join(self.data_dir, child)) if kind == "parquet" else None
+            self.files[child] = [st.st_size, st.st_mtime_ns, kind, rows]
+            stats["read"] += 1
+
+        seen_dirs = [rel]
+        for sub in subdirs:
+            f, d = self._walk(sub, stats)
+            seen += f
+            seen_dirs += d
+        return seen, seen_dirs
+
+    def scan(self, log_callback=None):
+        """Reescanea (incremental) y devuelve las cifras medidas (ver summary)."""
+        with _lock:
+            t0 = time.perf_counter()
+            stats = {"listed": 0, "read": 0}
+            if not os.path.isdir(self.data_dir):
+                raise FileNotFoundError(f"No existe la carpeta de datos: {self.data_dir}")
+            seen, seen_dirs = self._walk("", stats)
+            seen, seen_dirs = set(seen), set(seen_dirs)
+            self.files = {k: v for k, v in self.files.items() if k in seen}
+            self.dirs = {k: v for k, v in self.dirs.items() if k in seen_dirs}
+            self._save()
+            if log_callback:
+                log_callback(f"Escaneados {len(self.files)} archivos: {stats['listed']} carpetas listadas, "
+                             f"{stats['read']} archivos nuevos ({(time.perf_counter() - t0) * 1000:.0f} ms)")
+            return self.summary()
+
+    def summary(self, now=None):
+        """
+        Cifras medidas:
+          - total/parquet/wal bytes, archivos y filas (de los pies de Parquet)
+          - bytes_per_point: bytes de Parquet / filas
+          - bytes_per_day: crecimiento medio del Parquet entre el primer y el último archivo
+          - last_24h_bytes y growth_ratio (Parquet de las últimas 24 h frente a la media)
+          - points_per_sec: filas / tiempo cubierto
+        """
+        now = now or time.time()
+        by_kind = {"parquet": 0, "wal": 0, "other": 0}
+        rows = 0
+        mtimes = []
+        last_24h = 0
+        for size, mtime_ns, kind, n in self.files.values():
+            by_kind[kind] += size
+            if kind != "parquet":
+                continue  # el WAL es temporal: se borra al persistir en Parquet
+            rows += n or 0
+            t = mtime_ns / 1e9
+            mtimes.append(t)
+            if now - t <= 86400:
+                last_24h += size
+
+        span = (max(mtimes) - min(mtimes)) if len(mtimes) > 1 else 0.0
+        per_day = by_kind["parquet"] / (span / 86400) if span >= 3600 else None
+        return {
+            "data_dir": self.data_dir,
+            "files": len(self.files),
+            "total_bytes": sum(by_kind.values()),
+            "parquet_bytes": by_kind["parquet"],
+            "wal_bytes": by_kind["wal"],
+            "rows": rows,
+            "bytes_per_point": by_kind["parquet"] / rows if rows else None,
+            "span_days": span / 86400,
+            "bytes_per_day": per_day,
+            "last_24h_bytes": last_24h,
+            "growth_ratio": last_24h / per_day if per_day else None,
+            "points_per_sec": rows / span if span >= 3600 and rows else None,
+        }
+
+
+_scanners = {}
+
+
+def get_storage_scanner(data_dir):
+    """Un escáner por carpeta y proceso (la caché en disco sobrevive entre ejecuciones)."""
+    path = os.path.abspath(data_dir)
+    with _lock:
+        if path not in _scanners:
+            _scanners[path] = StorageScanner(path)
+        return _scanners[path]
+
+
+def influx_data_dir():
+    """Carpeta de datos configurada en la ventana de InfluxDB (relativa a influx_path)."""
+    data_dir = get_setting("influx_data_dir", "databases/shmdatabase")
+    base = get_setting("influx_path")
+    if base and not os.path.isabs(data_dir):
+        data_dir = os.path.join(base, data_dir)
+    return os.path.normpath(data_dir)
@@ -0,0 +1,114 @@
+import os
+import re
+import mmap
+import threading
+
+CREDENTIALS_FILE = "credenciales_admin.txt"
+
+# Explicación del REGEX:
+# apiv3_      -> Busca textualmente esto
+# [a-zA-Z0-9\-_]+ -> Seguido de cualquier letra, número, guion o guion bajo
+# (los códigos de color ANSI quedan fuera porque ESC no está en la clase)
+TOKEN_RE = re.compile(rb'apiv3_[a-zA-Z0-9\-_]+')
+
+# Al reanudar se reescanean unos bytes antes del offset por si un token quedó cortado
+OVERLAP = 512
+
+
+class TokenScanner:
+    """
+    Escanea credenciales_admin.txt de forma incremental.
+
+    2_GENERAR_TOKEN.bat sólo agrega (>>), así que basta con recordar hasta qué
+    byte se escaneó y, en la siguiente llamada, mirar únicamente lo nuevo.
+    Devuelve siempre el token MÁS RECIENTE del archivo.
+    """
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.offset = 0
+        self.token = None
+        self.pending_size = None  # Tamaño con el que se aplazó un token que acababa en EOF
+        self.lock = threading.Lock()
+
+    def scan(self, settle=False):
+        """
+        Devuelve el token más reciente (o None) leyendo sólo los bytes nuevos.
+
+        Con 'settle' (modo vigilancia) un token que termina justo en EOF se
+        aplaza, porque el .bat puede seguir escribiéndolo, y se acepta en la
+        siguiente llamada si el tamaño no cambió. Sin 'settle' (lectura puntual,
+        PASO 2) se acepta tal cual: el último token del archivo puede no llevar
+        salto de línea.
+        """
+        with self.lock:
+            try:
+                size = os.path.getsize(self.file_path)
+            except OSError:
+                return self.token
+
+            if size < self.offset:
+                # El archivo se truncó o se recreó: empezamos de cero
+                self.offset, self.token, self.pending_size = 0, None, None
+            if size == self.offset:
+                return self.token
+
+            start = max(0, self.offset - OVERLAP)
+            with open(self.file_path, "rb") as f:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    newest = None
+                    for match in TOKEN_RE.finditer(mm, start, size):
+                        if settle and match.end() >= size and size != self.pending_size:
+                            # Termina justo en EOF: puede que el .bat siga escribiendo
+                            self.offset, self.pending_size = match.start(), size
+                            break
+                        newest = match.span()
+                    else:
+                        self.offset, self.pending_size = size, None
+
+                    if newest:
+                        self.token = mm[newest[0]:newest[1]].decode("ascii")
+            return self.token
+
+
+_scanners = {}
+_scanners_lock = threading.Lock()
+
+
+def get_scanner(target_folder):
+    """Un escáner por archivo y proceso, para conservar el offset entre llamadas."""
+    path = os.path.abspath(os.path.join(target_folder, CREDENTIALS_FILE))
+    with _scanners_lock:
+        if path not in _scanners:
+            _scanners[path] = TokenScanner(path)
+        return _scanners[path]
+
+
+def watch_token(target_folder, on_token, stop_event, interval=0.05, log_callback=None):
+    """
+    Vigila credenciales_admin.txt y llama a on_token(token) cada vez que aparece
+    un token nuevo. Sondea con os.stat cada 'interval' segundos (50 ms por defecto):
+    es barato y no depende de APIs de notificación del SO.
+    Termina cuando se activa 'stop_event' (threading.Event).
+    """
+    scanner = get_scanner(target_folder)
+    last = scanner.scan(settle=True)
+    last_stamp = None
+    if log_callback: log_callback(f"Vigilando {scanner.file_path} ...")
+
+    while not stop_event.is_set():
+        try:
+            st = os.stat(scanner.file_path)
+            stamp = (st.st_size, st.st_mtime_ns)
+        except OSError:
+            stamp = None
+
+        # Un token aplazado en EOF se confirma en la siguiente pasada aunque no cambie nada
+        if stamp is not None and (stamp != last_stamp or scanner.pending_size is not None):
+            last_stamp = stamp
+            token = scanner.scan(settle=True)
+            if token and token != last:
+                last = token
+                on_token(token)
+
+        stop_event.wait(interval)
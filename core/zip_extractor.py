@@ -0,0 +1,297 @@
+import os
+import json
+import shutil
+import zipfile
+import tempfile
+import fnmatch
+import bisect
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+MANIFEST_NAME = ".extract_manifest.json"
+WORKERS = min(8, (os.cpu_count() or 2) * 2)
+
+
+def _matches(name, patterns):
+    return any(fnmatch.fnmatch(name, p) or fnmatch.fnmatch(os.path.basename(name), p) for p in patterns)
+
+
+def _load_manifest(target_folder):
+    try:
+        with open(os.path.join(target_folder, MANIFEST_NAME), "r") as f:
+            return json.load(f)
+    except:
+        return None
+
+
+def extract_zip(zip_path, target_folder, skip_patterns=None, workers=WORKERS, log_callback=None):
+    """
+    Descomprime 'zip_path' en 'target_folder' repartiendo los miembros entre varios hilos.
+
+    'skip_patterns' es una lista de globs (ej. ["*.pdb", "docs/*"]) cuyos miembros no se extraen.
+    Al terminar escribe un manifiesto (ruta, tamaño, CRC) que permite localizar
+    ejecutables sin recorrer el árbol con os.walk.
+    """
+    skip_patterns = skip_patterns or []
+
+    with zipfile.ZipFile(zip_path, "r") as zf:
+        all_members = zf.infolist()
+    members = [m for m in all_members if not _matches(m.filename, skip_patterns)]
+    files = [m for m in members if not m.is_dir()]
+    skipped = len(all_members) - len(members)
+
+    _make_dirs(target_folder, members)
+
+    extractor = _ThreadedExtractor(zip_path, target_folder)
+    try:
+        # Los miembros grandes primero para que no quede uno solo al final
+        files.sort(key=lambda m: m.file_size, reverse=True)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(extractor.extract, files))
+    finally:
+        extractor.close()
+
+    manifest = _write_manifest(target_folder, files)
+
+    if log_callback:
+        msg = f"Extraídos {len(files)} archivos con {workers} hilos."
+        if skipped:
+            msg += f" Omitidos {skipped} por filtro."
+        log_callback(msg)
+    return manifest
+
+
+def _safe_path(target_folder, name):
+    """
+    Ruta de destino de un miembro saneada como en ZipFile._extract_member: sin
+    unidad, sin partes absolutas ni '..'. Si aun así queda fuera de
+    'target_folder' se rechaza el ZIP.
+    """
+    arcname = name.replace("/", os.path.sep)
+    if os.path.altsep:
+        arcname = arcname.replace(os.path.altsep, os.path.sep)
+    arcname = os.path.splitdrive(arcname)[1]
+    parts = [p for p in arcname.split(os.path.sep) if p not in ("", os.path.curdir, os.path.pardir)]
+    if os.path.sep == "\\":
+        parts = [zipfile.ZipFile._sanitize_windows_name(p, os.path.sep) for p in parts]
+        parts = [p for p in parts if p]
+    root = os.path.realpath(target_folder)
+    path = os.path.realpath(os.path.join(root, *parts))
+    if path != root and not path.startswith(root + os.path.sep):
+        raise zipfile.BadZipFile(f"Miembro fuera de la carpeta destino: {name}")
+    return path
+
+
+def _make_dirs(target_folder, members):
+    # Creamos todas las carpetas antes: así los hilos no compiten por os.makedirs
+    dirs = {m.filename.rsplit("/", 1)[0] for m in members if "/" in m.filename.rstrip("/")}
+    dirs |= {m.filename.rstrip("/") for m in members if m.is_dir()}
+    for d in sorted(dirs):
+        if d:
+            os.makedirs(_safe_path(target_folder, d), exist_ok=True)
+
+
+class _ThreadedExtractor:
+    """Cada hilo abre su propio ZipFile: un mismo objeto serializa las lecturas."""
+
+    def __init__(self, zip_path, target_folder):
+        self.zip_path = zip_path
+        self.target_folder = target_folder
+        self.local = threading.local()
+        self.handles = []
+        self.lock = threading.Lock()
+
+    def extract(self, info):
+        zf = getattr(self.local, "zf", None)
+        if zf is None:
+            zf = self.local.zf = zipfile.ZipFile(self.zip_path, "r")
+            with self.lock:
+                self.handles.append(zf)
+        # ZipFile.extract sanea la ruta (sin '..' ni unidades absolutas); además
+        # se rechaza lo que aun así acabe fuera del destino (p.ej. por un enlace)
+        _safe_path(self.target_folder, info.filename)
+        zf.extract(info, self.target_folder)
+
+    def close(self):
+        with self.lock:
+            for zf in self.handles:
+                zf.close()
+            self.handles = []
+
+
+def _write_manifest(target_folder, files):
+    manifest = _load_manifest(target_folder) or {"members": {}}
+    for m in files:
+        manifest["members"][m.filename] = {"size": m.file_size, "crc": m.CRC}
+    manifest["executables"] = _index_executables(manifest["members"])
+
+    with open(os.path.join(target_folder, MANIFEST_NAME), "w") as f:
+        json.dump(manifest, f, indent=1)
+    return manifest
+
+
+class StreamingExtractor:
+    """
+    Extrae un ZIP mientras se descarga por rangos (sink de download_file).
+
+    En cuanto el directorio central (al final del archivo) está escrito en el
+    .part, se conocen los offsets de cada miembro; cada miembro se extrae en un
+    hilo apenas su rango de bytes está completo, solapando red y disco.
+
+    Los miembros se escriben en una carpeta temporal dentro de 'target_folder'
+    y sólo pasan a su sitio en finish(), cuando el llamador ya comprobó el
+    SHA-256 de la descarga; si no coincide, discard() lo borra todo.
+    """
+
+    def __init__(self, part_path, target_folder, skip_patterns=None, workers=WORKERS, log_callback=None):
+        self.part_path = part_path
+        self.final_folder = target_folder
+        os.makedirs(target_folder, exist_ok=True)
+        self.target_folder = tempfile.mkdtemp(prefix=".extract_", dir=target_folder)
+        self.skip_patterns = skip_patterns or []
+        self.log_callback = log_callback
+        self.covered = []  # Intervalos [start, end) descargados, ordenados y fusionados
+        self.waiting = None  # Miembros pendientes: (inicio, fin, ZipInfo); None = aún sin directorio
+        self.files = []
+        self.skipped = 0
+        self.extracted_early = 0
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.futures = []
+        self.extractor = _ThreadedExtractor(part_path, self.target_folder)
+
+    def _add_interval(self, start, end):
+        merged = []
+        for a, b in self.covered:
+            if b < start or a > end:
+                merged.append((a, b))
+            else:
+                start, end = min(a, start), max(b, end)
+        merged.append((start, end))
+        self.covered = sorted(merged)
+
+    def _is_covered(self, start, end):
+        i = bisect.bisect_right(self.covered, (start, float("inf"))) - 1
+        return i >= 0 and self.covered[i][0] <= start and self.covered[i][1] >= end
+
+    def _read_directory(self, path):
+        # El .part está preasignado con ceros: si el directorio central aún no
+        # llegó, zipfile no encuentra las firmas y lanza BadZipFile
+        try:
+            with zipfile.ZipFile(path, "r") as zf:
+                all_members = zf.infolist()
+                cd_start = zf.start_dir
+        except (zipfile.BadZipFile, OSError, ValueError):
+            return False
+
+        members = [m for m in all_members if not _matches(m.filename, self.skip_patterns)]
+        self.skipped = len(all_members) - len(members)
+        self.files = [m for m in members if not m.is_dir()]
+        _make_dirs(self.target_folder, members)
+
+        # Cada miembro ocupa desde su cabecera local hasta la cabecera siguiente
+        offsets = sorted({m.header_offset for m in all_members} | {cd_start})
+        next_offset = {a: b for a, b in zip(offsets, offsets[1:])}
+        self.waiting = [(m.header_offset, next_offset.get(m.header_offset, cd_start), m) for m in self.files]
+        return True
+
+    def chunk_done(self, start, end):
+        self._add_interval(start, end + 1)
+        if self.waiting is None and not self._read_directory(self.part_path):
+            return
+        ready = [w for w in self.waiting if self._is_covered(w[0], w[1])]
+        if not ready:
+            return
+        self.waiting = [w for w in self.waiting if not self._is_covered(w[0], w[1])]
+        for _, _, info in ready:
+            self.futures.append(self.pool.submit(self.extractor.extract, info))
+
+    def close(self):
+        """Espera a que terminen las extracciones en curso (llamado antes de renombrar el .part)."""
+        try:
+            self.extracted_early = sum(1 for f in self.futures if f.done())
+            for f in self.futures:
+                f.result()
+        finally:
+            self.pool.shutdown(wait=True)
+            self.extractor.close()
+
+    def finish(self, zip_path):
+        """Extrae lo que quede (si la descarga no fue por rangos) y escribe el manifiesto."""
+        if self.waiting is None and not self._read_directory(zip_path):
+            raise zipfile.BadZipFile(f"{zip_path} no es un ZIP válido")
+        if self.waiting:
+            extractor = _ThreadedExtractor(zip_path, self.target_folder)
+            try:
+                with ThreadPoolExecutor(max_workers=WORKERS) as pool:
+                    list(pool.map(extractor.extract, [w[2] for w in self.waiting]))
+            finally:
+                extractor.close()
+            self.waiting = []
+
+        # Misma unidad que el destino: mover es renombrar
+        for root, _, names in os.walk(self.target_folder):
+            rel = os.path.relpath(root, self.target_folder)
+            dest_dir = os.path.normpath(os.path.join(self.final_folder, rel))
+            os.makedirs(dest_dir, exist_ok=True)
+            for name in names:
+                os.replace(os.path.join(root, name), os.path.join(dest_dir, name))
+        shutil.rmtree(self.target_folder, ignore_errors=True)
+
+        manifest = _write_manifest(self.final_folder, self.files)
+        if self.log_callback:
+            msg = (f"Extraídos {len(self.files)} archivos ({self.extracted_early} ya terminados "
+                   f"durante la descarga).")
+            if self.skipped:
+                msg += f" Omitidos {self.skipped} por filtro."
+            self.log_callback(msg)
+        return manifest
+
+
+    def discard(self):
+        """Borra todo lo extraído (descarga fallida o con SHA-256 distinto)."""
+        try:
+            self.close()
+        except Exception:
+            pass
+        shutil.rmtree(self.target_folder, ignore_errors=True)
+
+
+def _index_executables(members):
+    """nombre_exe (minúsculas) -> ruta relativa, prefiriendo la menos profunda (como os.walk)."""
+    index = {}
+    for name in members:
+        base = name.rsplit("/", 1)[-1].lower()
+        if not base.endswith(".exe"):
+            continue
+        if base not in index or name.count("/") < index[base].count("/"):
+            index[base] = name
+    return index
+
+
+def find_executable(target_folder, exe_names):
+    """
+    Devuelve la ruta absoluta del primer ejecutable de 'exe_names' que exista.
+    Usa el manifiesto de extracción (consulta O(1)); si no hay manifiesto
+    (instalación antigua o manual) recurre a os.walk.
+    """
+    if isinstance(exe_names, str):
+        exe_names = [exe_names]
+
+    manifest = _load_manifest(target_folder)
+    if manifest:
+        executables = manifest.get("executables", {})
+        for exe in exe_names:
+            rel = executables.get(exe.lower())
+            if rel:
+                try:
+                    path = _safe_path(target_folder, rel)
+                except zipfile.BadZipFile:
+                    continue
+                if os.path.exists(path):
+                    return path
+
+    for root, dirs, files in os.walk(target_folder):
+        for exe in exe_names:
+            if exe in files:
+                return os.path.join(root, exe)
+    return None
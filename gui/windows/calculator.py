@@ -1,82 +1,25 @@
-import json
 import sys
+import json
 from PySide6.QtWidgets import (
     QApplication, QWidget, QVBoxLayout, QFormLayout, QSpinBox,
     QDoubleSpinBox, QLabel, QProgressBar, QGroupBox,
-    QTextEdit, QHBoxLayout
+    QTextEdit, QHBoxLayout, QPushButton, QFileDialog, QComboBox, QCheckBox, QLineEdit
 )
 from PySide6.QtCore import QTimer, Qt
 
-# =========================================================
-# === MODELO FÍSICO =======================================
-# =========================================================
-
-OVERHEAD_BYTES = 60
-WIFI_LIMIT_KB = 2000.0
-PPS_LIMIT = 5000.0
-CPU_LIMIT = 5000.0
-IOPS_LIMIT = 10.0
-COMPRESSION_RATIO = 0.20
-
-
-def real_payload_bytes(json_text: str) -> int:
-    try:
-        return len(json.dumps(json.loads(json_text), separators=(",", ":")).encode())
-    except Exception:
-        return 0
-
-
-def compute_metrics(N, Q, L, payload_bytes):
-    msgs_per_sec = N * Q
-    total_msg_size = payload_bytes + OVERHEAD_BYTES
-
-    # Red
-    bytes_per_sec = msgs_per_sec * total_msg_size
-    kb_per_sec = bytes_per_sec / 1024.0
-
-    # Disco (IOPS)
-    safe_L = max(0.01, L)
-    iops = 1.0 / safe_L
-
-    # Proyecciones
-    bytes_per_day_db = bytes_per_sec * 3600 * 24 * COMPRESSION_RATIO
-    gb_per_month = (bytes_per_day_db * 30) / (1024 ** 3)
-    buffer_1h_msgs = msgs_per_sec * 3600
-    ram_mb = (buffer_1h_msgs * total_msg_size * 2) / (1024 ** 2)
-
-    # --- CÁLCULOS DE CONFIGURACIÓN ---
-
-    # 1. Batch Size
-    # Debe ser lo suficientemente grande para contener todos los mensajes que llegan
-    # durante el tiempo de espera (L), más un 20% de margen.
-    batch = max(int(msgs_per_sec * L * 1.2), 1000)
-
-    # 2. Buffer Limit
-    # Debe poder guardar 1 hora de datos en RAM si se cae la red.
-    buffer_limit = int(max(10000, buffer_1h_msgs))
-
-    # 3. Jitter (Aleatoriedad)
-    # Importante para que no todos los procesos escriban en el milisegundo 000 exacto.
-    jitter = L * 0.1
-
-    return {
-        "msgs_per_sec": msgs_per_sec,
-        "kb_per_sec": kb_per_sec,
-        "iops": iops,
-        "payload_bytes": payload_bytes,
-        "gb_per_month": gb_per_month,
-        "ram_mb": ram_mb,
-
-        "batch": batch,
-        "buffer_limit": buffer_limit,
-        "jitter": jitter,
-
-        "wifi_pct": (kb_per_sec / WIFI_LIMIT_KB) * 100,
-        "pps_pct": (msgs_per_sec / PPS_LIMIT) * 100,
-        "cpu_pct": (msgs_per_sec / CPU_LIMIT) * 100,
-        "disk_pct": (iops / IOPS_LIMIT) * 100,
-    }
-
+# El modelo físico vive en core.capacity (sin Qt) para poder usarlo desde
+# los generadores de configuración y desde procesos de barrido.
+from core.capacity import (real_payload_bytes, compute_metrics, solve_capacity, payload_stats_from_jsonl,
+                           compute_metrics_by_percentile, mqtt_wire_model, queueing_model, cardinality_model,
+                           buffer_strategy_model, consumer_instances, DEFAULT_DISK_BUDGET_GB)
+from core.settings_manager import get_setting
+from core.sizing import get_sizing_profile, save_sizing_profile, SETTING_KEY as SIZING_KEY
+from core.encodings import compare_encodings
+from core.agent_sim import simulate_agent, WRITE_RATE
+from core.compression import parquet_bytes_per_point
+from core.storage_scanner import get_storage_scanner, influx_data_dir
+from core.aggregation import PROFILES, aggregation_model
+from gui.utils import WorkerThread
 
 # =========================================================
 # ===================== UI (VISTA) ========================
@@ -128,9 +71,75 @@ class CalculatorWindow(QWidget):
         self.spin_latency.setValue(1.0)
         self.spin_latency.setSuffix(" s")
 
+        # Overhead real en el cable (topic, protocolo, empaquetado TCP)
+        self.combo_protocol = QComboBox()
+        self.combo_protocol.addItems(["3.1.1", "5"])
+
+        self.spin_id_len = QSpinBox()
+        self.spin_id_len.setRange(1, 128)
+        self.spin_id_len.setValue(12)
+        self.spin_id_len.setSuffix(" car")
+
+        self.chk_alias = QCheckBox("Topic alias (MQTT 5)")
+
+        self.spin_coalesce = QSpinBox()
+        self.spin_coalesce.setRange(1, 100)
+        self.spin_coalesce.setValue(1)
+        self.spin_coalesce.setSuffix(" msg/segmento")
+
+        # QoS y ventana inflight
+        self.combo_qos = QComboBox()
+        self.combo_qos.addItems(["0", "1", "2"])
+
+        self.spin_rtt = QDoubleSpinBox()
+        self.spin_rtt.setRange(0.1, 5000.0)
+        self.spin_rtt.setValue(20.0)
+        self.spin_rtt.setSuffix(" ms")
+
+        self.spin_inflight = QSpinBox()
+        self.spin_inflight.setRange(1, 65535)
+        self.spin_inflight.setValue(20)
+        self.spin_inflight.setSuffix(" msgs")
+
+        # Modelo de compresión: ruido y deriva de la serie sintética
+        self.spin_noise = QDoubleSpinBox()
+        self.spin_noise.setRange(0.0, 100.0)
+        self.spin_noise.setValue(1.0)
+        self.spin_noise.setSuffix(" %")
+
+        self.spin_drift = QDoubleSpinBox()
+        self.spin_drift.setRange(0.0, 1000.0)
+        self.spin_drift.setValue(0.0)
+        self.spin_drift.setSuffix(" %/h")
+
+        # Tags adicionales al device_id (cardinalidad en InfluxDB)
+        self.txt_tags = QLineEdit()
+        self.txt_tags.setPlaceholderText("p.ej. site=4, axis=3")
+
+        # Pre-agregación en Telegraf
+        self.combo_agg = QComboBox()
+        self.combo_agg.addItems(list(PROFILES))
+
+        self.spin_agg_window = QDoubleSpinBox()
+        self.spin_agg_window.setRange(0.1, 3600.0)
+        self.spin_agg_window.setValue(10.0)
+        self.spin_agg_window.setSuffix(" s")
+
         form.addRow("Nº Sensores:", self.spin_sensors)
         form.addRow("Frecuencia:", self.spin_hz)
         form.addRow("Latencia (Flush):", self.spin_latency)
+        form.addRow("Protocolo MQTT:", self.combo_protocol)
+        form.addRow("Long. device_id:", self.spin_id_len)
+        form.addRow("", self.chk_alias)
+        form.addRow("Agrupación TCP:", self.spin_coalesce)
+        form.addRow("QoS:", self.combo_qos)
+        form.addRow("RTT dispositivo-broker:", self.spin_rtt)
+        form.addRow("max_inflight_messages:", self.spin_inflight)
+        form.addRow("Ruido de las señales:", self.spin_noise)
+        form.addRow("Deriva de las señales:", self.spin_drift)
+        form.addRow("Tags extra:", self.txt_tags)
+        form.addRow("Agregación:", self.combo_agg)
+        form.addRow("Ventana agregación:", self.spin_agg_window)
         gb_input.setLayout(form)
         left_layout.addWidget(gb_input)
 
@@ -150,6 +159,40 @@ class CalculatorWindow(QWidget):
   "sats": 11
 }""")
         l_json.addWidget(self.txt_json)
+
+        # Modelo de compresión: sólo se recalcula si cambian el JSON o sus parámetros
+        self._comp_key = None
+        self._comp = None
+
+        # Comparación de codificaciones: sólo se vuelve a medir si cambia el JSON
+        self._enc_key = None
+        self._enc_results = None
+
+        # Captura real (JSONL): si se carga, se dimensiona con el p99 en vez del ejemplo
+        self.corpus_stats = None
+        l_corpus = QHBoxLayout()
+        self.btn_corpus = QPushButton("Cargar captura JSONL...")
+        self.btn_corpus.clicked.connect(self.load_corpus)
+        self.btn_corpus_clear = QPushButton("Quitar")
+        self.btn_corpus_clear.clicked.connect(self.clear_corpus)
+        self.lbl_corpus = QLabel("Sin captura: se usa el JSON de ejemplo")
+        l_corpus.addWidget(self.btn_corpus)
+        l_corpus.addWidget(self.btn_corpus_clear)
+        l_json.addLayout(l_corpus)
+        l_json.addWidget(self.lbl_corpus)
+
+        # Almacenamiento medido en la carpeta de datos de InfluxDB 3
+        self.storage = None
+        l_storage = QHBoxLayout()
+        self.btn_storage = QPushButton("Medir carpeta de InfluxDB...")
+        self.btn_storage.clicked.connect(self.load_storage)
+        self.btn_storage_clear = QPushButton("Quitar")
+        self.btn_storage_clear.clicked.connect(self.clear_storage)
+        self.lbl_storage = QLabel("Sin medición: almacenamiento proyectado")
+        l_storage.addWidget(self.btn_storage)
+        l_storage.addWidget(self.btn_storage_clear)
+        l_json.addLayout(l_storage)
+        l_json.addWidget(self.lbl_storage)
         gb_json.setLayout(l_json)
         left_layout.addWidget(gb_json)
 
@@ -160,6 +203,7 @@ class CalculatorWindow(QWidget):
         self.bar_pps = QProgressBar()
         self.bar_cpu = QProgressBar()
         self.bar_disk = QProgressBar()
+        self.bar_inflight = QProgressBar()
         l_stats.addWidget(QLabel("WiFi:"))
         l_stats.addWidget(self.bar_wifi)
         l_stats.addWidget(QLabel("Router (PPS):"))
@@ -168,6 +212,8 @@ class CalculatorWindow(QWidget):
         l_stats.addWidget(self.bar_cpu)
         l_stats.addWidget(QLabel("Disco (IOPS):"))
         l_stats.addWidget(self.bar_disk)
+        l_stats.addWidget(QLabel("Ventana inflight (por dispositivo):"))
+        l_stats.addWidget(self.bar_inflight)
         gb_stats.setLayout(l_stats)
         left_layout.addWidget(gb_stats)
 
@@ -184,9 +230,10 @@ class CalculatorWindow(QWidget):
         self.lbl_col_jitter = QLabel('"0s"')
         self.lbl_flush = QLabel()
         self.lbl_flush_jitter = QLabel()
+        self.lbl_instances = QLabel()
 
         for l in [self.lbl_interval, self.lbl_round, self.lbl_batch, self.lbl_buffer,
-                  self.lbl_col_jitter, self.lbl_flush, self.lbl_flush_jitter]:
+                  self.lbl_col_jitter, self.lbl_flush, self.lbl_flush_jitter, self.lbl_instances]:
             l.setProperty("class", "console")
 
         l_res.addRow("interval =", self.lbl_interval)
@@ -196,10 +243,62 @@ class CalculatorWindow(QWidget):
         l_res.addRow("collection_jitter =", self.lbl_col_jitter)
         l_res.addRow("flush_interval =", self.lbl_flush)
         l_res.addRow("flush_jitter =", self.lbl_flush_jitter)
+        l_res.addRow("Instancias Telegraf =", self.lbl_instances)
+
+        # Los generadores de telegraf.conf leen este perfil en lugar de valores fijos
+        self.btn_profile = QPushButton("Guardar como perfil de Telegraf")
+        self.btn_profile.clicked.connect(self.save_profile)
+        self.lbl_profile = QLabel()
+        self.lbl_profile.setStyleSheet("color: #bdc3c7; font-size: 11px;")
+        l_res.addRow(self.btn_profile, self.lbl_profile)
 
         gb_res.setLayout(l_res)
         left_layout.addWidget(gb_res)
 
+        # Simulación del ciclo [agent] con la recomendación actual
+        gb_sim = QGroupBox("5. Simulación [agent] (1 h)")
+        l_sim = QHBoxLayout()
+        self.spin_outage = QSpinBox()
+        self.spin_outage.setRange(0, 50)
+        self.spin_outage.setValue(5)
+        self.spin_outage.setPrefix("Caída InfluxDB: ")
+        self.spin_outage.setSuffix(" min")
+        self.spin_outage.valueChanged.connect(self.schedule_calc)
+        # Caudal de escritura de InfluxDB: por encima de él la simulación acumula y descarta
+        self.spin_write_rate = QSpinBox()
+        self.spin_write_rate.setRange(1000, 10_000_000)
+        self.spin_write_rate.setSingleStep(10_000)
+        self.spin_write_rate.setValue(int(WRITE_RATE))
+        self.spin_write_rate.setPrefix("Escritura InfluxDB: ")
+        self.spin_write_rate.setSuffix(" pts/s")
+        self.btn_sim = QPushButton("Simular")
+        self.btn_sim.clicked.connect(self.run_simulation)
+        l_sim.addWidget(self.spin_outage)
+        l_sim.addWidget(self.spin_write_rate)
+        l_sim.addWidget(self.btn_sim)
+        gb_sim.setLayout(l_sim)
+        left_layout.addWidget(gb_sim)
+        self._sim_html = ""
+
+        # Presupuesto del buffer de Telegraf para comparar RAM y disco
+        gb_buf = QGroupBox("6. Buffer de salida (RAM vs disco)")
+        l_buf = QHBoxLayout()
+        self.spin_ram_budget = QSpinBox()
+        self.spin_ram_budget.setRange(0, 262144)
+        self.spin_ram_budget.setValue(2048)
+        self.spin_ram_budget.setSpecialValueText("RAM: 1 h")
+        self.spin_ram_budget.setPrefix("RAM: ")
+        self.spin_ram_budget.setSuffix(" MB")
+        self.spin_disk_budget = QDoubleSpinBox()
+        self.spin_disk_budget.setRange(0.1, 10000.0)
+        self.spin_disk_budget.setValue(DEFAULT_DISK_BUDGET_GB)
+        self.spin_disk_budget.setPrefix("Disco: ")
+        self.spin_disk_budget.setSuffix(" GB")
+        l_buf.addWidget(self.spin_ram_budget)
+        l_buf.addWidget(self.spin_disk_budget)
+        gb_buf.setLayout(l_buf)
+        left_layout.addWidget(gb_buf)
+
         # ========== PANEL DERECHO ==========
         gb_math = QGroupBox("MEMORIA DE CÁLCULO")
         l_math = QVBoxLayout()
@@ -213,17 +312,179 @@ class CalculatorWindow(QWidget):
         main_layout.addWidget(gb_math, 5)
 
         # Conexiones
-        for w in [self.spin_sensors, self.spin_hz, self.spin_latency]:
+        for w in [self.spin_sensors, self.spin_hz, self.spin_latency, self.spin_id_len, self.spin_coalesce,
+                  self.spin_rtt, self.spin_inflight, self.spin_noise, self.spin_drift, self.spin_agg_window,
+                  self.spin_ram_budget, self.spin_disk_budget]:
             w.valueChanged.connect(self.schedule_calc)
+        self.combo_protocol.currentTextChanged.connect(self.schedule_calc)
+        self.combo_qos.currentTextChanged.connect(self.schedule_calc)
+        self.combo_agg.currentTextChanged.connect(self.schedule_calc)
+        self.chk_alias.toggled.connect(self.schedule_calc)
         self.txt_json.textChanged.connect(self.schedule_calc)
+        self.txt_tags.textChanged.connect(self.schedule_calc)
 
         self.calculate()
+        self.show_profile()
 
     # ===================== LÓGICA UI =====================
 
+    def show_profile(self):
+        if get_setting(SIZING_KEY) is None:
+            self.lbl_profile.setText("Sin perfil guardado (valores por defecto)")
+            return
+        p = get_sizing_profile()
+        self.lbl_profile.setText(f"Guardado: {p['N']} disp. × {p['Q']:g} Hz, flush {p['L']:g} s, "
+                                 f"{p['payload_bytes']} B")
+
+    def save_profile(self):
+        json_txt = self.txt_json.toPlainText()
+        payload = real_payload_bytes(json_txt)
+        if self.corpus_stats:
+            payload = self.corpus_stats.percentile(99)
+        try:
+            fields = len([k for k in json.loads(json_txt) if k not in ("ts", "time")])
+        except (ValueError, TypeError):
+            fields = 1
+        save_sizing_profile(self.spin_sensors.value(), self.spin_hz.value(), self.spin_latency.value(), payload,
+                            fields=max(1, fields), disk_budget_gb=self.spin_disk_budget.value(),
+                            instances=consumer_instances(self._last_metrics["cpu_pct"]))
+        self.show_profile()
+
     def schedule_calc(self):
         self._debounce.start()
 
+    def load_corpus(self):
+        path, _ = QFileDialog.getOpenFileName(self, "Captura de payloads", "", "JSONL (*.jsonl *.json *.txt)")
+        if not path:
+            return
+        self.btn_corpus.setEnabled(False)
+        self.lbl_corpus.setText("Leyendo captura...")
+
+        def task(log_callback):
+            self._loaded_stats = payload_stats_from_jsonl(path)
+
+        # La lectura va en un hilo: una captura grande no congela la ventana
+        self.worker = WorkerThread(task)
+        self.worker.finished_signal.connect(self.corpus_loaded)
+        self.worker.start()
+
+    def corpus_loaded(self):
+        self.btn_corpus.setEnabled(True)
+        st = getattr(self, "_loaded_stats", None)
+        if not st or not st.count:
+            self.lbl_corpus.setText("La captura no contiene payloads JSON válidos")
+            return
+        self.corpus_stats = st
+        self.lbl_corpus.setText(f"Captura: {st.count} msgs (inválidos: {st.invalid}) - "
+                                f"media {st.mean:.0f} B, p99 {st.percentile(99)} B, máx {st.max} B")
+        self.calculate()
+
+    def clear_corpus(self):
+        self.corpus_stats = None
+        self.lbl_corpus.setText("Sin captura: se usa el JSON de ejemplo")
+        self.calculate()
+
+    def run_simulation(self):
+        N = self.spin_sensors.value()
+        L = self.spin_latency.value()
+        m = self._last_metrics
+        outage = self.spin_outage.value() * 60
+        params = dict(N=N, Q=m["msgs_per_sec"] / N, duration=3600.0, batch_size=m["batch"], flush_interval=L,
+                      flush_jitter=m["jitter"], buffer_limit=m["buffer_limit"], jitter=0.1 / self.spin_hz.value(),
+                      write_rate=float(self.spin_write_rate.value()),
+                      outages=[(600.0, 600.0 + outage)] if outage else ())
+        self.btn_sim.setEnabled(False)
+
+        def task(log_callback):
+            try:
+                self._sim_result = (params, simulate_agent(**params))
+            except (ValueError, ImportError) as e:
+                self._sim_result = (params, str(e))
+
+        # En un hilo: con muchos sensores la simulación puede tardar algún segundo
+        self.worker_sim = WorkerThread(task)
+        self.worker_sim.finished_signal.connect(self.simulation_done)
+        self.worker_sim.start()
+
+    def simulation_done(self):
+        self.btn_sim.setEnabled(True)
+        params, r = self._sim_result
+        if isinstance(r, str):
+            self._sim_html = f"<h3 style='color:#e74c3c'>14. SIMULACIÓN DEL AGENTE</h3>No se pudo simular: {r}<br>"
+            self.calculate()
+            return
+        outage = params["outages"][0][1] - params["outages"][0][0] if params["outages"] else 0
+        lat = ""
+        if r["written"]:
+            lat = (f"- Latencia extremo a extremo: p50 <b>{r['latency_p50']:.2f} s</b>, "
+                   f"p99 <b>{r['latency_p99']:.2f} s</b>, p99.9 {r['latency_p99_9']:.2f} s, "
+                   f"máx {r['latency_max']:.1f} s<br>")
+        overload = ""
+        if params["N"] * params["Q"] > params["write_rate"]:
+            overload = (f"<b style='color:#c0392b'>- Llegan {params['N'] * params['Q']:,.0f} msg/s: más de lo que "
+                        f"escribe InfluxDB; el buffer se llena y descarta aunque no haya caída.</b><br>")
+        self._sim_html = f"""
+        <h3 style='color:#e74c3c'>14. SIMULACIÓN DEL AGENTE (eventos discretos)</h3>
+        {params['N']} disp a {params['Q']:.1f} Hz, batch {params['batch_size']}, buffer {params['buffer_limit']},
+        flush {params['flush_interval']}s, InfluxDB a {params['write_rate']:,.0f} pts/s,
+        caída de {outage / 60:.0f} min en t=600 s.<br>
+        {overload}
+        {lat}- Pico del buffer: <b>{r['peak_buffer']}</b> ({r['peak_buffer_pct']:.1f}% de metric_buffer_limit)<br>
+        - Métricas descartadas: <b>{r['dropped']}</b> de {r['metrics_in']}<br>
+        - Escrituras: {r['writes']} ({r['failed_writes']} fallidas)<br>
+        <i>1 h simulada en {r['wall_seconds']:.2f} s ({r['sim_speed']:.0f}x tiempo real)</i>
+        """
+        self.calculate()
+
+    def load_storage(self):
+        path = QFileDialog.getExistingDirectory(self, "Carpeta de datos de InfluxDB 3", influx_data_dir())
+        if not path:
+            return
+        self.btn_storage.setEnabled(False)
+        self.lbl_storage.setText("Escaneando...")
+
+        def task(log_callback):
+            try:
+                self._loaded_storage = get_storage_scanner(path).scan()
+            except Exception as e:
+                self._loaded_storage = str(e)
+
+        # Escaneo incremental en un hilo: las siguientes veces sólo lee lo nuevo
+        self.worker_storage = WorkerThread(task)
+        self.worker_storage.finished_signal.connect(self.storage_loaded)
+        self.worker_storage.start()
+
+    def storage_loaded(self):
+        self.btn_storage.setEnabled(True)
+        st = self._loaded_storage
+        if isinstance(st, str):
+            self.lbl_storage.setText(f"Error: {st}")
+            return
+        if not st["bytes_per_point"]:
+            self.lbl_storage.setText("La carpeta no contiene archivos Parquet con filas")
+            return
+        self.storage = st
+        self.lbl_storage.setText(f"Medido: {st['files']} archivos, {st['total_bytes'] / 1024 ** 2:.1f} MB, "
+                                 f"{st['bytes_per_point']:.1f} B/punto")
+        self.calculate()
+
+    def clear_storage(self):
+        self.storage = None
+        self.lbl_storage.setText("Sin medición: almacenamiento proyectado")
+        self.calculate()
+
+    @staticmethod
+    def storage_html(st):
+        html = (f"- <b>Medido</b> en {st['data_dir']}: <b>{st['bytes_per_point']:.1f} B/punto</b> "
+                f"({st['rows']} filas en {st['parquet_bytes'] / 1024 ** 2:.1f} MB de Parquet, "
+                f"WAL {st['wal_bytes'] / 1024 ** 2:.1f} MB)<br>")
+        if st["bytes_per_day"]:
+            html += (f"&nbsp;&nbsp;Crecimiento real: <b>{st['bytes_per_day'] / 1024 ** 2:.1f} MB/día</b> "
+                     f"({st['bytes_per_day'] * 30 / 1024 ** 3:.2f} GB/mes) en {st['span_days']:.1f} días; "
+                     f"últimas 24 h: {st['last_24h_bytes'] / 1024 ** 2:.1f} MB "
+                     f"(x{st['growth_ratio']:.2f} la media)")
+        return html
+
     def set_bar(self, bar, pct):
         val = min(100, int(pct))
         bar.setValue(val)
@@ -241,14 +502,28 @@ class CalculatorWindow(QWidget):
         Q = self.spin_hz.value()
         L = self.spin_latency.value()
         json_txt = self.txt_json.toPlainText()
+        wire = mqtt_wire_model(self.spin_id_len.value(), self.combo_protocol.currentText(),
+                               qos=int(self.combo_qos.currentText()), topic_alias=self.chk_alias.isChecked(),
+                               coalesce=self.spin_coalesce.value(), rtt_ms=self.spin_rtt.value(),
+                               max_inflight=self.spin_inflight.value())
 
         payload = real_payload_bytes(json_txt)
-        m = compute_metrics(N, Q, L, payload)
+        if self.corpus_stats:
+            # Se dimensiona para la cola de la distribución, no para la muestra
+            payload = self.corpus_stats.percentile(99)
+        comp = self.compression(json_txt, N, Q)
+        stored = comp["bytes_per_point"] if comp else None
+        if self.storage:
+            # Lo medido en disco manda sobre el modelo
+            stored = self.storage["bytes_per_point"]
+        m = compute_metrics(N, Q, L, payload, wire=wire, stored_bytes=stored)
+        self._last_metrics = m
 
         self.set_bar(self.bar_wifi, m["wifi_pct"])
         self.set_bar(self.bar_pps, m["pps_pct"])
         self.set_bar(self.bar_cpu, m["cpu_pct"])
         self.set_bar(self.bar_disk, m["disk_pct"])
+        self.set_bar(self.bar_inflight, m["inflight_pct"])
 
         # Asignaciones de Texto
         self.lbl_interval.setText(f'"{L}s"')
@@ -256,6 +531,8 @@ class CalculatorWindow(QWidget):
         self.lbl_buffer.setText(str(m["buffer_limit"]))
         self.lbl_flush.setText(f'"{L}s"')
         self.lbl_flush_jitter.setText(f'"{m["jitter"]:.1f}s"')
+        instances = consumer_instances(m["cpu_pct"])
+        self.lbl_instances.setText(str(instances))
 
         # HTML Explicativo (LA RESPUESTA A TU PREGUNTA)
         html = f"""
@@ -281,14 +558,242 @@ class CalculatorWindow(QWidget):
         
         <h3 style='color:#9b59b6'>5. PROYECCIONES DE ALMACENAMIENTO</h3>
         - Datos diarios (comprimidos): <b>{m['msgs_per_sec'] *
-(m['payload_bytes'] + OVERHEAD_BYTES) * 86400 / (1024**2):.2f} MB</b><br>
+m['stored_bytes_per_point'] * 86400 / (1024**2):.2f} MB</b><br>
         - Datos mensuales (comprimidos): <b>{m['gb_per_month']
 :.2f} GB</b><br>
-        - RAM necesaria (buffer 1h x2): <b>{m['ram_mb']:.2f} MB</b>
-                                              
+        - RAM necesaria (buffer 1h x2): <b>{m['ram_mb']:.2f} MB</b><br>
+        {self.storage_html(self.storage) if self.storage else self.compression_html(comp, m)}
         """
+
+        # Garantías de cola: percentiles y probabilidad de desborde, no sólo medias
+        outage = self.spin_outage.value() * 60 or 3600
+        qm = queueing_model(N, Q, L, payload, wire=wire, outage_s=outage)
+        st = qm["stages"]
+        html += f"""
+        <h3 style='color:#2980b9'>6. GARANTÍAS DE COLA (M/D/1)</h3>
+        - Latencia extremo a extremo: media <b>{self.fmt_seconds(qm['latency_mean'])}</b>,
+          p99 <b>{self.fmt_seconds(qm['latency_p'])}</b><br>
+        &nbsp;&nbsp;WiFi {self.fmt_seconds(st['wifi']['p'])} (ρ={st['wifi']['rho']:.2f}) +
+          Telegraf {self.fmt_seconds(st['telegraf']['p'])} (ρ={st['telegraf']['rho']:.2f}) +
+          flush {self.fmt_seconds(st['flush']['p'])} +
+          InfluxDB {self.fmt_seconds(st['influx']['p'])} (ρ={st['influx']['rho']:.2f})<br>
+        - P(desbordar metric_buffer_limit en una caída de {outage / 60:.0f} min):
+          <b>{qm['overflow_prob'] * 100:.1f}%</b><br>
+        - Caída máxima soportada con 99% de confianza: <b>{qm['max_outage_s'] / 60:.1f} min</b>
+        """
+        if not qm["stable"]:
+            html += """<br><b style='color:#c0392b'>AVISO: alguna etapa tiene ρ ≥ 1; la cola crece sin límite.</b>"""
+
+        html += self.buffer_html(N, Q, L, payload, wire)
+        html += self.cardinality_html(json_txt, N, m)
+        html += self.aggregation_html(json_txt, N, Q, L, payload, wire, stored)
+
+        # Problema inverso: ¿hasta dónde puedo crecer con este hardware?
+        max_n = solve_capacity("N", Q=Q, L=L, payload_bytes=payload, wire=wire)
+        max_q = solve_capacity("Q", N=N, L=L, payload_bytes=payload, wire=wire)
+        min_l = solve_capacity("L", N=N, Q=Q, payload_bytes=payload, wire=wire)
+        html += f"""
+        <h3 style='color:#1abc9c'>10. CAPACIDAD MÁXIMA (solver inverso)</h3>
+        - Sensores máx. a {Q} Hz: <b>{self.fmt_solution(max_n, "{:.0f} disp")}</b><br>
+        - Frecuencia máx. con {N} disp: <b>{self.fmt_solution(max_q, "{:.2f} Hz")}</b><br>
+        - Flush mínimo: <b>{self.fmt_solution(min_l, "{:.2f} s")}</b><br>
+        - Instancias de Telegraf: <b>{instances}</b> (CPU {m['cpu_pct']:.0f}% de un núcleo, máx. 80% por
+          instancia; suscripción compartida $share/telegraf/shm/+/data)
+        """
+
+        html += f"""
+        <h3 style='color:#95a5a6'>11. OVERHEAD EN EL CABLE</h3>
+        - Paquete PUBLISH: <b>{m['msg_bytes']:.0f} B</b> (payload {payload} B + MQTT {m['msg_bytes'] - payload:.0f} B)<br>
+        - En el aire (TCP/IP + WiFi + ACKs): <b>{m['wire_bytes_per_msg']:.0f} B/msg</b><br>
+        - Paquetes IP en el router: <b>{m['packets_per_sec']:.0f} pps</b> para {m['msgs_per_sec']:.0f} msg/s
+        """
+        if m["inflight_hz_max"] != float("inf"):
+            html += f"""<br>
+        - QoS {self.combo_qos.currentText()}: techo por dispositivo = max_inflight / (RTT x viajes)
+          = <b>{m['inflight_hz_max']:.1f} Hz</b><br>
+        """
+            if m["inflight_pct"] > 100:
+                html += f"""
+        <b style='color:#c0392b'>AVISO: a {Q} Hz el cuello de botella es la ventana inflight, no el ancho
+        de banda. Llegan {m['msgs_per_sec']:.0f} de {m['offered_msgs_per_sec']:.0f} msg/s; el resto se acumula
+        en el dispositivo.</b>
+        """
+
+        if self.corpus_stats:
+            rows = ""
+            for name, mp in compute_metrics_by_percentile(N, Q, L, self.corpus_stats, wire=wire,
+                                                                  stored_bytes=stored).items():
+                rows += (f"<tr><td>{name}</td><td>{mp['payload_bytes']:.0f} B</td><td>{mp['kb_per_sec']:.1f}</td>"
+                         f"<td>{mp['wifi_pct']:.0f}%</td><td>{mp['ram_mb']:.1f}</td>"
+                         f"<td>{mp['gb_per_month']:.2f}</td></tr>")
+            html += f"""
+        <h3 style='color:#e67e22'>12. CAPTURA REAL ({self.corpus_stats.count} mensajes)</h3>
+        Las recomendaciones de arriba usan el <b>p99</b> ({payload} B).<br>
+        <table border='1' cellspacing='0' cellpadding='3'>
+        <tr><th></th><th>Payload</th><th>KB/s</th><th>WiFi</th><th>RAM MB</th><th>GB/mes</th></tr>
+        {rows}
+        </table>
+        """
+        html += self.encodings_html(json_txt, N, Q, L, wire, stored)
+        html += self._sim_html
         self.txt_math.setHtml(html)
 
+    def compression(self, json_txt, N, Q):
+        """Bytes por punto en disco según el modelo Parquet (None si el JSON no es válido)."""
+        key = (json_txt, min(N, 8), Q, self.spin_noise.value(), self.spin_drift.value())
+        if key != self._comp_key:
+            self._comp_key = key
+            try:
+                sample = json.loads(json_txt)
+                self._comp = parquet_bytes_per_point(sample, N, Q, noise=self.spin_noise.value() / 100,
+                                                     drift=self.spin_drift.value() / 100)
+            except (ValueError, TypeError, AttributeError, ImportError):
+                self._comp = None
+        return self._comp
+
+    @staticmethod
+    def compression_html(comp, m):
+        if not comp:
+            return "- Compresión: ratio fijo del 20% (sin modelo)"
+        cols = ", ".join(f"{name} {enc.replace('_', ' ').lower()} {size:.2f} B"
+                         for name, (enc, size) in comp["columns"].items())
+        return (f"- En disco: <b>{comp['bytes_per_point']:.1f} B/punto</b> "
+                f"({comp['bytes_per_point'] / m['msg_bytes'] * 100:.0f}% del mensaje MQTT, "
+                f"serie sintética de {comp['rows']} filas)<br>"
+                f"&nbsp;&nbsp;<i>{cols}</i>")
+
+    def encodings_html(self, json_txt, N, Q, L, wire, stored=None):
+        """Sección 13: el mismo payload en JSON, MessagePack, CBOR y binario."""
+        if json_txt != self._enc_key:
+            self._enc_key = json_txt
+            try:
+                sample = json.loads(json_txt)
+                self._enc_results = compare_encodings(sample) if isinstance(sample, dict) else None
+            except (ValueError, TypeError):
+                self._enc_results = None
+        if not self._enc_results:
+            return ""
+
+        rows = ""
+        for name, r in self._enc_results.items():
+            if r["bytes"] is None:
+                rows += f"<tr><td>{name}</td><td colspan='7'><i>{r['error']}</i></td></tr>"
+                continue
+            me = compute_metrics(N, Q, L, r["bytes"], wire=wire, stored_bytes=stored)
+            # Núcleos que haría falta sólo para decodificar el flujo completo
+            cores = me["msgs_per_sec"] / r["decode_per_sec"]
+            rows += (f"<tr><td>{name}</td><td>{r['bytes']} B</td>"
+                     f"<td>{r['encode_per_sec'] / 1000:.0f}k</td><td>{r['decode_per_sec'] / 1000:.0f}k</td>"
+                     f"<td>{cores * 100:.1f}%</td><td>{me['wifi_pct']:.0f}%</td>"
+                     f"<td>{me['packets_per_sec']:.0f}</td><td>{me['gb_per_month']:.2f}</td></tr>")
+        impls = ", ".join(r["impl"] for r in self._enc_results.values())
+        return f"""
+        <h3 style='color:#f1c40f'>13. CODIFICACIÓN DEL PAYLOAD</h3>
+        El JSON de ejemplo codificado en cada formato (medido en esta máquina).<br>
+        <table border='1' cellspacing='0' cellpadding='3'>
+        <tr><th></th><th>Tamaño</th><th>cod/s</th><th>dec/s</th><th>CPU dec.</th><th>WiFi</th><th>pps</th>
+        <th>GB/mes</th></tr>
+        {rows}
+        </table>
+        <i>CPU dec. = % de un núcleo para decodificar {N * Q:.0f} msg/s. Implementaciones: {impls}.</i>
+        """
+
+    def parse_tags(self):
+        """'site=4, axis=3' -> {'site': 4, 'axis': 3} (se ignoran las entradas mal escritas)."""
+        tags = {}
+        for item in self.txt_tags.text().split(","):
+            name, _, count = item.partition("=")
+            if name.strip() and count.strip().isdigit():
+                tags[name.strip()] = int(count)
+        return tags
+
+    def buffer_html(self, N, Q, L, payload, wire):
+        """Sección 7: buffer de salida en RAM frente a disco."""
+        bm = buffer_strategy_model(N, Q, L, payload, wire=wire, ram_budget_mb=self.spin_ram_budget.value() or None,
+                                   disk_budget_gb=self.spin_disk_budget.value())
+        rows = ""
+        for key, name in (("memory", "RAM"), ("disk", "Disco")):
+            b = bm[key]
+            color = "#c0392b" if b["iops_pct"] > 100 else "#ecf0f1"
+            rows += (f"<tr><td>{name}</td><td>{b['ram_mb']:,.0f}</td><td>{b['disk_mb'] / 1024:,.1f}</td>"
+                     f"<td style='color:{color}'>{b['buffer_iops']:,.0f} ({b['iops_pct']:,.0f}%)</td>"
+                     f"<td>{b['outage_hours']:,.1f}</td></tr>")
+        html = f"""
+        <h3 style='color:#d35400'>7. BUFFER EN RAM O EN DISCO (buffer_strategy)</h3>
+        <table border='1' cellpadding='3' cellspacing='0'>
+        <tr><th></th><th>RAM MB</th><th>Disco GB</th><th>IOPS buffer (% límite)</th><th>Caída máx. (h)</th></tr>
+        {rows}
+        </table>
+        <i>El buffer en disco escribe cada métrica en un WAL (con fsync) y lo trunca por lote confirmado.</i>
+        """
+        if bm["disk"]["iops_pct"] > 100:
+            html += ("<br><b style='color:#c0392b'>AVISO: el buffer en disco supera el límite de IOPS; "
+                     "sólo compensa con un disco rápido o con agregación en el borde.</b>")
+        return html
+
+    def cardinality_html(self, json_txt, N, m):
+        """Sección 8: series, memoria y amplificación de escritura de InfluxDB."""
+        try:
+            sample = json.loads(json_txt)
+            fields = len([k for k in sample if k not in ("ts", "time")])
+        except (ValueError, TypeError):
+            return ""
+        cm = cardinality_model(N, fields, self.parse_tags(), m["msgs_per_sec"], m["stored_bytes_per_point"],
+                               id_len=self.spin_id_len.value(),
+                               thresholds=get_setting("cardinality_thresholds", {}))
+        html = f"""
+        <h3 style='color:#8e44ad'>8. CARDINALIDAD Y MEMORIA DE INFLUXDB</h3>
+        - Series: <b>{cm['series']:,}</b> ({cm['field_series']:,} series de campo)<br>
+        - Memoria estimada: <b>{cm['memory_mb']:.0f} MB</b> (buffer gen1 {cm['buffer_mb']:.0f} MB,
+          last-value cache {cm['lvc_mb']:.1f} MB, diccionario {cm['dict_mb']:.1f} MB)<br>
+        - Amplificación de escritura: <b>x{cm['write_amp']:.1f}</b>
+          (WAL {cm['wal_bytes_per_point']} B + Parquet {m['stored_bytes_per_point']:.1f} B por punto)<br>
+        - Consulta de 1 h de toda la flota: {cm['files_per_hour_query']} Parquet, {cm['series_per_fleet_query']:,} series
+        """
+        for name, value, limit in cm["warnings"]:
+            html += f"<br><b style='color:#c0392b'>AVISO: {name} = {value:,.1f} supera el umbral {limit:,}</b>"
+        return html
+
+    def aggregation_html(self, json_txt, N, Q, L, payload, wire, stored):
+        """Sección 9: efecto de la agregación en el borde (vacía sin agregadores)."""
+        aggregators = PROFILES[self.combo_agg.currentText()]
+        if not aggregators:
+            return ""
+        try:
+            fields = len([k for k in json.loads(json_txt) if k not in ("ts", "time")])
+        except (ValueError, TypeError):
+            return ""
+        window = self.spin_agg_window.value()
+        am = aggregation_model(N, Q, L, payload, fields, window, aggregators, wire=wire, stored_bytes=stored)
+        raw, agg, red = am["raw"], am["aggregated"], am["reduction"]
+        return f"""
+        <h3 style='color:#16a085'>9. AGREGACIÓN EN EL BORDE ({' + '.join(aggregators)} cada {window:g} s)</h3>
+        <table border='1' cellspacing='0' cellpadding='3'>
+        <tr><th></th><th>Sin agregar</th><th>Agregado</th><th>Reducción</th></tr>
+        <tr><td>Puntos/s a InfluxDB</td><td>{raw['msgs_per_sec']:.0f}</td><td>{agg['points_per_sec']:.1f}</td>
+            <td>x{red['points']:.0f}</td></tr>
+        <tr><td>Escrituras/s</td><td>{raw['iops']:.2f}</td><td>{agg['iops']:.2f}</td><td>x{red['iops']:.1f}</td></tr>
+        <tr><td>GB/mes</td><td>{raw['gb_per_month']:.2f}</td><td>{agg['gb_per_month']:.3f}</td>
+            <td>x{red['storage']:.0f}</td></tr>
+        <tr><td>RAM buffer MB</td><td>{raw['ram_mb']:.1f}</td><td>{agg['ram_mb']:.2f}</td><td>x{red['ram']:.0f}</td></tr>
+        </table>
+        metric_batch_size = {agg['batch']}, metric_buffer_limit = {agg['buffer_limit']} con agregación.
+        """
+
+    @staticmethod
+    def fmt_seconds(t):
+        if t == float("inf"):
+            return "∞"
+        return f"{t * 1000:.1f} ms" if t < 1 else f"{t:.2f} s"
+
+    @staticmethod
+    def fmt_solution(sol, fmt):
+        if sol["value"] is None or sol["value"] == 0:
+            return f"imposible (satura {sol['binding']})"
+        if sol["value"] == float("inf"):
+            return "sin límite"
+        return f"{fmt.format(sol['value'])} (limita: {sol['binding']})"
+
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
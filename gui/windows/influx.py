@@ -3,6 +3,7 @@ from PySide6.QtWidgets import (QWidget, QVBoxLayout, QPushButton, QLabel,
 from gui.utils import WorkerThread
 import core
 import os
+import threading
 
 
 class InfluxWindow(QWidget):
@@ -79,6 +80,10 @@ class InfluxWindow(QWidget):
         self.btn_read_token.clicked.connect(self.extract_token_process)
         layout.addWidget(self.btn_read_token)
 
+        # Vigilancia automática de credenciales_admin.txt (ver start_token_watch)
+        self._token_stop = threading.Event()
+        self.worker_watch = None
+
     def select_folder(self):
         folder = QFileDialog.getExistingDirectory(self, "Seleccionar Carpeta")
         if folder: self.path_input.setText(os.path.normpath(folder))
@@ -101,14 +106,18 @@ class InfluxWindow(QWidget):
         org_name = "docs"
 
         # --- GUARDAR EN EL CEREBRO COMPARTIDO (JSON) ---
-        core.save_setting("influx_path", target)
-        core.save_setting("influx_url", url)
-        core.save_setting("influx_node", node)
-        core.save_setting("influx_data_dir", data_path)
+        with core.settings_transaction():
+            core.save_setting("influx_path", target)
+            core.save_setting("influx_url", url)
+            core.save_setting("influx_node", node)
+            core.save_setting("influx_data_dir", data_path)
+
+            # AQUÍ ESTÁ LA MAGIA: Guardamos las claves que Telegraf está buscando
+            core.save_setting("influx_bucket", bucket_name)
+            core.save_setting("influx_org", org_name)
 
-        # AQUÍ ESTÁ LA MAGIA: Guardamos las claves que Telegraf está buscando
-        core.save_setting("influx_bucket", bucket_name)
-        core.save_setting("influx_org", org_name)
+        # La vigilancia del token sólo arranca si el PASO 1 terminó bien
+        ready = []
 
         def task(log_callback):
             log_callback("--- Paso 1: Descargando ---")
@@ -119,6 +128,7 @@ class InfluxWindow(QWidget):
                 ok, msg_conf = core.setup_influx3_scripts(target, node, data_path, log_callback)
 
                 if ok:
+                    ready.append(target)
                     log_callback("\n[¡PROCESO FINALIZADO!]")
                     log_callback(f"Configuración guardada para Telegraf:")
                     log_callback(f" >> Bucket detectado: {bucket_name}")
@@ -127,7 +137,7 @@ class InfluxWindow(QWidget):
                     log_callback(f"Ve a la carpeta: {target}")
                     log_callback("1. Ejecuta '1_INICIAR_SERVER.bat'")
                     log_callback("2. Ejecuta '2_GENERAR_TOKEN.bat'")
-                    log_callback("3. Vuelve y presiona 'PASO 2: LEER TOKEN'")
+                    log_callback("3. El token se detectará solo (o presiona 'PASO 2: LEER TOKEN')")
                 else:
                     log_callback(f"[ERROR Configuración]: {msg_conf}")
             else:
@@ -136,8 +146,38 @@ class InfluxWindow(QWidget):
         self.worker = WorkerThread(task)
         self.worker.log_signal.connect(self.log_area.append)
         self.worker.finished_signal.connect(lambda: self.btn_run.setEnabled(True))
+        self.worker.finished_signal.connect(lambda: ready and self.start_token_watch(target))
         self.worker.start()
 
+    def start_token_watch(self, target):
+        """
+        Vigila credenciales_admin.txt en segundo plano: cuando 2_GENERAR_TOKEN.bat
+        agrega un token nuevo se guarda al instante, sin tener que pulsar PASO 2.
+        """
+        self.stop_token_watch()
+        self._token_stop = threading.Event()
+
+        def on_token(token):
+            core.save_setting("influx_token", token)
+            self.worker_watch.log_signal.emit(f"\n[TOKEN NUEVO] {token[:10]}... guardado en config.json.")
+
+        def task(log_callback):
+            core.watch_token(target, on_token, self._token_stop, log_callback=log_callback)
+
+        self.worker_watch = WorkerThread(task)
+        self.worker_watch.log_signal.connect(self.log_area.append)
+        self.worker_watch.start()
+
+    def stop_token_watch(self):
+        self._token_stop.set()
+        if self.worker_watch:
+            self.worker_watch.wait()
+            self.worker_watch = None
+
+    def closeEvent(self, event):
+        self.stop_token_watch()
+        super().closeEvent(event)
+
     # --- NUEVA FUNCIÓN PARA LEER EL TOKEN ---
     def extract_token_process(self):
         target = self.path_input.text()
@@ -1,4 +1,4 @@
-from PySide6.QtWidgets import (QWidget, QVBoxLayout, QPushButton, QLabel,
+from PySide6.QtWidgets import (QWidget, QVBoxLayout, QPushButton, QLabel, QSpinBox, QFormLayout, QComboBox, QCheckBox,
                                QLineEdit, QGroupBox, QTextEdit, QFileDialog)
 from gui.utils import WorkerThread
 import core
@@ -45,6 +45,33 @@ class MosquittoWindow(QWidget):
         auth_group.setLayout(auth_layout)
         self.layout.addWidget(auth_group)
 
+        # 3. Escalado: M brokers (Mosquitto usa un solo núcleo)
+        shard_group = QGroupBox("Escalado (opcional)")
+        shard_layout = QFormLayout()
+        self.spin_shards = QSpinBox()
+        self.spin_shards.setRange(1, 32)
+        self.spin_shards.setValue(core.get_setting("mqtt_shards", 1))
+        self.devices_input = QLineEdit(core.get_setting("mqtt_devices_file", ""))
+        self.devices_input.setPlaceholderText("Lista de device_id (uno por línea) para la tabla de shards")
+        self.btn_devices = QPushButton("Dispositivos...")
+        self.btn_devices.clicked.connect(self.select_devices)
+        shard_layout.addRow("Brokers (puertos desde 1884):", self.spin_shards)
+        shard_layout.addRow("Dispositivos:", self.devices_input)
+        shard_layout.addRow("", self.btn_devices)
+
+        # Un usuario por dispositivo (contraseñas aleatorias en un CSV para el firmware) + ACL
+        self.chk_device_auth = QCheckBox("Credenciales y ACL por dispositivo")
+        self.chk_device_auth.setChecked(core.get_setting("mqtt_device_auth", False))
+        shard_layout.addRow("", self.chk_device_auth)
+
+        # Perfil de rendimiento (dev registra cada mensaje: sólo para pruebas)
+        self.combo_profile = QComboBox()
+        self.combo_profile.addItems(list(core.MOSQUITTO_PROFILES))
+        self.combo_profile.setCurrentText(core.get_setting("mosquitto_profile", "dev"))
+        shard_layout.addRow("Perfil:", self.combo_profile)
+        shard_group.setLayout(shard_layout)
+        self.layout.addWidget(shard_group)
+
         # ... (Logs y Botón igual que antes) ...
         self.log_area = QTextEdit()
         self.log_area.setReadOnly(True)
@@ -60,6 +87,10 @@ class MosquittoWindow(QWidget):
         folder = QFileDialog.getExistingDirectory(self, "Seleccionar Carpeta")
         if folder: self.path_input.setText(os.path.normpath(folder))
 
+    def select_devices(self):
+        path, _ = QFileDialog.getOpenFileName(self, "Lista de dispositivos", "", "Texto/CSV (*.txt *.csv)")
+        if path: self.devices_input.setText(os.path.normpath(path))
+
     def log(self, text):
         self.log_area.append(text)
 
@@ -68,17 +99,51 @@ class MosquittoWindow(QWidget):
         target_dir = self.path_input.text()
         user = self.user_input.text()
         pwd = self.pass_input.text()
+        shards = self.spin_shards.value()
+        devices_file = self.devices_input.text().strip()
+        profile = self.combo_profile.currentText()
+        device_auth = self.chk_device_auth.isChecked()
 
         # --- AQUÍ GUARDAMOS EN EL JSON COMPARTIDO ---
-        core.save_setting("mosquitto_path", target_dir)
-        core.save_setting("mqtt_user", user)
-        core.save_setting("mqtt_pass", pwd)
+        core.save_settings({
+            "mosquitto_path": target_dir,
+            "mqtt_user": user,
+            "mqtt_pass": pwd,
+            "mqtt_shards": shards,
+            "mqtt_devices_file": devices_file,
+            "mosquitto_profile": profile,
+            "mqtt_device_auth": device_auth,
+        })
         self.log(">> Configuración guardada en JSON compartido.")
 
+        # Sin lista no hay ACL por dispositivo: no seguimos como si estuviera activa
+        if device_auth and not devices_file:
+            self.log("ERROR: 'Credenciales y ACL por dispositivo' necesita la lista de dispositivos.")
+            self.btn_run.setEnabled(True)
+            return
+
         def task(log_callback):
             success, _ = core.install_package("EclipseFoundation.Mosquitto", log_callback)
             if success:
-                core.configure_mosquitto(target_dir, user, pwd, log_callback)
+                device_ids = credentials = None
+                if devices_file and (shards > 1 or device_auth):
+                    try:
+                        device_ids = core.read_device_ids(devices_file)
+                    except OSError as e:
+                        log_callback(f"ERROR leyendo la lista de dispositivos: {e}")
+                if device_auth and not device_ids:
+                    log_callback("ERROR: no se cargó ningún dispositivo; no se genera la configuración "
+                                 "(las ACL por dispositivo no estarían activas).")
+                    return
+                if device_ids and device_auth:
+                    creds_path = os.path.join(target_dir, "credenciales_dispositivos.csv")
+                    os.makedirs(target_dir, exist_ok=True)
+                    credentials = core.generate_device_credentials(device_ids, creds_path)
+                    log_callback(f"Credenciales de {len(credentials)} dispositivos en: {creds_path}")
+                # Dimensionado con el perfil de la calculadora (K consumidores por broker)
+                subscribers = core.get_sizing_profile().get("instances", 1)
+                core.configure_mosquitto(target_dir, user, pwd, log_callback, shards=shards, device_ids=device_ids,
+                                         profile=profile, subscribers=subscribers, device_credentials=credentials)
 
         self.worker = WorkerThread(task)
         self.worker.log_signal.connect(self.log)
@@ -1,7 +1,8 @@
-from PySide6.QtWidgets import (QWidget, QVBoxLayout, QPushButton, QLabel,
+from PySide6.QtWidgets import (QWidget, QVBoxLayout, QPushButton, QLabel, QComboBox, QDoubleSpinBox, QSpinBox,
                                QLineEdit, QTextEdit, QFormLayout, QFileDialog, QGroupBox)
 from gui.utils import WorkerThread
 import core
+from core.aggregation import PROFILES
 import os
 
 
@@ -82,11 +83,64 @@ class TelegrafWindow(QWidget):
 
         mqtt_layout.addRow("Usuario MQTT:", self.input_mqtt_user)
         mqtt_layout.addRow("Password MQTT:", self.input_mqtt_pass)
-        mqtt_layout.addRow(QLabel("(Se conectará a tcp://127.0.0.1:1884)"))
+        # Con Mosquitto en shards hay K consumidores por broker
+        ports = core.broker_ports(core.get_setting("mqtt_shards", 1))
+        mqtt_layout.addRow(QLabel(f"(Se conectará a tcp://127.0.0.1:{ports[0]})" if len(ports) == 1 else
+                                  f"(Se conectará a {len(ports)} brokers, puertos {ports[0]}-{ports[-1]})"))
+
+        # Payload binario: si se indica un esquema (.json) se genera el parser 'binary'
+        self.input_schema = QLineEdit(core.get_setting("binary_schema_path", ""))
+        self.input_schema.setPlaceholderText("Vacío = payload JSON")
+        self.btn_schema = QPushButton("Esquema binario...")
+        self.btn_schema.clicked.connect(self.select_schema)
+        mqtt_layout.addRow("Esquema binario:", self.input_schema)
+        mqtt_layout.addRow("", self.btn_schema)
 
         mqtt_group.setLayout(mqtt_layout)
         self.layout.addWidget(mqtt_group)
 
+        # --- 3b. AGREGACIÓN EN EL BORDE Y BUFFER (opcional) ---
+        agg_group = QGroupBox("Agregación en el borde y buffer (opcional)")
+        agg_layout = QFormLayout()
+        saved_agg = core.get_setting("telegraf_aggregation", {}) or {}
+
+        self.combo_agg = QComboBox()
+        self.combo_agg.addItems(list(PROFILES))
+        for name, aggs in PROFILES.items():
+            if aggs == saved_agg.get("aggregators", []):
+                self.combo_agg.setCurrentText(name)
+
+        self.spin_agg_window = QDoubleSpinBox()
+        self.spin_agg_window.setRange(0.1, 3600.0)
+        self.spin_agg_window.setValue(saved_agg.get("window", 10.0))
+        self.spin_agg_window.setSuffix(" s")
+
+        agg_layout.addRow("Agregadores:", self.combo_agg)
+        agg_layout.addRow("Ventana:", self.spin_agg_window)
+
+        # Buffer de salida: en RAM (por defecto) o en disco para caídas largas
+        self.combo_buffer = QComboBox()
+        self.combo_buffer.addItem("Memoria (RAM)", "memory")
+        self.combo_buffer.addItem("Disco (<telegraf>/buffer)", "disk")
+        self.combo_buffer.setCurrentIndex(
+            max(0, self.combo_buffer.findData(core.get_setting("telegraf_buffer_strategy", "memory"))))
+        agg_layout.addRow("Buffer de salida:", self.combo_buffer)
+
+        # Instancias con suscripción compartida (la calculadora recomienda K)
+        self.spin_instances = QSpinBox()
+        self.spin_instances.setRange(1, 64)
+        self.spin_instances.setValue(core.get_sizing_profile().get("instances", 1))
+        agg_layout.addRow("Instancias Telegraf:", self.spin_instances)
+        # Con varias instancias cada una ve sólo parte de cada dispositivo: sin agregación
+        self.spin_instances.valueChanged.connect(self.update_aggregation_enabled)
+        self.update_aggregation_enabled()
+        # La sección [agent] sale del perfil guardado en la calculadora
+        profile = core.get_sizing_profile()
+        agg_layout.addRow("Dimensionado:", QLabel(f"{profile['N']} disp. × {profile['Q']:g} Hz, "
+                                                  f"flush {profile['L']:g} s (Calculadora)"))
+        agg_group.setLayout(agg_layout)
+        self.layout.addWidget(agg_group)
+
         # --- 4. LOGS Y BOTÓN ---
         self.log_area = QTextEdit()
         self.log_area.setReadOnly(True)
@@ -102,14 +156,39 @@ class TelegrafWindow(QWidget):
         folder = QFileDialog.getExistingDirectory(self, "Seleccionar Carpeta")
         if folder: self.path_input.setText(os.path.normpath(folder))
 
+    def select_schema(self):
+        path, _ = QFileDialog.getOpenFileName(self, "Esquema de trama binaria", "", "JSON (*.json)")
+        if path: self.input_schema.setText(os.path.normpath(path))
+
+    def update_aggregation_enabled(self):
+        shared = self.spin_instances.value() > 1
+        if shared:
+            self.combo_agg.setCurrentText(next(name for name, aggs in PROFILES.items() if not aggs))
+        self.combo_agg.setEnabled(not shared)
+        self.spin_agg_window.setEnabled(not shared)
+        self.combo_agg.setToolTip("No disponible con varias instancias: cada una recibe sólo parte de los "
+                                  "mensajes de cada dispositivo" if shared else "")
+
+    def aggregation(self):
+        aggregators = PROFILES[self.combo_agg.currentText()]
+        if not aggregators:
+            return None
+        return {"window": self.spin_agg_window.value(), "aggregators": aggregators}
+
     def start_process(self):
 
-        core.save_setting("telegraf_url", self.url_input.text())
-        core.save_setting("influx_token", self.input_token.text())
-        core.save_setting("influx_bucket", self.input_bucket.text())
-        core.save_setting("mqtt_user", self.input_mqtt_user.text())
-        core.save_setting("mqtt_pass", self.input_mqtt_pass.text())
-        core.save_setting("telegraf_path", self.path_input.text())
+        # Una sola escritura atómica en lugar de seis read-modify-write
+        core.save_settings({
+            "telegraf_url": self.url_input.text(),
+            "influx_token": self.input_token.text(),
+            "influx_bucket": self.input_bucket.text(),
+            "mqtt_user": self.input_mqtt_user.text(),
+            "mqtt_pass": self.input_mqtt_pass.text(),
+            "telegraf_path": self.path_input.text(),
+            "binary_schema_path": self.input_schema.text(),
+            "telegraf_aggregation": self.aggregation(),
+            "telegraf_buffer_strategy": self.combo_buffer.currentData(),
+        })
 
         self.btn_run.setEnabled(False)
 
@@ -122,6 +201,11 @@ class TelegrafWindow(QWidget):
         bucket = self.input_bucket.text()
         mqtt_user = self.input_mqtt_user.text()
         mqtt_pass = self.input_mqtt_pass.text()
+        schema_path = self.input_schema.text().strip() or None
+        aggregation = self.aggregation()
+        buffer_strategy = self.combo_buffer.currentData()
+        instances = self.spin_instances.value()
+        ports = core.broker_ports(core.get_setting("mqtt_shards", 1))
 
         def task(log_callback):
             log_callback("--- Iniciando Setup Telegraf ---")
@@ -132,7 +216,9 @@ class TelegrafWindow(QWidget):
             if success:
                 log_callback("Generando telegraf.conf con esquema MQTT...")
                 ok, res_path = core.setup_telegraf_portable(
-                    target, url_db, token, org, bucket, mqtt_user, mqtt_pass, log_callback
+                    target, url_db, token, org, bucket, mqtt_user, mqtt_pass, log_callback,
+                    binary_schema=schema_path, aggregation=aggregation, buffer_strategy=buffer_strategy,
+                    instances=instances, broker_ports=ports
                 )
 
                 if ok: